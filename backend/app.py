@@ -2,7 +2,9 @@
 import os
 import sys
 import json
-from flask import Flask, request, jsonify, send_from_directory
+import threading
+import time
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 
 # ----------------------------------------------------------------------
 # Ensure backend folder is discoverable
@@ -14,21 +16,292 @@ if project_root not in sys.path:
 # ----------------------------------------------------------------------
 # IMPORT SERVICES
 # ----------------------------------------------------------------------
+from backend.config import config
 from backend.services import (
     resource_service,
     template_service,
     translate_service,
     SOSService
 )
-from backend.services.llm_service import call_ollama, extract_json, generate_emergency_response
+from backend.services.answer_cache import answer_cache
+from backend.services.guidance_service import guidance_pack
+from backend.services.intent_service import intent_matcher
+from backend.services.lazy_service import LazyService, lazy_services
+from backend.services.llm_service import (
+    ChatTurn,
+    LoadShedError,
+    PRIORITY_CHAT,
+    PRIORITY_GENERATE,
+    JSONStreamExtractor,
+    RESPONSE_SCHEMA,
+    build_guidance_pack,
+    call_ollama_chat,
+    call_ollama_stream,
+    extract_partial_fields,
+    finalize_response,
+    generate_cached,
+    generate_emergency_response,
+    llm_scheduler,
+    make_cache_key,
+    model_manager,
+    ollama_client,
+    ollama_flights,
+    parse_stats,
+    response_cache,
+    shared_response_cache,
+    template_fallbacks
+)
+from backend.services.metrics_service import CONTENT_TYPE, metrics, route_metrics
+from backend.services.session_service import chat_sessions
 
 # ----------------------------------------------------------------------
 # INITIALIZE FLASK APP
 # ----------------------------------------------------------------------
 app = Flask(__name__, static_folder="../frontend", static_url_path="")
 
-# SOS service init
-sos_service = SOSService()
+# SOS service, built on first use (or at startup when an outbox exists, see start_background_work)
+def _start_sos_service():
+    service = SOSService()
+    service.start_dispatcher()
+    return service
+
+sos_service = LazyService(_start_sos_service, name="sos_service")
+
+def sos_samples(read):
+    """Scrape-time sample from the SOS service; none until it has been built."""
+    return [((), read(sos_service.instance()))] if sos_service.built else []
+
+metrics.callback("sos_outbox_pending", "SMS deliveries waiting in the outbox",
+                 lambda: sos_samples(lambda sos: sos.stats()["outbox_pending"]))
+metrics.callback("sos_debounced_total", "Repeat SOS taps folded into an existing alert",
+                 lambda: sos_samples(lambda sos: sos.debounced), kind="counter")
+metrics.callback("sms_rate_limited_total", "SMS sends deferred by the rate limiter",
+                 lambda: sos_samples(lambda sos: sos.rate_limiter.stats()["deferred"]), kind="counter")
+
+_background_started = False
+_background_lock = threading.Lock()
+
+def start_background_work():
+    """Start the app's background threads, once per process.
+
+    Kept off the import path so importing the app (tests, the startup
+    report, a worker still booting) does no I/O: the ASGI lifespan startup
+    calls this, and under any other server the first request does.
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+
+    try:
+        config.validate_config()
+    except ValueError as e:
+        print(f"Warning: {e}")
+
+    # The dispatcher drains alerts left over from a restart, so build it now if an outbox exists
+    if config.SOS_USE_OUTBOX and os.path.exists(config.SOS_OUTBOX_PATH):
+        sos_service.build_in_background()
+
+    # Pre-translate the fallback templates so localized fallbacks are served from the memo
+    if config.TRANSLATE_LANGUAGES:
+        threading.Thread(
+            target=translate_service.warm_templates,
+            args=(template_service, config.TRANSLATE_LANGUAGES),
+            name="translate-warmup",
+            daemon=True
+        ).start()
+
+    # Load the model now rather than on the first user's request, and reload it if Ollama evicts it
+    if config.OLLAMA_WARMUP:
+        model_manager.start()
+
+    # Keep the offline guidance pack fresh; build it right away if entries are missing.
+    # Refreshes run at chat priority, so a surge sheds them before any user request.
+    # With several worker processes only one refreshes, and the others reload its pack.
+    guidance_pack.start_refresh(
+        lambda: build_guidance_pack(priority=PRIORITY_CHAT),
+        config.GUIDANCE_PACK_REFRESH,
+        complete=lambda: guidance_pack.is_complete(config.GUIDANCE_PACK_TYPES, config.GUIDANCE_PACK_LANGUAGES)
+    )
+
+@app.before_request
+def start_background_on_first_request():
+    if not _background_started:
+        start_background_work()
+
+# Prebuilt local chat responses
+LOCAL_RESPONSES = {
+    "hello": "Hi there! How can I assist you today?",
+    "help": "Sure! Ask me anything and I will guide you.",
+    "bye": "Goodbye! Stay safe!",
+}
+
+def local_reply(message, emergency_type=None):
+    """Answers greetings and common questions without the model; None otherwise."""
+    reply = LOCAL_RESPONSES.get(message.strip().lower())
+    if reply:
+        return reply
+    match = intent_matcher.match(message, emergency_type)
+    return match["answer"] if match else None
+
+CHAT_UNSURE_REPLY = "I'm not sure about that. Can you rephrase?"
+CHAT_ERROR_REPLY = "⚠️ Error: Ollama backend failed."
+CHAT_BUSY_REPLY = "⚠️ Error: AidGen is busy handling emergency requests. Please try again shortly."
+
+# ----------------------------------------------------------------------
+# REQUEST METRICS
+# ----------------------------------------------------------------------
+@app.before_request
+def start_request_timer():
+    request.environ["aidgen.started"] = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = request.environ.get("aidgen.started")
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else None
+    status = response.status_code
+    if response.is_streamed:
+        # Time the whole stream, not just the headers
+        response.call_on_close(
+            lambda: route_metrics.observe(route, status, time.perf_counter() - started)
+        )
+    else:
+        route_metrics.observe(route, status, time.perf_counter() - started)
+    return response
+
+# ----------------------------------------------------------------------
+# PROMPTS & STREAMING HELPERS
+# ----------------------------------------------------------------------
+def build_generate_prompt(kind, location, query):
+    return (
+        "You are AidGen, an offline emergency assistant.\n"
+        "Return ONLY valid JSON with: title, summary, steps[], warnings[], sms_template.\n"
+        "If unsure return {\"error\": \"unknown\"}.\n\n"
+        f"CONTEXT:\nKind: {kind}\nLocation: {location}\nQuery: {query}\n"
+    )
+
+def build_chat_message(message):
+    return f"User: {message}\nAidGen:\n"
+
+def build_chat_prompt(message, emergency_type, turns=()):
+    """Full chat prompt: instructions, the session's earlier turns, then ``message``."""
+    history = "".join(f"{build_chat_message(earlier)}{answer}\n" for earlier, answer in turns)
+    return (
+        f"You are AidGen Chatbot, an emergency response assistant.\n"
+        f"Current emergency context: {emergency_type.upper()}\n\n"
+        f"Answer concisely and helpfully using structured guidance.\n"
+        f"Return ONLY valid JSON with: title, summary, steps (array), warnings (array), sms_template.\n"
+        f"{history}{build_chat_message(message)}"
+    )
+
+def start_chat_turn(session_id, message, emergency_type):
+    """Looks up the chat session and builds this turn's prompt.
+
+    With the context Ollama returned for the previous turn, only the new
+    message is sent; otherwise the prompt is rebuilt from the saved turns.
+
+    Returns:
+        Tuple of (session id, session or None, prompt, ChatTurn)
+    """
+    session = chat_sessions.get(session_id)
+    if session and session["emergency_type"] != emergency_type:
+        # Another emergency means other instructions, so the old context no longer applies
+        session = None
+    if session and session["context"]:
+        return session_id, session, build_chat_message(message), ChatTurn(session["context"])
+    turns = session["turns"] if session else ()
+    return (session_id or chat_sessions.new_id(), session,
+            build_chat_prompt(message, emergency_type, turns), ChatTurn())
+
+def similar_chat_answer(session, message, emergency_type):
+    """Cached answer to a reworded opening question, or None.
+
+    Only a session's first turn is looked up: later answers depend on the
+    conversation so far.
+    """
+    if session is not None:
+        return None
+    return answer_cache.get(("chat", emergency_type), message)
+
+def finish_chat_turn(session_id, session, emergency_type, message, structured, turn):
+    # Turns keep only the summary the user saw, so a rebuilt prompt stays well under the context cap
+    turns = (session["turns"] if session else []) + [[message, structured.get("summary", "")]]
+    chat_sessions.save(session_id, emergency_type, turns, turn.new_context)
+    if session is None:
+        answer_cache.put(("chat", emergency_type), message, structured)
+
+def localize(result, language):
+    """Translate a structured answer or template unless it is already English."""
+    if not result or not language or language == "en":
+        return result
+    return translate_service.translate_response(result, language)
+
+def sse_event(event, data):
+    """Formats one Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def summary_update(summary, sent):
+    """Payload of the ``summary`` event for a partial summary grown from ``sent``.
+
+    Only the new text is sent (``delta``), so a streamed answer costs its
+    own length on the wire rather than the sum of every prefix. The whole
+    ``summary`` is resent in the rare case it changed other than by
+    growing (an escape sequence completing mid-stream).
+    """
+    if summary.startswith(sent):
+        return {"delta": summary[len(sent):]}
+    return {"summary": summary}
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def stream_partial_fields(prompt, extractor, priority, turn=None):
+    """Streams the completion for ``prompt`` as ``summary``/``step`` events.
+
+    Every chunk is fed to ``extractor``; generation is cancelled as soon as
+    the answer's JSON object closes (for a chat ``turn``, once its final
+    chunk arrives; see ``ChatTurn``), and the caller reads the final
+    (repaired if needed) answer with ``finalize_response(extractor)``.
+    """
+    buffer = ""
+    sent_summary = ""
+    sent_steps = 0
+
+    stream = call_ollama_stream(
+        prompt, priority=priority, schema=RESPONSE_SCHEMA,
+        context=turn and turn.context, on_done=turn and turn.on_done
+    )
+    try:
+        for chunk in stream:
+            if extractor.done:
+                # A chat turn reads on for the final chunk, which carries the session context
+                if turn.stop():
+                    break
+                continue
+            closed = extractor.feed(chunk)
+            buffer += chunk
+            partial = extract_partial_fields(buffer)
+
+            summary = partial["summary"]
+            if summary and summary != sent_summary:
+                yield sse_event("summary", summary_update(summary, sent_summary))
+                sent_summary = summary
+
+            for index in range(sent_steps, len(partial["steps"])):
+                yield sse_event("step", {"index": index, "step": partial["steps"][index]})
+            sent_steps = len(partial["steps"])
+
+            if closed and turn is None:
+                break
+    finally:
+        stream.close()
 
 # ----------------------------------------------------------------------
 # FRONTEND ROUTES
@@ -47,8 +320,35 @@ def serve_static(path):
 @app.route("/api/resources", methods=["GET"])
 def api_resources():
     q = request.args.get("q", "")
-    res = resource_service.find_resources_by_keyword(q) if q else resource_service.get_all_resources()
-    return jsonify({"ok": True, "resources": res})
+    tag = request.args.get("tag")
+    limit = request.args.get("limit", config.RESOURCE_PAGE_SIZE, type=int)
+    offset = request.args.get("offset", 0, type=int)
+    limit = max(0, min(limit, config.RESOURCE_MAX_PAGE_SIZE))
+
+    page = resource_service.search(q, tag=tag, limit=limit, offset=offset)
+    return jsonify({
+        "ok": True,
+        "resources": page["resources"],
+        "total": page["total"],
+        "limit": limit,
+        "offset": offset
+    })
+
+@app.route("/api/resources/nearest", methods=["GET"])
+def api_resources_nearest():
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    k = request.args.get("k", 1, type=int)
+    resource_type = request.args.get("type")
+    if lat is None or lon is None:
+        return jsonify({"ok": False, "error": "lat and lon are required"}), 400
+    k = max(1, min(k, config.RESOURCE_NEAREST_MAX_K))
+
+    try:
+        resources = resource_service.nearest(lat, lon, k, resource_type)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, "resources": resources, "k": k})
 
 # ----------------------------------------------------------------------
 # FALLBACK TEMPLATE API
@@ -58,7 +358,7 @@ def api_fallback(kind):
     tpl = template_service.load_template(kind)
     if not tpl:
         return jsonify({"ok": False, "error": "Template not found"}), 404
-    return jsonify({"ok": True, "template": tpl})
+    return jsonify({"ok": True, "template": localize(tpl, request.args.get("language", "en"))})
 
 # ----------------------------------------------------------------------
 # TRANSLATION API
@@ -73,7 +373,7 @@ def api_translate():
     if not text:
         return jsonify({"ok": False, "error": "No text provided"}), 400
 
-    translated = translate_service.translate_text(text, source, target)
+    translated = translate_service.translate_batch([text], target, source)[0]
     if not translated:
         return jsonify({"ok": False, "error": "Translation unavailable"}), 500
 
@@ -87,18 +387,22 @@ def api_alert():
     data = request.get_json() or {}
     emergency_type = data.get("type", "general")
     location = data.get("location", "[LOCATION UNKNOWN]")
+    language = data.get("language", "en")
+    nearest_shelter = resource_service.nearest_shelter(data.get("latitude"), data.get("longitude"))
 
+    # Translate the unfilled template (memoized at startup), then fill it in
     template = template_service.get_fallback_template(emergency_type)
     if not template:
         return jsonify({"ok": False, "error": "Template not found"}), 404
-
-    sms = template.get("sms_template", "").replace("[LOCATION]", location)
-    template["sms_template"] = sms
+    template = template_service.fill(
+        localize(template, language), location=location, nearest_shelter=nearest_shelter
+    )
 
     return jsonify({
         "ok": True,
         "type": emergency_type,
         "location": location,
+        "nearest_shelter": nearest_shelter,
         "data": template
     })
 
@@ -112,20 +416,34 @@ def api_sos():
     latitude = payload.get("latitude")
     longitude = payload.get("longitude")
     location_desc = payload.get("location")
+    idempotency_key = request.headers.get("Idempotency-Key") or payload.get("idempotency_key")
+    device_id = request.headers.get("X-Device-Id") or payload.get("device_id")
 
     try:
-        result = sos_service.send_emergency_sms(
+        result = sos_service.enqueue_emergency_sms(
             emergency_type=emergency_type,
             latitude=latitude,
             longitude=longitude,
-            location_desc=location_desc
+            location_desc=location_desc,
+            idempotency_key=idempotency_key,
+            device_id=device_id
         )
-        status_code = 200 if result.get("success") else 500
-        return jsonify({"ok": result.get("success"), "details": result}), status_code
+        if not result.get("success"):
+            return jsonify({"ok": False, "details": result}), 500
+        # 202: queued in the outbox; 200: sent synchronously (outbox disabled)
+        status_code = 202 if result.get("alert_id") else 200
+        return jsonify({"ok": True, "alert_id": result.get("alert_id"), "details": result}), status_code
 
     except Exception as exc:
         return jsonify({"ok": False, "error": str(exc)}), 500
 
+@app.route("/api/sos/<alert_id>", methods=["GET"])
+def api_sos_status(alert_id):
+    status = sos_service.get_alert_status(alert_id)
+    if not status:
+        return jsonify({"ok": False, "error": "Alert not found"}), 404
+    return jsonify({"ok": True, "alert": status})
+
 # ----------------------------------------------------------------------
 # EMERGENCY GENERATION API (LLM)
 # ----------------------------------------------------------------------
@@ -140,24 +458,55 @@ def api_generate():
     if not query and not kind:
         return jsonify({"ok": False, "error": "Query or type required"}), 400
 
-    prompt = (
-        "You are AidGen, an offline emergency assistant.\n"
-        "Return ONLY valid JSON with: title, summary, steps[], warnings[], sms_template.\n"
-        "If unsure return {\"error\": \"unknown\"}.\n\n"
-        f"CONTEXT:\nKind: {kind}\nLocation: {location}\nQuery: {query}\n"
-    )
+    prompt = build_generate_prompt(kind, location, query)
 
     try:
-        raw = call_ollama(prompt)
-        parsed = json.loads(raw)
-        return jsonify({"ok": True, "result": parsed})
+        # Generated in English once; translations come from the translation memo
+        parsed = generate_cached(prompt, make_cache_key(kind, location, "en", query))
+        return jsonify({"ok": True, "result": localize(parsed, language)})
 
     except Exception as e:
         tpl = template_service.load_template(kind)
         if tpl:
-            return jsonify({"ok": True, "fallback": True, "result": tpl})
+            template_fallbacks.inc()
+            return jsonify({"ok": True, "fallback": True, "result": localize(tpl, language)})
         return jsonify({"ok": False, "error": "LLM failed", "details": str(e)}), 500
 
+@app.route("/api/generate/stream", methods=["POST"])
+def api_generate_stream():
+    data = request.get_json() or {}
+    query = data.get("query", "")
+    kind = data.get("kind", "")
+    location = data.get("location", "")
+    language = data.get("language", "en")
+
+    if not query and not kind:
+        return jsonify({"ok": False, "error": "Query or type required"}), 400
+
+    prompt = build_generate_prompt(kind, location, query)
+
+    def events():
+        extractor = JSONStreamExtractor()
+        error = None
+        try:
+            yield from stream_partial_fields(prompt, extractor, PRIORITY_GENERATE)
+            parsed = finalize_response(extractor)
+            if parsed is not None:
+                yield sse_event("done", {"ok": True, "result": localize(parsed, language)})
+                return
+            error = "Invalid JSON from model"
+        except Exception as e:
+            error = str(e)
+
+        tpl = template_service.load_template(kind)
+        if tpl:
+            template_fallbacks.inc()
+            yield sse_event("done", {"ok": True, "fallback": True, "result": localize(tpl, language)})
+        else:
+            yield sse_event("done", {"ok": False, "error": "LLM failed", "details": error})
+
+    return sse_response(events())
+
 # ----------------------------------------------------------------------
 # EMERGENCY INSTRUCTIONS API
 # ----------------------------------------------------------------------
@@ -166,15 +515,17 @@ def api_emergency_instructions():
     data = request.get_json() or {}
     emergency_type = data.get("type", "general")
     location = data.get("location", "")
+    language = data.get("language", "en")
 
     try:
-        response = generate_emergency_response(emergency_type, location)
+        response = generate_emergency_response(emergency_type, location, language)
         return jsonify({"ok": True, "instructions": response})
 
     except Exception as e:
         tpl = template_service.load_template(emergency_type)
         if tpl:
-            return jsonify({"ok": True, "fallback": True, "instructions": tpl})
+            template_fallbacks.inc()
+            return jsonify({"ok": True, "fallback": True, "instructions": localize(tpl, language)})
         return jsonify({"ok": False, "error": "Could not load instructions"}), 500
 
 # ----------------------------------------------------------------------
@@ -190,38 +541,97 @@ def api_chat():
     if not message:
         return jsonify({"ok": False, "error": "No message provided"}), 400
 
-    # Prebuilt local responses
-    local_responses = {
-        "hello": "Hi there! How can I assist you today?",
-        "help": "Sure! Ask me anything and I will guide you.",
-        "bye": "Goodbye! Stay safe!",
-    }
-
-    reply = local_responses.get(message.lower())
+    session_id = data.get("session_id")
+    reply = local_reply(message, emergency_type)
     if not reply:
         # Fallback to Ollama
-        prompt = (
-            f"You are AidGen Chatbot, an emergency response assistant.\n"
-            f"Current emergency context: {emergency_type.upper()}\n\n"
-            f"Answer concisely and helpfully using structured guidance.\n"
-            f"Return ONLY valid JSON with: title, summary, steps (array), warnings (array), sms_template.\n"
-            f"User: {message}\nAidGen:\n"
-        )
+        session_id, session, prompt, turn = start_chat_turn(session_id, message, emergency_type)
         try:
-            response = call_ollama(prompt)
-            structured = extract_json(response)
+            structured = (similar_chat_answer(session, message, emergency_type)
+                          or call_ollama_chat(prompt, turn, priority=PRIORITY_CHAT))
             if structured and "summary" in structured:
                 reply = structured.get("summary", "")
+                finish_chat_turn(session_id, session, emergency_type, message, structured, turn)
             else:
-                reply = "I'm not sure about that. Can you rephrase?"
+                reply = CHAT_UNSURE_REPLY
+        except LoadShedError:
+            reply = CHAT_BUSY_REPLY
         except Exception as e:
-            reply = "⚠️ Error: Ollama backend failed."
+            reply = CHAT_ERROR_REPLY
+
+    return jsonify({"ok": True, "reply": reply, "session_id": session_id})
+
+@app.route("/api/chat/stream", methods=["POST"])
+def api_chat_stream():
+    data = request.get_json() or {}
+    message = data.get("message", "")
+    emergency_type = data.get("emergency_type", "general")
+
+    if not message:
+        return jsonify({"ok": False, "error": "No message provided"}), 400
+
+    def events():
+        session_id = data.get("session_id")
+        reply = local_reply(message, emergency_type)
+        if not reply:
+            session_id, session, prompt, turn = start_chat_turn(session_id, message, emergency_type)
+            extractor = JSONStreamExtractor()
+            try:
+                structured = similar_chat_answer(session, message, emergency_type)
+                if structured is None:
+                    yield from stream_partial_fields(prompt, extractor, PRIORITY_CHAT, turn)
+                    structured = finalize_response(extractor)
+                if structured and "summary" in structured:
+                    reply = structured.get("summary", "")
+                    finish_chat_turn(session_id, session, emergency_type, message, structured, turn)
+                else:
+                    reply = CHAT_UNSURE_REPLY
+            except LoadShedError:
+                reply = CHAT_BUSY_REPLY
+            except Exception:
+                reply = CHAT_ERROR_REPLY
+        yield sse_event("done", {"ok": True, "reply": reply, "session_id": session_id})
+
+    return sse_response(events())
+
+# ----------------------------------------------------------------------
+# DIAGNOSTICS
+# ----------------------------------------------------------------------
+@app.route("/api/diagnostics", methods=["GET"])
+def api_diagnostics():
+    return jsonify({
+        "ok": True,
+        "ollama": ollama_client.stats(),
+        "model": model_manager.stats(),
+        "single_flight": ollama_flights.stats(),
+        "scheduler": llm_scheduler.stats(),
+        "sos": sos_service.stats() if sos_service.built else None,
+        "response_cache": response_cache.stats(),
+        "shared_cache": shared_response_cache.stats() if shared_response_cache else None,
+        "answer_cache": answer_cache.stats() if answer_cache.built else None,
+        "resources": resource_service.stats(),
+        "json_parse": parse_stats.stats(),
+        "translation": translate_service.stats(),
+        "guidance_pack": guidance_pack.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "chat_intents": intent_matcher.stats(),
+        "lazy_services": [service.build_stats() for service in lazy_services]
+    })
+
+@app.route("/metrics", methods=["GET"])
+def api_metrics():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
 
-    return jsonify({"ok": True, "reply": reply})
+# Create every route's series up front so requests never allocate them
+for rule in app.url_map.iter_rules():
+    route_metrics.register(rule.rule)
 
 # ----------------------------------------------------------------------
 # RUN SERVER
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
+    if "--startup-report" in sys.argv:
+        from backend.startup import main
+        sys.exit(main([arg for arg in sys.argv[1:] if arg != "--startup-report"]))
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,498 @@
+# backend/asgi.py
+"""
+ASGI entry point for production serving:
+
+    uvicorn backend.asgi:application --host 0.0.0.0 --port 5000
+
+The LLM routes (/api/generate, /api/emergency/instructions, /api/chat and
+their /stream variants) run as coroutines on the event loop with an async
+HTTP client, so requests waiting on Ollama or the translator hold no
+thread. Their file and SQLite work (sessions, caches, templates) runs on
+the bridge's thread pool, so a database locked by another worker process
+never stalls the loop. Every other route is served by the Flask app in
+``backend/app.py`` on a thread pool. URLs, status codes and JSON bodies
+are identical to the Flask app's.
+"""
+import asyncio
+import functools
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from flask import jsonify
+
+from backend.app import (
+    CHAT_BUSY_REPLY,
+    CHAT_ERROR_REPLY,
+    CHAT_UNSURE_REPLY,
+    app as flask_app,
+    build_generate_prompt,
+    finish_chat_turn,
+    local_reply,
+    similar_chat_answer,
+    sos_service,
+    sse_event,
+    start_background_work,
+    start_chat_turn,
+    summary_update,
+)
+from backend.config import config
+from backend.services import template_service, translate_service
+from backend.services.metrics_service import route_metrics
+from backend.services.llm_service import (
+    JSONStreamExtractor,
+    LoadShedError,
+    PRIORITY_CHAT,
+    PRIORITY_GENERATE,
+    RESPONSE_SCHEMA,
+    call_ollama_chat_async,
+    call_ollama_stream_async,
+    extract_partial_fields,
+    finalize_response,
+    generate_cached_async,
+    generate_emergency_response_async,
+    make_cache_key,
+    ollama_client,
+    template_fallbacks,
+)
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+
+# ----------------------------------------------------------------------
+# WSGI BRIDGE (everything that is not an async route)
+# ----------------------------------------------------------------------
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope and its buffered body."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+        environ["REMOTE_PORT"] = str(scope["client"][1])
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1")
+        if name == "content-type":
+            key = "CONTENT_TYPE"
+        elif name == "content-length":
+            key = "CONTENT_LENGTH"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class WSGIBridge:
+    """Serves a WSGI app to ASGI requests, one pool thread per request in flight.
+
+    (asgiref's ``WsgiToAsgi`` runs every request on a single shared thread.)
+    """
+
+    def __init__(self, wsgi_app, max_workers: int):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send, body: bytes = None):
+        if body is None:
+            body = await read_body(receive)
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, body)
+
+        def push(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            response = {"started": False}
+
+            def write(data):
+                if not response["started"]:
+                    push({"type": "http.response.start", "status": response["status"],
+                          "headers": response["headers"]})
+                    response["started"] = True
+                if data:
+                    push({"type": "http.response.body", "body": data, "more_body": True})
+
+            def start_response(status, headers, exc_info=None):
+                response["status"] = int(status.split(" ", 1)[0])
+                response["headers"] = [
+                    (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers
+                ]
+                return write
+
+            result = self.wsgi_app(environ, start_response)
+            try:
+                for data in result:
+                    write(data)
+                write(b"")
+                push({"type": "http.response.body", "body": b"", "more_body": False})
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+
+        await loop.run_in_executor(self.executor, run)
+
+
+wsgi_bridge = WSGIBridge(flask_app, config.ASGI_WSGI_THREADS)
+
+
+async def run_blocking(fn, *args):
+    """Run a blocking call (SQLite stores, template and index files) on the bridge's pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(wsgi_bridge.executor, functools.partial(fn, *args))
+
+
+# ----------------------------------------------------------------------
+# REQUEST / RESPONSE HELPERS
+# ----------------------------------------------------------------------
+async def read_body(receive):
+    body = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(body)
+
+
+def parse_json(scope, body):
+    """The request's JSON object, or None if Flask should handle the request."""
+    for name, value in scope.get("headers", []):
+        if name == b"content-type":
+            mimetype = value.split(b";", 1)[0].strip().lower()
+            if mimetype == b"application/json" or (
+                mimetype.startswith(b"application/") and mimetype.endswith(b"+json")
+            ):
+                break
+    else:
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if data is None:
+        return {}
+    return data if isinstance(data, dict) else None
+
+
+async def send_json(send, payload, status=200):
+    # Serialize exactly as the Flask routes do
+    with flask_app.app_context():
+        response = jsonify(payload)
+    body = response.get_data()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", response.content_type.encode("latin-1")),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_events(receive, send, events):
+    """Stream SSE events; a client disconnect cancels the generation behind them."""
+    await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+
+    async def wait_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(wait_disconnect())
+    try:
+        async for event in events:
+            if watcher.done():
+                break
+            await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+        if not watcher.done():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        watcher.cancel()
+        await events.aclose()
+
+
+async def localize(result, language):
+    if not result or not language or language == "en":
+        return result
+    return await translate_service.translate_response_async(result, language)
+
+
+async def stream_partial_fields(prompt, extractor, priority, turn=None):
+    """Async version of ``backend.app.stream_partial_fields``."""
+    buffer = ""
+    sent_summary = ""
+    sent_steps = 0
+
+    stream = call_ollama_stream_async(
+        prompt, priority=priority, schema=RESPONSE_SCHEMA,
+        context=turn and turn.context, on_done=turn and turn.on_done
+    )
+    try:
+        async for chunk in stream:
+            if extractor.done:
+                # A chat turn reads on for the final chunk, which carries the session context
+                if turn.stop():
+                    break
+                continue
+            closed = extractor.feed(chunk)
+            buffer += chunk
+            partial = extract_partial_fields(buffer)
+
+            summary = partial["summary"]
+            if summary and summary != sent_summary:
+                yield sse_event("summary", summary_update(summary, sent_summary))
+                sent_summary = summary
+
+            for index in range(sent_steps, len(partial["steps"])):
+                yield sse_event("step", {"index": index, "step": partial["steps"][index]})
+            sent_steps = len(partial["steps"])
+
+            if closed and turn is None:
+                break
+    finally:
+        await stream.aclose()
+
+
+# ----------------------------------------------------------------------
+# ASYNC ROUTES (same contracts as the Flask routes of the same name)
+# ----------------------------------------------------------------------
+async def api_generate(data):
+    query = data.get("query", "")
+    kind = data.get("kind", "")
+    location = data.get("location", "")
+    language = data.get("language", "en")
+
+    if not query and not kind:
+        return {"ok": False, "error": "Query or type required"}, 400
+
+    prompt = build_generate_prompt(kind, location, query)
+
+    try:
+        parsed = await generate_cached_async(prompt, make_cache_key(kind, location, "en", query))
+        return {"ok": True, "result": await localize(parsed, language)}, 200
+
+    except Exception as e:
+        tpl = await run_blocking(template_service.load_template, kind)
+        if tpl:
+            template_fallbacks.inc()
+            return {"ok": True, "fallback": True, "result": await localize(tpl, language)}, 200
+        return {"ok": False, "error": "LLM failed", "details": str(e)}, 500
+
+
+async def api_generate_stream(data):
+    query = data.get("query", "")
+    kind = data.get("kind", "")
+    location = data.get("location", "")
+    language = data.get("language", "en")
+
+    if not query and not kind:
+        return {"ok": False, "error": "Query or type required"}, 400
+
+    prompt = build_generate_prompt(kind, location, query)
+
+    async def events():
+        extractor = JSONStreamExtractor()
+        error = None
+        try:
+            async for event in stream_partial_fields(prompt, extractor, PRIORITY_GENERATE):
+                yield event
+            parsed = finalize_response(extractor)
+            if parsed is not None:
+                yield sse_event("done", {"ok": True, "result": await localize(parsed, language)})
+                return
+            error = "Invalid JSON from model"
+        except Exception as e:
+            error = str(e)
+
+        tpl = await run_blocking(template_service.load_template, kind)
+        if tpl:
+            template_fallbacks.inc()
+            yield sse_event("done", {"ok": True, "fallback": True, "result": await localize(tpl, language)})
+        else:
+            yield sse_event("done", {"ok": False, "error": "LLM failed", "details": error})
+
+    return events()
+
+
+async def api_emergency_instructions(data):
+    emergency_type = data.get("type", "general")
+    location = data.get("location", "")
+    language = data.get("language", "en")
+
+    try:
+        response = await generate_emergency_response_async(emergency_type, location, language)
+        return {"ok": True, "instructions": response}, 200
+
+    except Exception as e:
+        tpl = await run_blocking(template_service.load_template, emergency_type)
+        if tpl:
+            template_fallbacks.inc()
+            return {"ok": True, "fallback": True, "instructions": await localize(tpl, language)}, 200
+        return {"ok": False, "error": "Could not load instructions"}, 500
+
+
+async def api_chat(data):
+    message = data.get("message", "")
+    emergency_type = data.get("emergency_type", "general")
+
+    if not message:
+        return {"ok": False, "error": "No message provided"}, 400
+
+    session_id = data.get("session_id")
+    reply = await run_blocking(local_reply, message, emergency_type)
+    if not reply:
+        session_id, session, prompt, turn = await run_blocking(
+            start_chat_turn, session_id, message, emergency_type
+        )
+        try:
+            structured = (await run_blocking(similar_chat_answer, session, message, emergency_type)
+                          or await call_ollama_chat_async(prompt, turn, priority=PRIORITY_CHAT))
+            if structured and "summary" in structured:
+                reply = structured.get("summary", "")
+                await run_blocking(
+                    finish_chat_turn, session_id, session, emergency_type, message, structured, turn
+                )
+            else:
+                reply = CHAT_UNSURE_REPLY
+        except LoadShedError:
+            reply = CHAT_BUSY_REPLY
+        except Exception:
+            reply = CHAT_ERROR_REPLY
+
+    return {"ok": True, "reply": reply, "session_id": session_id}, 200
+
+
+async def api_chat_stream(data):
+    message = data.get("message", "")
+    emergency_type = data.get("emergency_type", "general")
+
+    if not message:
+        return {"ok": False, "error": "No message provided"}, 400
+
+    async def events():
+        session_id = data.get("session_id")
+        reply = await run_blocking(local_reply, message, emergency_type)
+        if not reply:
+            session_id, session, prompt, turn = await run_blocking(
+                start_chat_turn, session_id, message, emergency_type
+            )
+            extractor = JSONStreamExtractor()
+            try:
+                structured = await run_blocking(similar_chat_answer, session, message, emergency_type)
+                if structured is None:
+                    async for event in stream_partial_fields(prompt, extractor, PRIORITY_CHAT, turn):
+                        yield event
+                    structured = finalize_response(extractor)
+                if structured and "summary" in structured:
+                    reply = structured.get("summary", "")
+                    await run_blocking(
+                        finish_chat_turn, session_id, session, emergency_type, message, structured, turn
+                    )
+                else:
+                    reply = CHAT_UNSURE_REPLY
+            except LoadShedError:
+                reply = CHAT_BUSY_REPLY
+            except Exception:
+                reply = CHAT_ERROR_REPLY
+        yield sse_event("done", {"ok": True, "reply": reply, "session_id": session_id})
+
+    return events()
+
+
+ASYNC_ROUTES = {
+    "/api/generate": api_generate,
+    "/api/generate/stream": api_generate_stream,
+    "/api/emergency/instructions": api_emergency_instructions,
+    "/api/chat": api_chat,
+    "/api/chat/stream": api_chat_stream,
+}
+
+
+# ----------------------------------------------------------------------
+# ASGI APPLICATION
+# ----------------------------------------------------------------------
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            start_background_work()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Runs once in-flight requests are done; SMS this worker already
+            # claimed from the outbox get the same grace period to go out
+            if sos_service.built:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, sos_service.shutdown, config.SERVER_GRACEFUL_TIMEOUT
+                )
+            await ollama_client.aclose()
+            await translate_service.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    handler = ASYNC_ROUTES.get(scope["path"]) if scope["method"] == "POST" else None
+    if handler is None:
+        await wsgi_bridge(scope, receive, send)
+        return
+
+    started = time.perf_counter()
+    body = await read_body(receive)
+    data = parse_json(scope, body)
+    if data is None:
+        # Let Flask produce its usual error for a non-JSON body
+        await wsgi_bridge(scope, receive, send, body=body)
+        return
+
+    result = await handler(data)
+    if isinstance(result, tuple):
+        payload, status = result
+        await send_json(send, payload, status)
+    else:
+        status = 200
+        await send_events(receive, send, result)
+    route_metrics.observe(scope["path"], status, time.perf_counter() - started)
+
+# ----------------------------------------------------------------------
+# RUN SERVER
+# ----------------------------------------------------------------------
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.environ.get("PORT", 5000))
+    uvicorn.run(application, host="0.0.0.0", port=port)
@@ -0,0 +1,43 @@
+# backend/build_guidance_pack.py
+"""
+Builds the offline guidance pack served by /api/emergency/instructions:
+
+    python -m backend.build_guidance_pack
+    python -m backend.build_guidance_pack --types earthquake,flood --languages es,hi
+
+Needs Ollama (and the translation server for languages other than English).
+Entries that fail keep their previous version; the exit status is 1 if any did.
+A running server reloads the new pack within a few seconds.
+"""
+import argparse
+import os
+import sys
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.config import config
+from backend.services.guidance_service import guidance_pack
+from backend.services.llm_service import build_guidance_pack
+
+
+def split(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the offline guidance pack")
+    parser.add_argument("--types", type=split, default=config.GUIDANCE_PACK_TYPES,
+                        help="comma-separated emergency types (default: GUIDANCE_PACK_TYPES)")
+    parser.add_argument("--languages", type=split, default=config.GUIDANCE_PACK_LANGUAGES,
+                        help="comma-separated languages besides English (default: GUIDANCE_PACK_LANGUAGES)")
+    args = parser.parse_args(argv)
+
+    result = build_guidance_pack(args.types, args.languages)
+    print(f"Built {result['built']} entries ({result['failed']} failed) into {guidance_pack.path}")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,162 @@ class Config:
     # SOS contact configuration (format: "Name:+1234567890,Another:+1987654321")
     SOS_EMERGENCY_CONTACTS = os.getenv('SOS_EMERGENCY_CONTACTS', '')
 
+    # SOS fan-out: parallel sends, per-contact deadline (seconds) and retries
+    SOS_MAX_WORKERS = int(os.getenv('SOS_MAX_WORKERS', '16'))
+    SOS_CONTACT_DEADLINE = float(os.getenv('SOS_CONTACT_DEADLINE', '15'))
+    SOS_MAX_RETRIES = int(os.getenv('SOS_MAX_RETRIES', '3'))
+    SOS_RETRY_BASE_DELAY = float(os.getenv('SOS_RETRY_BASE_DELAY', '0.5'))
+    SOS_RETRY_MAX_DELAY = float(os.getenv('SOS_RETRY_MAX_DELAY', '4'))
+    # Seconds one HTTP call to the SMS provider may take, at most SOS_CONTACT_DEADLINE
+    # (whole seconds: the Vonage SDK takes an int)
+    SOS_SMS_TIMEOUT = int(os.getenv('SOS_SMS_TIMEOUT', '10'))
+    # Durable SOS outbox (SQLite, WAL mode) drained by a background dispatcher
+    SOS_USE_OUTBOX = os.getenv('SOS_USE_OUTBOX', 'True') == 'True'
+    SOS_OUTBOX_PATH = os.getenv('SOS_OUTBOX_PATH', str(BASE_DIR / 'db' / 'sos_outbox.sqlite3'))
+    SOS_OUTBOX_BATCH_SIZE = int(os.getenv('SOS_OUTBOX_BATCH_SIZE', '50'))
+    SOS_OUTBOX_MAX_ATTEMPTS = int(os.getenv('SOS_OUTBOX_MAX_ATTEMPTS', '5'))
+    # Seconds a claimed delivery stays leased; must outlast SOS_CONTACT_DEADLINE plus
+    # SOS_SMS_TIMEOUT, or another dispatcher re-sends an SMS that is still in flight
+    SOS_OUTBOX_LEASE = float(os.getenv('SOS_OUTBOX_LEASE', '60'))
+    # Repeat SOS taps from the same device within this many seconds update the
+    # queued alert's location instead of messaging every contact again
+    SOS_DEBOUNCE_WINDOW = float(os.getenv('SOS_DEBOUNCE_WINDOW', '120'))
+    # Outbound SMS throughput (messages/second and burst), globally and per number. With the
+    # outbox the buckets live in its SQLite file, so the limits hold for all worker processes
+    # together; without it each process gets the full rates.
+    SOS_RATE_GLOBAL = float(os.getenv('SOS_RATE_GLOBAL', '30'))
+    SOS_RATE_GLOBAL_BURST = float(os.getenv('SOS_RATE_GLOBAL_BURST', '30'))
+    SOS_RATE_PER_DESTINATION = float(os.getenv('SOS_RATE_PER_DESTINATION', '0.2'))
+    SOS_RATE_PER_DESTINATION_BURST = float(os.getenv('SOS_RATE_PER_DESTINATION_BURST', '3'))
+    # Use the in-process fake SMS client instead of Vonage (benchmarks, offline dev)
+    SOS_FAKE_SMS = os.getenv('SOS_FAKE_SMS', 'False') == 'True'
+    SOS_FAKE_SMS_LATENCY = float(os.getenv('SOS_FAKE_SMS_LATENCY', '0.2'))
+
+    # LibreTranslate-compatible translation server and its on-disk memo
+    # (the Flask app itself listens on 5000, so the translator defaults to 5001)
+    TRANSLATE_URL = os.getenv('TRANSLATE_URL', 'http://localhost:5001')
+    TRANSLATE_MEMO_PATH = os.getenv('TRANSLATE_MEMO_PATH', str(BASE_DIR / 'db' / 'translations.sqlite3'))
+    TRANSLATE_CONNECT_TIMEOUT = float(os.getenv('TRANSLATE_CONNECT_TIMEOUT', '2'))
+    TRANSLATE_READ_TIMEOUT = float(os.getenv('TRANSLATE_READ_TIMEOUT', '15'))
+    # Languages the fallback templates are pre-translated into at startup (e.g. "es,fr,hi")
+    TRANSLATE_LANGUAGES = [
+        lang.strip() for lang in os.getenv('TRANSLATE_LANGUAGES', '').split(',') if lang.strip()
+    ]
+
+    # Offline guidance pack: instructions pre-generated per emergency type x language
+    # (python -m backend.build_guidance_pack), served to requests without a named place
+    GUIDANCE_PACK_PATH = os.getenv('GUIDANCE_PACK_PATH', str(BASE_DIR / 'db' / 'guidance_pack.json.gz'))
+    GUIDANCE_PACK_TYPES = [
+        t.strip() for t in os.getenv('GUIDANCE_PACK_TYPES', 'earthquake,fire,flood,tsunami,general').split(',')
+        if t.strip()
+    ]
+    GUIDANCE_PACK_LANGUAGES = [
+        lang.strip() for lang in os.getenv('GUIDANCE_PACK_LANGUAGES', ','.join(TRANSLATE_LANGUAGES)).split(',')
+        if lang.strip()
+    ]
+    # Seconds between background rebuilds of the pack (0 disables)
+    GUIDANCE_PACK_REFRESH = float(os.getenv('GUIDANCE_PACK_REFRESH', '21600'))
+
+    # Threads serving the Flask routes under the ASGI entry point (backend/asgi.py)
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '32'))
+    # Production server (python -m backend.serve): worker processes, and seconds a
+    # retiring worker may spend finishing in-flight requests and SMS deliveries
+    SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+    SERVER_PORT = int(os.getenv('PORT', '5000'))
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', str(os.cpu_count() or 1)))
+    SERVER_GRACEFUL_TIMEOUT = float(os.getenv('SERVER_GRACEFUL_TIMEOUT', '30'))
+
+    # /api/resources pagination defaults
+    RESOURCE_PAGE_SIZE = int(os.getenv('RESOURCE_PAGE_SIZE', '50'))
+    RESOURCE_MAX_PAGE_SIZE = int(os.getenv('RESOURCE_MAX_PAGE_SIZE', '500'))
+    # Most resources /api/resources/nearest returns for one query
+    RESOURCE_NEAREST_MAX_K = int(os.getenv('RESOURCE_NEAREST_MAX_K', '50'))
+    # Columnar snapshots of backend/data, rebuilt when a file changes and memory-mapped
+    # so worker processes share one copy ('' disables snapshots)
+    RESOURCE_SNAPSHOT_DIR = os.getenv('RESOURCE_SNAPSHOT_DIR', str(BASE_DIR / 'db' / 'resources'))
+    RESOURCE_MMAP = os.getenv('RESOURCE_MMAP', 'True') == 'True'
+
+    # Ollama client (pooled keep-alive session + circuit breaker)
+    OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+    OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'aidgen:latest')
+    OLLAMA_POOL_SIZE = int(os.getenv('OLLAMA_POOL_SIZE', '16'))
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '2'))
+    OLLAMA_READ_TIMEOUT = float(os.getenv('OLLAMA_READ_TIMEOUT', '30'))
+    # Consecutive failed or slow calls before the breaker opens
+    OLLAMA_BREAKER_FAILURES = int(os.getenv('OLLAMA_BREAKER_FAILURES', '5'))
+    # Calls slower than this many seconds count as failures
+    OLLAMA_BREAKER_SLOW_CALL = float(os.getenv('OLLAMA_BREAKER_SLOW_CALL', '20'))
+    # Seconds the breaker stays open before letting a half-open probe through
+    OLLAMA_BREAKER_COOLDOWN = float(os.getenv('OLLAMA_BREAKER_COOLDOWN', '30'))
+
+    # Model residency. keep_alive is sent with every request: seconds, a duration such as
+    # "30m", or -1 to keep the model loaded indefinitely. num_ctx is fixed because a
+    # request with a different context size makes Ollama reload the model.
+    # num_thread 0 leaves the CPU thread count to Ollama.
+    OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '-1')
+    OLLAMA_NUM_CTX = int(os.getenv('OLLAMA_NUM_CTX', '2048'))
+    OLLAMA_NUM_THREAD = int(os.getenv('OLLAMA_NUM_THREAD', '0'))
+    # Load the model at startup, then check /api/ps every N seconds and reload it if evicted
+    OLLAMA_WARMUP = os.getenv('OLLAMA_WARMUP', 'True') == 'True'
+    OLLAMA_RESIDENCY_CHECK = float(os.getenv('OLLAMA_RESIDENCY_CHECK', '30'))
+    # Seconds allowed for a model load (large models on slow disks take minutes)
+    OLLAMA_LOAD_TIMEOUT = float(os.getenv('OLLAMA_LOAD_TIMEOUT', '300'))
+
+    # LLM scheduler: adaptive concurrency bounds and latency target (seconds)
+    LLM_MIN_CONCURRENCY = int(os.getenv('LLM_MIN_CONCURRENCY', '1'))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+    LLM_TARGET_LATENCY = float(os.getenv('LLM_TARGET_LATENCY', '10'))
+    # Per-class queue length and queueing budget (instructions > generate > chat)
+    LLM_QUEUE_INSTRUCTIONS = int(os.getenv('LLM_QUEUE_INSTRUCTIONS', '64'))
+    LLM_QUEUE_GENERATE = int(os.getenv('LLM_QUEUE_GENERATE', '32'))
+    LLM_QUEUE_CHAT = int(os.getenv('LLM_QUEUE_CHAT', '16'))
+    LLM_BUDGET_INSTRUCTIONS = float(os.getenv('LLM_BUDGET_INSTRUCTIONS', '5'))
+    LLM_BUDGET_GENERATE = float(os.getenv('LLM_BUDGET_GENERATE', '8'))
+    LLM_BUDGET_CHAT = float(os.getenv('LLM_BUDGET_CHAT', '3'))
+    # Per-class generation caps (Ollama num_predict, in tokens). A full answer at the
+    # Modelfile limits (8 steps x 140 chars, 160-char SMS, title, summary and
+    # warnings) is ~2,200 characters, about 550 tokens; chat replies are shorter.
+    LLM_NUM_PREDICT_INSTRUCTIONS = int(os.getenv('LLM_NUM_PREDICT_INSTRUCTIONS', '600'))
+    LLM_NUM_PREDICT_GENERATE = int(os.getenv('LLM_NUM_PREDICT_GENERATE', '600'))
+    LLM_NUM_PREDICT_CHAT = int(os.getenv('LLM_NUM_PREDICT_CHAT', '400'))
+
+    # LLM response cache (entries, seconds fresh, extra seconds served stale)
+    LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '512'))
+    LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '600'))
+    LLM_CACHE_STALE_TTL = float(os.getenv('LLM_CACHE_STALE_TTL', '3600'))
+    # Cross-process tier under the LLM response cache, so every worker (and a
+    # restarted server) reuses answers generated by the others ('' disables it)
+    SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH', str(BASE_DIR / 'db' / 'shared_cache.sqlite3'))
+    SHARED_CACHE_SIZE = int(os.getenv('SHARED_CACHE_SIZE', '20000'))
+    # Decimal places kept when coarsening "Lat: .., Long: .." cache keys (1 ≈ 11 km)
+    LLM_CACHE_COORD_PRECISION = int(os.getenv('LLM_CACHE_COORD_PRECISION', '1'))
+
+    # Chat questions answered from the FAQ, templates and resources without the model
+    # when the best match covers at least this IDF-weighted share of the question
+    CHAT_INTENT_THRESHOLD = float(os.getenv('CHAT_INTENT_THRESHOLD', '0.8'))
+
+    # Chat sessions: Ollama's context tokens plus recent turns, kept in SQLite.
+    # Idle sessions expire after SESSION_TTL seconds; the least recently used are
+    # dropped beyond SESSION_MAX. Only the last SESSION_MAX_TURNS turns are kept, and
+    # a context longer than SESSION_MAX_CONTEXT tokens is dropped and rebuilt from
+    # them, so a long conversation never overflows OLLAMA_NUM_CTX.
+    SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', str(BASE_DIR / 'db' / 'sessions.sqlite3'))
+    SESSION_TTL = float(os.getenv('SESSION_TTL', '3600'))
+    SESSION_MAX = int(os.getenv('SESSION_MAX', '10000'))
+    SESSION_MAX_TURNS = int(os.getenv('SESSION_MAX_TURNS', '6'))
+    SESSION_MAX_CONTEXT = int(os.getenv('SESSION_MAX_CONTEXT', '1536'))
+
+    # Answers reused for reworded questions: a free-text generate or opening chat
+    # question whose character n-gram vector has cosine similarity of at least
+    # ANSWER_CACHE_THRESHOLD with a cached one in the same scope gets its answer.
+    # Least recently used answers are dropped beyond ANSWER_CACHE_SIZE.
+    ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', str(BASE_DIR / 'db' / 'answer_cache.sqlite3'))
+    ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '2048'))
+    ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '86400'))
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.85'))
+    # Seconds between checks for answers stored by other worker processes
+    ANSWER_CACHE_SYNC_INTERVAL = float(os.getenv('ANSWER_CACHE_SYNC_INTERVAL', '1'))
+
     @classmethod
     def _has_sos_contacts(cls) -> bool:
         for raw in (cls.SOS_EMERGENCY_CONTACTS or '').split(','):
@@ -51,10 +207,5 @@ class Config:
                 f"Missing required environment variables: {', '.join(missing_vars)}"
             )
 
-# Initialize and validate config
+# Initialize config (validated when the app starts, see backend.app.start_background_work)
 config = Config()
-try:
-    config.validate_config()
-except ValueError as e:
-    import warnings
-    warnings.warn(str(e))
@@ -0,0 +1,75 @@
+"""
+Production server: the ASGI app (backend/asgi.py) in several worker processes.
+
+    python -m backend.serve                     # SERVER_WORKERS workers on PORT
+    python -m backend.serve --workers 4 --port 8000
+
+One parent process binds the socket and supervises the workers, replacing
+any that die. The workers share the LLM response cache and the reworded-
+question answers through SQLite, memory-map the same resource snapshot,
+and drain the same SOS outbox. The parent never imports the app itself.
+
+Signals sent to the parent:
+    HUP    rolling restart: each worker is replaced by a fresh one, which must
+           be serving before the old one stops. The old worker finishes its
+           in-flight requests and SMS deliveries first (SERVER_GRACEFUL_TIMEOUT).
+    TTIN   one more worker
+    TTOU   one fewer worker
+    TERM   graceful shutdown
+"""
+import argparse
+import os
+import socket
+import sys
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from backend.config import config
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """The listening socket the workers share.
+
+    Created with an explicit IPPROTO_TCP: asyncio only sets TCP_NODELAY on
+    accepted connections whose socket says it is TCP, and without it every
+    small response waits ~40 ms for a delayed ACK.
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=config.SERVER_WORKERS)
+    parser.add_argument('--graceful-timeout', type=float, default=config.SERVER_GRACEFUL_TIMEOUT,
+                        help='seconds a stopping worker may spend on in-flight requests')
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args(argv)
+
+    server_config = uvicorn.Config(
+        'backend.asgi:application',
+        host=args.host,
+        port=args.port,
+        workers=max(1, args.workers),
+        lifespan='on',
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+    )
+    # The supervisor even for one worker, so HUP is a rolling restart rather than an exit
+    Multiprocess(server_config, sockets=[bind_socket(args.host, args.port)]).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
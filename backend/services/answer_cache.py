@@ -0,0 +1,265 @@
+"""
+Near-duplicate answer cache: reuses a validated answer for a reworded question.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from ..config import config
+from .intent_service import stem
+from .lazy_service import LazyService
+from .metrics_service import metrics
+
+# Character n-gram length and hashed vector width
+NGRAM = 3
+DIMENSIONS = 512
+# Seconds of already-synced history re-read on each sync, for rows another
+# process stamped before the last sync but committed after it
+SYNC_OVERLAP = 5.0
+
+
+# Words a question's meaning does not depend on. Deliberately short: unlike the
+# intent matcher's stopwords, it keeps question words, negations and prepositions,
+# because "when/where should I evacuate" or "turn on/off the gas" need different answers.
+STOPWORDS = frozenset("""
+a an the please hi hello hey thanks thank ok okay um uh just so
+""".split())
+
+# Words that change what is being asked. Two questions only share an answer
+# when these appear in both, in the same order (see SimilarAnswerCache).
+FUNCTION_WORDS = frozenset("""
+what when where which who whom whose why how
+no not never nor without cannot
+on off in out into onto up down over under above below before after during
+inside outside near from to with through across around behind between
+""".split())
+
+# Words, keeping contractions ("don't", "can't") whole
+_WORD = re.compile(r"\w+(?:'\w+)?")
+
+
+def _is_function_word(token: str) -> bool:
+    return token in FUNCTION_WORDS or token.endswith("n't")
+
+
+def normalize_query(query: str) -> str:
+    """Case-, punctuation- and filler-insensitive form of a question."""
+    tokens = _WORD.findall((query or "").lower().replace("\u2019", "'"))
+    return " ".join(
+        token if _is_function_word(token) else stem(token)
+        for token in tokens if token not in STOPWORDS
+    )
+
+
+def function_words(normalized: str) -> str:
+    """The question words, negations and prepositions of a normalized question, in order."""
+    return " ".join(token for token in normalized.split() if _is_function_word(token))
+
+
+def _vector(normalized: str) -> np.ndarray:
+    """L2-normalized hashed character n-gram counts of a normalized question."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    padded = f" {normalized} "
+    for i in range(len(padded) - NGRAM + 1):
+        # crc32 rather than hash(): vectors must not change between processes
+        h = zlib.crc32(padded[i:i + NGRAM].encode("utf-8"))
+        # The sign bit halves the bias that colliding n-grams add to the similarity
+        vector[h % DIMENSIONS] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SimilarAnswerCache:
+    """Validated answers keyed by question, matched by n-gram cosine similarity.
+
+    All vectors sit in one pre-allocated NumPy matrix, so a lookup is a
+    single matrix-vector product over every cached question. Only rows in
+    the lookup's scope count (e.g. the emergency type, location and
+    language the answer was generated for), and the scope includes the
+    question's :func:`function_words`, so "where should I evacuate" never
+    matches "when should I evacuate", however similar the characters are. Entries are evicted least
+    recently used first, expire after ``ttl`` seconds and are written
+    through to SQLite, so a restarted server starts warm, and lookups pick
+    up answers other worker processes stored at most ``sync_interval``
+    seconds ago.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_size: int = None, ttl: float = None,
+                 threshold: float = None, name: str = "answer_cache",
+                 sync_interval: float = None):
+        """Initialize the cache.
+
+        Args:
+            db_path: SQLite file (default: ``ANSWER_CACHE_PATH``); empty
+                string keeps the cache in memory only
+            max_size: Maximum number of answers (default: ``ANSWER_CACHE_SIZE``)
+            ttl: Seconds an answer is served (default: ``ANSWER_CACHE_TTL``)
+            threshold: Minimum cosine similarity to reuse an answer
+                (default: ``ANSWER_CACHE_THRESHOLD``)
+            name: Name reported in :meth:`stats` and metrics
+            sync_interval: Minimum seconds between reads of answers stored by
+                other processes (default: ``ANSWER_CACHE_SYNC_INTERVAL``)
+        """
+        self.db_path = config.ANSWER_CACHE_PATH if db_path is None else db_path
+        self.max_size = config.ANSWER_CACHE_SIZE if max_size is None else max_size
+        self.ttl = config.ANSWER_CACHE_TTL if ttl is None else ttl
+        self.threshold = config.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.name = name
+        self.sync_interval = config.ANSWER_CACHE_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self._vectors = np.zeros((self.max_size, DIMENSIONS), dtype=np.float32)
+        # Scope id per row; -1 marks a free row, which never matches
+        self._scopes = np.full(self.max_size, -1, dtype=np.int32)
+        self._stored_at = np.zeros(self.max_size, dtype=np.float64)
+        self._scope_ids: Dict[str, int] = {}
+        self._rows: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._keys: Dict[int, Tuple[str, str]] = {}
+        self._answers: Dict[int, Any] = {}
+        self._free = list(range(self.max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+        self._conn = None
+        self._synced_to = 0.0
+        self._synced_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(
+                self.db_path, isolation_level=None, check_same_thread=False, timeout=30
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (scope TEXT NOT NULL, query TEXT NOT NULL, "
+                "answer TEXT NOT NULL, stored_at REAL NOT NULL, PRIMARY KEY (scope, query))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS answers_stored_at ON answers (stored_at)")
+            self._load()
+
+    @staticmethod
+    def _scope_key(scope: Tuple, normalized: str) -> str:
+        parts = [str(part).strip().lower() for part in scope] + [function_words(normalized)]
+        return json.dumps(parts, ensure_ascii=False)
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT scope, query, answer, stored_at FROM answers WHERE stored_at > ? "
+            "ORDER BY stored_at DESC LIMIT ?",
+            (time.time() - self.ttl, self.max_size)
+        ).fetchall()
+        # Oldest first, so the most recent answers end up most recently used
+        for scope, query, answer, stored_at in reversed(rows):
+            self._insert(scope, query, json.loads(answer), stored_at)
+            self._synced_to = max(self._synced_to, stored_at)
+        self._conn.execute("DELETE FROM answers WHERE stored_at <= ?", (time.time() - self.ttl,))
+
+    def _sync(self) -> None:
+        """Pick up answers other worker processes stored since the last sync."""
+        self._synced_at = time.monotonic()
+        rows = self._conn.execute(
+            "SELECT scope, query, answer, stored_at FROM answers WHERE stored_at > ? "
+            "ORDER BY stored_at",
+            (max(self._synced_to - SYNC_OVERLAP, time.time() - self.ttl),)
+        ).fetchall()
+        for scope, query, answer, stored_at in rows:
+            row = self._rows.get((scope, query))
+            if row is None or self._stored_at[row] < stored_at:
+                self._insert(scope, query, json.loads(answer), stored_at)
+            self._synced_to = max(self._synced_to, stored_at)
+
+    def _insert(self, scope: str, query: str, answer: Any, stored_at: float) -> None:
+        key = (scope, query)
+        row = self._rows.pop(key, None)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                (old_scope, old_query), row = self._rows.popitem(last=False)
+                self.evictions += 1
+                if self._conn is not None:
+                    self._conn.execute(
+                        "DELETE FROM answers WHERE scope = ? AND query = ?", (old_scope, old_query)
+                    )
+        scope_id = self._scope_ids.setdefault(scope, len(self._scope_ids))
+        self._vectors[row] = _vector(query)
+        self._scopes[row] = scope_id
+        self._stored_at[row] = stored_at
+        self._answers[row] = answer
+        self._keys[row] = key
+        self._rows[key] = row
+
+    def get(self, scope: Tuple, query: str) -> Any:
+        """The stored answer to the most similar question in ``scope``, or None."""
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        scope = self._scope_key(scope, normalized)
+        with self._lock:
+            if self._conn is not None and time.monotonic() - self._synced_at >= self.sync_interval:
+                self._sync()
+            scope_id = self._scope_ids.get(scope)
+            row = self._rows.get((scope, normalized))
+            if row is None and scope_id is not None:
+                similarity = self._vectors @ _vector(normalized)
+                similarity[self._scopes != scope_id] = -1.0
+                similarity[self._stored_at <= time.time() - self.ttl] = -1.0
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    row = best
+            if row is None or self._stored_at[row] <= time.time() - self.ttl:
+                self.misses += 1
+                return None
+            self._rows.move_to_end(self._keys[row])
+            self.hits += 1
+            return self._answers[row]
+
+    def put(self, scope: Tuple, query: str, answer: Any) -> None:
+        """Stores a validated answer to ``query`` in ``scope``."""
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        scope = self._scope_key(scope, normalized)
+        now = time.time()
+        with self._lock:
+            row = self._rows.get((scope, normalized))
+            if row is not None and self._answers[row] is answer:
+                # Storing back an answer this cache served keeps its original expiry
+                self._rows.move_to_end((scope, normalized))
+                return
+            self._insert(scope, normalized, answer, now)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers (scope, query, answer, stored_at) VALUES (?, ?, ?, ?)",
+                    (scope, normalized, json.dumps(answer, ensure_ascii=False), now)
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._rows),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _open_answer_cache() -> SimilarAnswerCache:
+    cache = SimilarAnswerCache()
+    metrics.track_cache(cache)
+    return cache
+
+
+# Default instance; opened (and its stored answers vectorized) on first lookup
+answer_cache = LazyService(_open_answer_cache, name="answer_cache")
@@ -0,0 +1,360 @@
+"""
+In-process caching primitives shared by the services.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a time-to-live.
+
+    Entries past their TTL but still inside the ``stale_ttl`` window are
+    served immediately while a single background refresh reloads them
+    (stale-while-revalidate).
+
+    With a ``shared`` tier (see :class:`~.shared_cache.SharedCache`), every
+    stored value is also written there, and local misses and stale entries
+    are looked up there before loading, so worker processes reuse each
+    other's values.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 300.0,
+                 stale_ttl: float = 0.0, name: str = "cache", shared=None):
+        """Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries kept before LRU eviction
+            ttl: Seconds an entry is considered fresh
+            stale_ttl: Extra seconds an expired entry may still be served
+                while it is refreshed in the background
+            name: Label used in stats output
+            shared: Optional cross-process tier with ``get(key)`` returning
+                ``(value, wall-clock expiry)`` and ``set(key, value,
+                expires_at, stale_until)``
+        """
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl)
+        self.stale_ttl = float(stale_ttl)
+        self.name = name
+        self.shared = shared
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._refreshing = set()
+        self._refresh_tasks = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self.refresh_failures = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh cached value, or None if absent or expired."""
+        value, state = self._lookup(key)
+        return value if state == "fresh" else None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            self._store(key, value, time.monotonic() + self.ttl)
+        if self.shared is not None:
+            expires_at = time.time() + self.ttl
+            self.shared.set(key, value, expires_at, expires_at + self.stale_ttl)
+
+    def _store(self, key: Hashable, value: Any, expires_at: float) -> None:
+        # Caller holds the lock
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any],
+                    cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Return the cached value for ``key``, loading it on a miss.
+
+        Args:
+            key: Cache key
+            loader: Zero-argument callable producing the value; exceptions
+                propagate to the caller on a miss and are never cached
+            cacheable: Optional predicate; values it rejects are returned
+                but not stored
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        value, state = self._lookup(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            self._schedule_refresh(key, loader, cacheable)
+            return value
+
+        value = loader()
+        if cacheable is None or cacheable(value):
+            self.set(key, value)
+        return value
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                           cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Coroutine version of :meth:`get_or_load`; ``loader`` returns an awaitable.
+
+        Stale entries are refreshed by a task on the running event loop.
+        Lookups and stores that reach the shared tier run on the loop's
+        default executor.
+        """
+        value, state = await self._alookup(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            with self._lock:
+                if key in self._refreshing:
+                    return value
+                self._refreshing.add(key)
+            task = asyncio.get_running_loop().create_task(self._arefresh(key, loader, cacheable))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+            return value
+
+        value = await loader()
+        if cacheable is None or cacheable(value):
+            await self._aset(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            size = len(self._entries)
+        hits = self.hits + self.stale_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            "name": self.name,
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refresh_failures": self.refresh_failures,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+    def _lookup(self, key: Hashable):
+        value, state, entry = self._lookup_local(key)
+        if state is not None:
+            return value, state
+        return self._lookup_shared(key, entry)
+
+    def _lookup_local(self, key: Hashable):
+        """(value, state, entry) from memory; state None means ask the shared tier."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, "fresh", entry
+                if now < expires_at + self.stale_ttl and self.shared is None:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    return value, "stale", entry
+                if now >= expires_at + self.stale_ttl:
+                    del self._entries[key]
+                    entry = None
+            if self.shared is None:
+                self.misses += 1
+                return None, "miss", None
+        return None, None, entry
+
+    def _lookup_shared(self, key: Hashable, entry):
+        # Another worker may have stored or refreshed the value
+        shared_value, shared_expires_at = self.shared.get(key)
+        with self._lock:
+            if shared_value is not None:
+                remaining = shared_expires_at - time.time()
+                if entry is None or remaining > 0:
+                    self._store(key, shared_value, time.monotonic() + remaining)
+                    self.shared_hits += 1
+                    return shared_value, "fresh" if remaining > 0 else "stale"
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                return entry[0], "stale"
+            self.misses += 1
+            return None, "miss"
+
+    async def _alookup(self, key: Hashable):
+        # The shared tier is SQLite, which may wait on another process's lock: off the loop
+        value, state, entry = self._lookup_local(key)
+        if state is not None:
+            return value, state
+        return await asyncio.get_running_loop().run_in_executor(None, self._lookup_shared, key, entry)
+
+    async def _aset(self, key: Hashable, value: Any) -> None:
+        if self.shared is None:
+            self.set(key, value)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, self.set, key, value)
+
+    def _schedule_refresh(self, key, loader, cacheable) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(
+            target=self._refresh, args=(key, loader, cacheable), daemon=True
+        ).start()
+
+    def _refresh(self, key, loader, cacheable) -> None:
+        try:
+            value = loader()
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+            else:
+                self.refresh_failures += 1
+        except Exception as e:
+            # Keep serving the stale entry until it ages out
+            self.refresh_failures += 1
+            print(f"[{self.name}] Background refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _arefresh(self, key, loader, cacheable) -> None:
+        try:
+            value = await loader()
+            if cacheable is None or cacheable(value):
+                await self._aset(key, value)
+            else:
+                self.refresh_failures += 1
+        except Exception as e:
+            self.refresh_failures += 1
+            print(f"[{self.name}] Background refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and receive the same result, or the same exception.
+    Threads use :meth:`do`; coroutines on one event loop use :meth:`ado`.
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._async_flights: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.collapsed = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` for ``key`` unless an identical call is already in flight.
+
+        Args:
+            key: Identity of the call (e.g. model and prompt)
+            fn: Zero-argument callable doing the actual work
+
+        Returns:
+            The result of the single execution shared by all waiters
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+                leader = True
+            else:
+                self.collapsed += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Coroutine version of :meth:`do`; ``fn`` returns an awaitable."""
+        with self._lock:
+            future = self._async_flights.get(key)
+            if future is None:
+                future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+                # Mark any exception as retrieved even when nobody else is waiting
+                future.add_done_callback(lambda f: f.exception())
+                self.executions += 1
+                leader = True
+            else:
+                self.collapsed += 1
+                leader = False
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Only the leader's request was cancelled; its followers fall back
+            future.set_exception(RuntimeError("Shared call was cancelled"))
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._async_flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._flights) + len(self._async_flights)
+        calls = self.executions + self.collapsed
+        return {
+            "name": self.name,
+            "in_flight": in_flight,
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "collapse_ratio": self.collapsed / calls if calls else 0.0,
+        }
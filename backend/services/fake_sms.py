@@ -0,0 +1,68 @@
+"""
+Offline stand-in for the Vonage SMS client, for benchmarks and local testing.
+"""
+import random
+import threading
+import time
+from typing import Any, Dict, List
+
+
+class FakeSmsMessageStatus:
+    """One per-recipient entry of a fake SMS response."""
+
+    def __init__(self, to: str, status: str, error_text: str = None):
+        self.to = to
+        self.status = status
+        self.error_text = error_text
+        self.message_id = f"fake-{random.getrandbits(48):012x}"
+
+    def model_dump(self) -> Dict[str, Any]:
+        data = {'to': self.to, 'status': self.status, 'message_id': self.message_id}
+        if self.error_text:
+            data['error_text'] = self.error_text
+        return data
+
+
+class FakeSmsResponse:
+    """Mimics ``vonage_sms.SmsResponse``: ``messages`` plus ``model_dump()``."""
+
+    def __init__(self, messages: List[FakeSmsMessageStatus]):
+        self.message_count = str(len(messages))
+        self.messages = messages
+
+    def model_dump(self) -> Dict[str, Any]:
+        return {
+            'message_count': self.message_count,
+            'messages': [m.model_dump() for m in self.messages],
+        }
+
+
+class FakeSmsClient:
+    """Drop-in replacement for ``Vonage(...).sms`` that never leaves the process.
+
+    Each ``send`` sleeps for ``latency`` seconds (plus up to ``jitter``) and
+    then succeeds, reports Vonage's "Throttled" status (``"1"``) with
+    probability ``throttle_rate``, or raises a connection error with
+    probability ``failure_rate``. Sent messages are recorded in ``sent``.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0,
+                 failure_rate: float = 0.0, throttle_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, message) -> FakeSmsResponse:
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        to = getattr(message, 'to', '')
+        roll = random.random()
+        if roll < self.failure_rate:
+            raise ConnectionError(f"Fake SMS gateway unreachable for {to}")
+        if roll < self.failure_rate + self.throttle_rate:
+            return FakeSmsResponse([FakeSmsMessageStatus(to, '1', 'Throttled')])
+        with self._lock:
+            self.sent.append(message)
+        return FakeSmsResponse([FakeSmsMessageStatus(to, '0')])
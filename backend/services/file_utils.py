@@ -0,0 +1,165 @@
+"""
+File helpers shared by the data-backed services.
+"""
+import codecs
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import Any, Iterator, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, callers just may duplicate work
+    fcntl = None
+
+# Longest BOMs first: the UTF-32 LE BOM starts with the UTF-16 LE one
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+
+def detect_encoding(raw: bytes) -> str:
+    """Guess the encoding of a text file from its BOM or NUL-byte layout.
+
+    Args:
+        raw: Leading bytes of the file (a few bytes are enough)
+
+    Returns:
+        Codec name suitable for ``bytes.decode``
+    """
+    for bom, encoding in _BOMS:
+        if raw.startswith(bom):
+            return encoding
+    # JSON starts with ASCII, so BOM-less UTF-16 shows up as interleaved NULs
+    if len(raw) >= 2:
+        if raw[0] == 0 and raw[1] != 0:
+            return 'utf-16-be'
+        if raw[0] != 0 and raw[1] == 0:
+            return 'utf-16-le'
+    return 'utf-8'
+
+
+def decode_text(raw: bytes) -> str:
+    """Decode file contents with the detected encoding, dropping any BOM."""
+    encoding = detect_encoding(raw[:4])
+    text = raw.decode(encoding)
+    return text[1:] if text.startswith('\ufeff') else text
+
+
+def load_json_file(path: str) -> Any:
+    """Load a JSON file in UTF-8, UTF-16 or UTF-32, with or without BOM."""
+    with open(path, 'rb') as f:
+        return json.loads(decode_text(f.read()))
+
+
+# Whitespace between top-level values; inside an array, the commas too
+_GAP = re.compile(r'\s*')
+_ARRAY_GAP = re.compile(r'[\s,]*')
+
+
+def iter_json_values(path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Stream the values of a JSON array, NDJSON or single-value file.
+
+    The file is decoded incrementally (any encoding :func:`load_json_file`
+    accepts), so only one chunk and the value being parsed are in memory.
+    A top-level array yields its elements; otherwise each whitespace-
+    separated top-level value is yielded in turn.
+
+    Raises:
+        ValueError: If the file is not valid JSON
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'rb') as f:
+        head = f.read(4)
+        text = codecs.getincrementaldecoder(detect_encoding(head))()
+        buffer = text.decode(head)
+        if buffer.startswith('\ufeff'):
+            buffer = buffer[1:]
+        pos = 0
+        eof = False
+        in_array = None
+        while True:
+            pos = (_ARRAY_GAP if in_array else _GAP).match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + text.decode(chunk, final=eof)
+                pos = 0
+                continue
+            if in_array is None:
+                in_array = buffer[pos] == '['
+                if in_array:
+                    pos += 1
+                    continue
+            if in_array and buffer[pos] == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value ending at the buffer's end may continue in the next chunk
+            if end is None or end == len(buffer) and not eof:
+                if eof:
+                    raise ValueError(f"Invalid JSON in {path} at character {pos}")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + text.decode(chunk, final=eof)
+                pos = 0
+                continue
+            pos = end
+            yield value
+
+
+def directory_signature(path: str, suffix: str = '.json') -> Tuple:
+    """Cheap fingerprint of the files in ``path`` (names, mtimes, sizes).
+
+    Two calls return equal tuples unless a matching file was added,
+    removed or modified in between. A missing directory yields ``()``.
+    ``suffix`` may be a tuple of suffixes.
+    """
+    try:
+        entries = []
+        for entry in os.scandir(path):
+            if entry.name.endswith(suffix) and entry.is_file():
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    except FileNotFoundError:
+        return ()
+    return tuple(sorted(entries))
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """Hold an exclusive advisory lock on ``path`` across processes.
+
+    Used so that only one worker process performs an expensive step (such
+    as building a snapshot) while the others wait and then reuse its result.
+
+    Args:
+        path: Lock file, created if missing
+        blocking: Wait for the lock; otherwise yield False at once if
+            another process holds it
+
+    Yields:
+        True if the lock is held (always, when ``blocking``)
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        try:
+            yield True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,273 @@
+"""
+Offline guidance pack: pre-generated instructions per emergency type and language.
+"""
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from ..config import config
+from .file_utils import file_lock
+
+PACK_VERSION = 1
+
+# Seconds before retrying a refresh that left entries unbuilt (e.g. Ollama still starting)
+RETRY_DELAY = 300
+# Seconds between checks of the pack file for a version saved by another process
+RELOAD_CHECK = 5
+# Seconds between attempts by a process that is not refreshing to take the refresh over
+FOLLOW_INTERVAL = 30
+
+
+class GuidancePack:
+    """Validated instruction sets for every (emergency type, language), kept on disk.
+
+    The pack is a gzipped JSON file written atomically, so a server can load
+    it at startup and a builder (CLI or background refresh) can replace it
+    while the server runs; every process reloads the file when it changes.
+    Entries are only ever replaced by newer valid ones; a failed rebuild
+    keeps what was there.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize the pack.
+
+        Args:
+            path: Pack file (default: ``GUIDANCE_PACK_PATH``); empty string
+                keeps the pack in memory only
+        """
+        self.path = config.GUIDANCE_PACK_PATH if path is None else path
+        self._entries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._signature = None
+        self._checked_at = 0.0
+        self.built_at = None
+        self.hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.load()
+
+    @staticmethod
+    def _type_key(emergency_type: str) -> str:
+        return (emergency_type or "general").strip().lower()
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> bool:
+        """(Re)read the pack file; returns False if there is none or it is unreadable."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        signature = self._file_signature()
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                pack = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading guidance pack {self.path}: {e}")
+            return False
+        finally:
+            # An unreadable file is not retried until it changes
+            self._signature = signature
+        if pack.get("version") != PACK_VERSION:
+            print(f"Ignoring guidance pack {self.path}: unsupported version {pack.get('version')}")
+            return False
+        with self._lock:
+            self._entries = pack.get("entries", {})
+            self.built_at = pack.get("built_at")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """Reload the pack if another process (or the CLI) saved a new one.
+
+        Checks the file at most every ``RELOAD_CHECK`` seconds, so it is
+        cheap enough to call on every lookup.
+        """
+        now = time.monotonic()
+        if not self.path or now - self._checked_at < RELOAD_CHECK:
+            return False
+        self._checked_at = now
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return False
+        return self.load()
+
+    def save(self) -> None:
+        """Write the pack to a temporary file and move it over the pack file.
+
+        The temporary file is unique, so processes saving at the same time
+        each replace the pack with a complete file of their own.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            pack = {"version": PACK_VERSION, "built_at": self.built_at, "entries": self._entries}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=directory, prefix=f"{os.path.basename(self.path)}.", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                    json.dump(pack, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            self._signature = self._file_signature()
+
+    def get(self, emergency_type: str, language: str = "en") -> Optional[Dict[str, Any]]:
+        """Packed instructions for the type and language, or None."""
+        entry = self._entries.get(self._type_key(emergency_type), {}).get(language or "en")
+        return entry["data"] if entry is not None else None
+
+    def lookup(self, emergency_type: str, language: str = "en") -> Tuple[Any, Any]:
+        """(localized, english) packed instructions; either may be None.
+
+        Counts a hit when the localized entry exists.
+        """
+        language = language or "en"
+        self.reload_if_changed()
+        english = self.get(emergency_type, "en")
+        localized = english if language == "en" else (
+            self.get(emergency_type, language) if english is not None else None
+        )
+        if localized is not None:
+            self.hits += 1
+        return localized, english
+
+    def put(self, emergency_type: str, language: str, data: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            # Copy-on-write so readers never see a half-updated mapping
+            entries = {t: dict(langs) for t, langs in self._entries.items()}
+            entries.setdefault(self._type_key(emergency_type), {})[language] = {
+                "built_at": now, "data": data
+            }
+            self._entries = entries
+            self.built_at = now
+
+    def build(self, generate: Callable[[str], Dict[str, Any]],
+              translate: Callable[[Dict[str, Any], str], Optional[Dict[str, Any]]],
+              types: Iterable[str], languages: Iterable[str]) -> Dict[str, int]:
+        """Regenerate every (type, language) entry and save the pack.
+
+        Args:
+            generate: Returns validated English instructions for a type;
+                raises on failure
+            translate: Returns the instructions fully translated into a
+                language, or None if any field could not be translated
+            types: Emergency types to build
+            languages: Language codes to build ("en" is always included)
+
+        Returns:
+            dict with ``built`` and ``failed`` entry counts
+        """
+        languages = ["en"] + [lang for lang in languages if lang != "en"]
+        built = failed = 0
+        for emergency_type in types:
+            try:
+                english = generate(emergency_type)
+            except Exception as e:
+                print(f"Guidance pack: could not generate {emergency_type}: {e}")
+                failed += len(languages)
+                continue
+            self.put(emergency_type, "en", english)
+            built += 1
+            for language in languages[1:]:
+                translated = translate(english, language)
+                if translated is None:
+                    print(f"Guidance pack: could not translate {emergency_type} into {language}")
+                    failed += 1
+                    continue
+                self.put(emergency_type, language, translated)
+                built += 1
+        if built:
+            self.save()
+        return {"built": built, "failed": failed}
+
+    def is_complete(self, types: Iterable[str], languages: Iterable[str]) -> bool:
+        entries = self._entries
+        return all(
+            lang in entries.get(self._type_key(t), {}) for t in types for lang in ["en", *languages]
+        )
+
+    def start_refresh(self, rebuild: Callable[[], Dict[str, int]], interval: float,
+                      complete: Callable[[], bool] = None) -> None:
+        """Rebuild in a daemon thread every ``interval`` seconds (idempotent).
+
+        Only one process on the host refreshes: the one holding the pack's
+        lock file. The others reload what it saves (see
+        :meth:`reload_if_changed`) and take the refresh over if it exits.
+
+        Args:
+            rebuild: Zero-argument callable doing the build (see :meth:`build`)
+            interval: Seconds between rebuilds; a rebuild with failures is
+                retried after ``RETRY_DELAY`` instead
+            complete: Returns False when entries are missing, so the process
+                taking the refresh over rebuilds right away instead of when
+                the saved pack is ``interval`` old
+        """
+        if self._refresher is not None or interval <= 0:
+            return
+
+        def follow():
+            if not self.path:
+                self._refresh(rebuild, interval, complete)
+            while True:
+                # The lock is held for as long as this process refreshes, i.e. until it exits
+                with file_lock(f"{self.path}.lock", blocking=False) as held:
+                    if held:
+                        self._refresh(rebuild, interval, complete)
+                time.sleep(FOLLOW_INTERVAL)
+
+        self._refresher = threading.Thread(target=follow, name="guidance-pack-refresh", daemon=True)
+        self._refresher.start()
+
+    def _refresh(self, rebuild: Callable[[], Dict[str, int]], interval: float,
+                 complete: Optional[Callable[[], bool]]) -> None:
+        # Start from whatever the previous refreshing process saved
+        self.load()
+        if complete is not None and not complete():
+            delay = 0
+        else:
+            delay = max(0, (self.built_at or 0) + interval - time.time())
+        while True:
+            time.sleep(delay)
+            delay = min(interval, RETRY_DELAY)
+            try:
+                result = rebuild()
+                self.refreshes += 1
+                if result.get("failed"):
+                    self.refresh_failures += 1
+                else:
+                    delay = interval
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"Guidance pack refresh failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries
+        return {
+            "path": self.path,
+            "built_at": self.built_at,
+            "entries": sum(len(langs) for langs in entries.values()),
+            "types": sorted(entries),
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+# Create a default instance for easy importing
+guidance_pack = GuidancePack()
@@ -0,0 +1,280 @@
+"""
+Local intent matcher: answers common chat questions without the LLM.
+"""
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import config
+from .file_utils import directory_signature, load_json_file
+from .metrics_service import metrics
+from .resource_service import ResourceService, resource_service, tokenize
+from .template_service import TemplateService, template_service
+
+# Words that carry no intent ("what do I do in an earthquake?" -> "earthquake")
+STOPWORDS = frozenset("""
+a an and are am be can could do does doing for from get hello help hey hi how i i'm im
+in is it me my now of on or please should tell thanks the there this to us was we what
+when where which who will with would you your
+""".split())
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Ranking boosts: curated answers beat resource links and alert templates, and
+# entries for the emergency the user is reading about beat the others
+SOURCE_BOOST = {'faq': 1.2, 'resource': 1.0, 'template': 1.0}
+TYPE_BOOST = 1.5
+
+# A runner-up this close to the best match (and as well covered) makes the query ambiguous
+AMBIGUITY_RATIO = 0.9
+
+
+def stem(token: str) -> str:
+    # Crude, but applied to questions and documents alike ("flooded", "floods" -> "flood")
+    if len(token) > 5 and token.endswith('ing'):
+        return token[:-3]
+    if len(token) > 4 and token.endswith('ed'):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def terms(text: str) -> List[str]:
+    """Stemmed content-word tokens of ``text``."""
+    return [stem(token) for token in tokenize(text) if len(token) > 1 and token not in STOPWORDS]
+
+
+class _IntentIndex:
+    """Immutable BM25 index over the answerable documents.
+
+    Each FAQ question is its own document, so the length normalization
+    favours the phrasing closest to the user's question.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        lengths = []
+        for doc_id, document in enumerate(documents):
+            counts: Dict[str, int] = {}
+            for term in terms(document['text']):
+                counts[term] = counts.get(term, 0) + 1
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, count))
+
+        total = len(documents)
+        average = (sum(lengths) / total) if total else 1.0
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        # A word no document contains weighs as much as the rarest possible one
+        self.unknown_idf = math.log(1 + (total + 0.5) / 0.5)
+        # Per-document BM25 length factor, precomputed once
+        self.norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / (average or 1.0)) for length in lengths]
+
+    def score(self, query_terms: List[str]) -> Tuple[Dict[int, float], Dict[int, float], float]:
+        """BM25 scores and matched IDF mass per document, and the query's total IDF mass."""
+        scores: Dict[int, float] = {}
+        matched: Dict[int, float] = {}
+        total_idf = 0.0
+        for term in set(query_terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                total_idf += self.unknown_idf
+                continue
+            total_idf += idf
+            for doc_id, count in self.postings[term]:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * count * (BM25_K1 + 1) / (
+                    count + self.norms[doc_id]
+                )
+                matched[doc_id] = matched.get(doc_id, 0.0) + idf
+        return scores, matched, total_idf
+
+
+class IntentMatcher:
+    """Answers chat questions from FAQ entries, templates and resources.
+
+    Each question is ranked against every document with BM25. The best
+    match is used only if it covers at least ``threshold`` of the
+    question's content words, weighted by IDF, and no other document
+    matches about as well. Anything else goes to the model. The index is
+    rebuilt when a file in the FAQ, templates or resources directory
+    changes.
+    """
+
+    def __init__(self, faq_dir: str = None, templates: TemplateService = None,
+                 resources: ResourceService = None, threshold: float = None,
+                 reload_interval: float = 2.0):
+        """Initialize the matcher.
+
+        Args:
+            faq_dir: Directory of curated FAQ files (``[{"id", "type",
+                "questions", "answer"}]``)
+            templates: Template service indexed by name, subject and tags
+            resources: Resource service indexed by title, tags and description
+            threshold: Minimum IDF-weighted share of the question's words the
+                match must cover (default: ``CHAT_INTENT_THRESHOLD``)
+            reload_interval: Minimum seconds between file modification checks
+        """
+        if faq_dir is None:
+            faq_dir = os.path.join(os.path.dirname(__file__), '..', 'faq')
+        self.faq_dir = faq_dir
+        self.templates = templates or template_service
+        self.resources = resources or resource_service
+        self.threshold = config.CHAT_INTENT_THRESHOLD if threshold is None else threshold
+        self.reload_interval = reload_interval
+        self._index: Optional[_IntentIndex] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.answered = 0
+
+    def _signature_now(self) -> Tuple:
+        return (
+            directory_signature(self.faq_dir),
+            directory_signature(self.templates.templates_dir),
+            self.resources.signature(),
+        )
+
+    def _documents(self, faq_signature: Tuple) -> List[Dict[str, Any]]:
+        documents = []
+        for filename, _, _ in faq_signature:
+            try:
+                entries = load_json_file(os.path.join(self.faq_dir, filename))
+            except (ValueError, OSError) as e:
+                print(f"Error loading FAQ {filename}: {e}")
+                continue
+            for entry in entries if isinstance(entries, list) else [entries]:
+                if not entry.get('answer'):
+                    continue
+                for question in entry.get('questions', []):
+                    documents.append({
+                        'id': entry.get('id', ''), 'source': 'faq', 'type': entry.get('type', 'general'),
+                        'text': question, 'answer': entry['answer'],
+                    })
+
+        for name in self.templates.list_templates():
+            template = self.templates.load_template(name) or {}
+            answer = template.get('summary') or template.get('body')
+            if not isinstance(answer, str):
+                continue
+            tags = template.get('tags') or []
+            documents.append({
+                'id': name, 'source': 'template', 'type': name.split('_', 1)[0],
+                'text': ' '.join([name.replace('_', ' '), str(template.get('subject') or template.get('title') or ''),
+                                  *map(str, tags)]),
+                'answer': answer,
+            })
+
+        # Located places (shelters, hospitals) are found by distance, not by question
+        for resource in self.resources.iter_resources(located=False):
+            title = resource.get('title', '')
+            description = resource.get('description', '')
+            if not title:
+                continue
+            tags = [str(tag) for tag in resource.get('tags', [])]
+            answer = f"{title}: {description}" if description else title
+            if resource.get('url'):
+                answer = f"{answer} {resource['url']}"
+            documents.append({
+                'id': resource.get('id', title), 'source': 'resource', 'type': tags[0] if tags else 'general',
+                'text': ' '.join([title, *tags, description]), 'answer': answer,
+            })
+        return documents
+
+    def _get_index(self) -> _IntentIndex:
+        """Return the current index, rebuilding it if a source file changed."""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.reload_interval:
+            return self._index
+
+        if self._index is None:
+            self._lock.acquire()
+        elif not self._lock.acquire(blocking=False):
+            return self._index
+        try:
+            if self._index is not None and now - self._checked_at < self.reload_interval:
+                return self._index
+            signature = self._signature_now()
+            if self._index is None or signature != self._signature:
+                self._index = _IntentIndex(self._documents(signature[0]))
+                self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._index
+        finally:
+            self._lock.release()
+
+    def match(self, query: str, emergency_type: str = None) -> Optional[Dict[str, Any]]:
+        """Best confident answer for ``query``, or None if the model should answer.
+
+        Args:
+            query: The user's chat message
+            emergency_type: Emergency the user is reading about; its entries
+                win ties such as "what do I do after?"
+
+        Returns:
+            dict with ``answer``, ``id``, ``source``, ``score`` and ``confidence``
+        """
+        self.lookups += 1
+        query_terms = terms(query)
+        if not query_terms:
+            return None
+        index = self._get_index()
+        scores, matched, total_idf = index.score(query_terms)
+        if not scores:
+            return None
+
+        emergency_type = (emergency_type or '').lower()
+        ranked = []
+        for doc_id, score in scores.items():
+            document = index.documents[doc_id]
+            boost = SOURCE_BOOST.get(document['source'], 1.0)
+            if emergency_type and document['type'] == emergency_type:
+                boost *= TYPE_BOOST
+            ranked.append((score * boost, matched[doc_id] / total_idf, doc_id))
+        ranked.sort(reverse=True)
+
+        best_score, confidence, doc_id = ranked[0]
+        if confidence < self.threshold:
+            return None
+        for score, coverage, other_id in ranked[1:]:
+            if score < best_score * AMBIGUITY_RATIO:
+                break
+            if coverage >= confidence and index.documents[other_id]['answer'] != index.documents[doc_id]['answer']:
+                return None
+
+        self.answered += 1
+        document = index.documents[doc_id]
+        return {
+            'answer': document['answer'],
+            'id': document['id'],
+            'source': document['source'],
+            'score': round(best_score, 3),
+            'confidence': round(confidence, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            'documents': len(index.documents) if index else None,
+            'threshold': self.threshold,
+            'lookups': self.lookups,
+            'answered': self.answered,
+            'answer_ratio': round(self.answered / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+
+# Create a default instance for easy importing
+intent_matcher = IntentMatcher()
+metrics.callback("chat_intent_lookups_total", "Chat messages checked against the local intent matcher",
+                 lambda: [((), intent_matcher.lookups)], kind="counter")
+metrics.callback("chat_intent_answered_total", "Chat messages answered locally without the model",
+                 lambda: [((), intent_matcher.answered)], kind="counter")
@@ -0,0 +1,70 @@
+"""
+Deferred construction of services that are costly to build.
+"""
+import threading
+import time
+from typing import Callable, Generic, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class LazyService(Generic[T]):
+    """Builds a service on first use, exactly once, then stands in for it.
+
+    Attribute access is forwarded to the built service, so a module-level
+    ``service = LazyService(factory)`` can replace ``service = factory()``
+    without touching callers. Construction runs under a lock, so threads
+    racing on the first request all get the same instance. The accessor's
+    own names (:meth:`instance`, :attr:`built`, ...) are chosen not to
+    shadow the service's.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str = None):
+        """Initialize the accessor.
+
+        Args:
+            factory: Zero-argument callable that builds the service
+            name: Name reported in :meth:`build_stats` (default: the factory's name)
+        """
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'service')
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        self.build_seconds: Optional[float] = None
+        lazy_services.append(self)
+
+    def instance(self) -> T:
+        """The service, building it if this is the first use."""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    self._instance = self._factory()
+                    self.build_seconds = time.perf_counter() - started
+                instance = self._instance
+        return instance
+
+    @property
+    def built(self) -> bool:
+        return self._instance is not None
+
+    def build_in_background(self) -> threading.Thread:
+        """Build the service on a background thread, off the import path."""
+        thread = threading.Thread(target=self.instance, name=f"{self._name}-startup", daemon=True)
+        thread.start()
+        return thread
+
+    def __getattr__(self, name):
+        return getattr(self.instance(), name)
+
+    def build_stats(self):
+        return {
+            'name': self._name,
+            'built': self.built,
+            'build_seconds': round(self.build_seconds, 4) if self.built else None,
+        }
+
+
+# Every accessor created, for diagnostics and the startup report
+lazy_services: List[LazyService] = []
@@ -1,33 +1,1299 @@
 # backend/services/llm_service.py
 
+import asyncio
+import re
+import threading
+import time
 import requests
 import json
-from typing import Dict, Any
+from collections import deque
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Tuple
 
-OLLAMA_API = "http://localhost:11434/api/generate"
-MODEL_NAME = "aidgen:latest"
+from requests.adapters import HTTPAdapter
 
-def call_ollama(prompt: str, model: str = MODEL_NAME) -> str:
-    """Calls the Ollama local model and returns the raw text response."""
+from ..config import config
+from .answer_cache import answer_cache
+from .cache_service import SingleFlight, TTLCache
+from .guidance_service import guidance_pack
+from .metrics_service import TOKEN_RATE_BUCKETS, metrics
+from .shared_cache import SharedCache
+from .translate_service import translate_service
 
+OLLAMA_API = f"{config.OLLAMA_URL.rstrip('/')}/api/generate"
+MODEL_NAME = config.OLLAMA_MODEL
+
+REQUIRED_FIELDS = ["title", "summary", "steps", "warnings", "sms_template"]
+
+# Answer limits from backend/models/Modelfile
+MIN_STEPS = 3
+MAX_STEPS = 8
+MAX_STEP_CHARS = 140
+MAX_SMS_CHARS = 160
+
+# JSON schema passed as Ollama's ``format`` so decoding can only produce a valid answer
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "summary": {"type": "string"},
+        "steps": {
+            "type": "array",
+            "items": {"type": "string", "maxLength": MAX_STEP_CHARS},
+            "minItems": MIN_STEPS,
+            "maxItems": MAX_STEPS,
+        },
+        "warnings": {"type": "array", "items": {"type": "string"}},
+        "sms_template": {"type": "string", "maxLength": MAX_SMS_CHARS},
+    },
+    "required": REQUIRED_FIELDS,
+}
+
+# Used when the model's answer lacks an sms_template; placeholders as in the Modelfile
+SMS_TEMPLATE = "EMERGENCY: {title}. I need help at {{location}}. Nearest shelter: {{nearest_shelter}}."
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Ollama while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing.
+
+    After ``failure_threshold`` consecutive failures (or calls slower than
+    ``slow_call_threshold`` seconds) the breaker opens and rejects calls for
+    ``reset_timeout`` seconds. It then lets ``half_open_max_calls`` probes
+    through; one success closes it again, one failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, slow_call_threshold: float = 20.0,
+                 reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = max(1, failure_threshold)
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed, claiming a probe slot if half-open."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, duration: float, ok: bool) -> None:
+        """Record the outcome of a call that :meth:`allow` let through."""
+        failed = not ok or duration > self.slow_call_threshold
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+            if not failed:
+                self._failures = 0
+                self.state = self.CLOSED
+                return
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+_ollama_seconds = metrics.histogram(
+    "ollama_request_seconds", "Ollama generation time, request to last chunk read", ("mode", "outcome")
+)
+# Pre-bound series: OLLAMA_SECONDS[mode][ok]
+OLLAMA_SECONDS = {
+    mode: {True: _ollama_seconds.labels(mode, "ok"), False: _ollama_seconds.labels(mode, "error")}
+    for mode in ("generate", "stream")
+}
+_first_token = metrics.histogram(
+    "ollama_first_token_seconds",
+    "Time from request to the first streamed token, by whether the model was loaded",
+    ("residency",)
+)
+# Pre-bound series: OLLAMA_FIRST_TOKEN[model_was_resident]
+OLLAMA_FIRST_TOKEN = {True: _first_token.labels("warm"), False: _first_token.labels("cold")}
+OLLAMA_TOKEN_RATE = metrics.histogram(
+    "ollama_tokens_per_second", "Generation speed", buckets=TOKEN_RATE_BUCKETS
+)
+
+
+def _keep_alive(value: str) -> Any:
+    """Ollama takes keep_alive as seconds (a number) or a duration string like "30m"."""
     try:
-        response = requests.post(
-            OLLAMA_API,
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "temperature": 0.7
-            },
-            timeout=30
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _observe_token_rate(final: Dict[str, Any] = None, first_token_at: float = None,
+                        chunks: int = 0, finished_at: float = None) -> None:
+    """Records tokens/sec from Ollama's eval counters, else from chunk timing.
+
+    Ollama streams one token per chunk, but a stream cancelled early never
+    receives the final chunk that carries ``eval_count``/``eval_duration``.
+    """
+    if final and final.get("eval_count") and final.get("eval_duration"):
+        OLLAMA_TOKEN_RATE.observe(final["eval_count"] / (final["eval_duration"] / 1e9))
+    elif first_token_at is not None and chunks > 1 and finished_at > first_token_at:
+        OLLAMA_TOKEN_RATE.observe((chunks - 1) / (finished_at - first_token_at))
+
+
+class OllamaClient:
+    """Reusable Ollama client with a pooled keep-alive session and a circuit breaker."""
+
+    def __init__(self, base_url: str = None, model: str = None, pool_size: int = None,
+                 connect_timeout: float = None, read_timeout: float = None,
+                 breaker: CircuitBreaker = None, keep_alive: str = None,
+                 num_ctx: int = None, num_thread: int = None):
+        """Initialize the client.
+
+        Args:
+            base_url: Ollama server URL (default: ``OLLAMA_URL``)
+            model: Default model name (default: ``OLLAMA_MODEL``)
+            pool_size: Maximum pooled keep-alive connections
+            connect_timeout: Seconds allowed to establish a connection
+            read_timeout: Seconds allowed between bytes of the response
+            breaker: Circuit breaker guarding every call
+            keep_alive: How long Ollama keeps the model loaded after a request
+                (default: ``OLLAMA_KEEP_ALIVE``)
+            num_ctx: Context window sent with every request (0 = model default)
+            num_thread: CPU threads for generation (0 = Ollama default)
+        """
+        self.base_url = (base_url or config.OLLAMA_URL).rstrip("/")
+        self.model = model or config.OLLAMA_MODEL
+        self.keep_alive = _keep_alive(keep_alive if keep_alive is not None else config.OLLAMA_KEEP_ALIVE)
+        self.num_ctx = num_ctx if num_ctx is not None else config.OLLAMA_NUM_CTX
+        self.num_thread = num_thread if num_thread is not None else config.OLLAMA_NUM_THREAD
+        # Set by ModelManager to classify first-token latency as cold or warm
+        self.residency = None
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else config.OLLAMA_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else config.OLLAMA_READ_TIMEOUT,
+        )
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=config.OLLAMA_BREAKER_FAILURES,
+            slow_call_threshold=config.OLLAMA_BREAKER_SLOW_CALL,
+            reset_timeout=config.OLLAMA_BREAKER_COOLDOWN
+        )
+
+        pool_size = pool_size or config.OLLAMA_POOL_SIZE
+        self.pool_size = pool_size
+        self._async_session = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _options(self) -> Dict[str, Any]:
+        # Identical on every request: a changed num_ctx or num_thread reloads the model
+        options = {}
+        if self.num_ctx:
+            options["num_ctx"] = self.num_ctx
+        if self.num_thread:
+            options["num_thread"] = self.num_thread
+        return options
+
+    def _payload(self, prompt: str, model: str, stream: bool, schema: Dict[str, Any] = None,
+                 num_predict: int = None, context: list = None) -> Dict[str, Any]:
+        options = {"temperature": 0.7, **self._options()}
+        if num_predict:
+            options["num_predict"] = num_predict
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options
+        }
+        if schema:
+            payload["format"] = schema
+        if context:
+            payload["context"] = context
+        return payload
+
+    def load(self) -> Dict[str, Any]:
+        """Loads the model without generating and returns Ollama's reply.
+
+        An empty prompt makes Ollama load the model (with this client's
+        ``keep_alive`` and options) and answer at once. Bypasses the breaker.
+        """
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json={"model": self.model, "prompt": "", "stream": False,
+                  "keep_alive": self.keep_alive, "options": self._options()},
+            timeout=(self.timeout[0], config.OLLAMA_LOAD_TIMEOUT)
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def running_models(self) -> list:
+        """Models currently loaded in Ollama (``/api/ps``)."""
+        response = self.session.get(f"{self.base_url}/api/ps", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get("models", [])
+
+    def _was_resident(self) -> bool:
+        return bool(self.residency and self.residency.resident)
+
+    def _first_token(self, seconds: float, was_resident: bool) -> None:
+        OLLAMA_FIRST_TOKEN[was_resident].observe(seconds)
+        if self.residency is not None:
+            self.residency.observe_first_token(seconds, was_resident)
+
+    def _post(self, path: str, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError("Ollama circuit breaker is open")
+        response = self.session.post(
+            f"{self.base_url}{path}", json=payload, stream=stream, timeout=self.timeout
         )
         response.raise_for_status()
-        return response.json().get("response", "")
+        return response
+
+    def generate(self, prompt: str, model: str = None,
+                 schema: Dict[str, Any] = None, num_predict: int = None) -> str:
+        """Runs a blocking generation and returns the full completion text.
+
+        ``schema`` constrains the output to that JSON schema and
+        ``num_predict`` caps the number of generated tokens.
+        """
+
+        started = time.monotonic()
+        try:
+            response = self._post(
+                "/api/generate", self._payload(prompt, model, False, schema, num_predict)
+            )
+            data = response.json()
+            text = data.get("response", "")
+        except CircuitOpenError:
+            raise
+        except Exception:
+            elapsed = time.monotonic() - started
+            self.breaker.record(elapsed, ok=False)
+            OLLAMA_SECONDS["generate"][False].observe(elapsed)
+            raise
+        elapsed = time.monotonic() - started
+        self.breaker.record(elapsed, ok=True)
+        OLLAMA_SECONDS["generate"][True].observe(elapsed)
+        _observe_token_rate(data)
+        if self.residency is not None:
+            self.residency.mark_resident()
+        return text
+
+    def generate_stream(self, prompt: str, model: str = None, schema: Dict[str, Any] = None,
+                        num_predict: int = None, context: list = None,
+                        on_done: Callable[[Dict[str, Any]], None] = None) -> Iterator[str]:
+        """Runs a streaming generation, yielding completion text chunks.
+
+        Ollama answers ``"stream": true`` requests with one JSON object per
+        line (NDJSON); each carries a ``response`` fragment and the last one
+        has ``"done": true``. ``schema`` and ``num_predict`` as in :meth:`generate`.
+        ``context`` continues the conversation Ollama returned it for, and
+        ``on_done`` receives that last object (with the new ``context``) if
+        the stream is read to the end.
+        """
+
+        started = time.monotonic()
+        was_resident = self._was_resident()
+        try:
+            response = self._post(
+                "/api/generate", self._payload(prompt, model, True, schema, num_predict, context),
+                stream=True
+            )
+        except CircuitOpenError:
+            raise
+        except Exception:
+            elapsed = time.monotonic() - started
+            self.breaker.record(elapsed, ok=False)
+            OLLAMA_SECONDS["stream"][False].observe(elapsed)
+            raise
+
+        ok = True
+        first_token_at, chunks, final = None, 0, None
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                text = chunk.get("response", "")
+                if text:
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                        self._first_token(first_token_at - started, was_resident)
+                    chunks += 1
+                    yield text
+                if chunk.get("done"):
+                    final = chunk
+                    if on_done is not None:
+                        on_done(chunk)
+                    break
+        except Exception:
+            ok = False
+            raise
+        finally:
+            # A consumer closing the generator early still counts as a healthy call
+            response.close()
+            finished = time.monotonic()
+            self.breaker.record(finished - started, ok=ok)
+            OLLAMA_SECONDS["stream"][ok].observe(finished - started)
+            _observe_token_rate(final, first_token_at, chunks, finished)
+
+    def _get_async_session(self):
+        # httpx is only needed by the async (ASGI) serving mode
+        if self._async_session is None:
+            import httpx
+            self._async_session = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+                )
+            )
+        return self._async_session
+
+    async def generate_stream_async(self, prompt: str, model: str = None,
+                                    schema: Dict[str, Any] = None, num_predict: int = None,
+                                    context: list = None,
+                                    on_done: Callable[[Dict[str, Any]], None] = None) -> AsyncIterator[str]:
+        """Coroutine version of :meth:`generate_stream` on a pooled httpx client.
+
+        Shares this client's circuit breaker with the threaded methods.
+        """
+
+        if not self.breaker.allow():
+            raise CircuitOpenError("Ollama circuit breaker is open")
+        session = self._get_async_session()
+        started = time.monotonic()
+        was_resident = self._was_resident()
+        response = None
+        try:
+            request = session.build_request(
+                "POST", f"{self.base_url}/api/generate",
+                json=self._payload(prompt, model, True, schema, num_predict, context)
+            )
+            response = await session.send(request, stream=True)
+            response.raise_for_status()
+        except Exception:
+            if response is not None:
+                await response.aclose()
+            elapsed = time.monotonic() - started
+            self.breaker.record(elapsed, ok=False)
+            OLLAMA_SECONDS["stream"][False].observe(elapsed)
+            raise
+
+        ok = True
+        first_token_at, chunks, final = None, 0, None
+        try:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                text = chunk.get("response", "")
+                if text:
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                        self._first_token(first_token_at - started, was_resident)
+                    chunks += 1
+                    yield text
+                if chunk.get("done"):
+                    final = chunk
+                    if on_done is not None:
+                        on_done(chunk)
+                    break
+        except Exception:
+            ok = False
+            raise
+        finally:
+            await response.aclose()
+            finished = time.monotonic()
+            self.breaker.record(finished - started, ok=ok)
+            OLLAMA_SECONDS["stream"][ok].observe(finished - started)
+            _observe_token_rate(final, first_token_at, chunks, finished)
+
+    async def aclose(self) -> None:
+        """Close the async connection pool (ASGI shutdown)."""
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "keep_alive": self.keep_alive,
+            "num_ctx": self.num_ctx,
+            "num_thread": self.num_thread,
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+            "breaker": self.breaker.stats(),
+        }
+
+
+def _model_name(name: str) -> str:
+    # Ollama reports "aidgen:latest" for a model requested as "aidgen"
+    return name if ":" in name else f"{name}:latest"
+
+
+def _percentile(values: list, fraction: float) -> Any:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+
+class ModelManager:
+    """Keeps the local model loaded and records what cold starts cost.
+
+    Ollama evicts a model once its ``keep_alive`` expires (or another
+    model needs the memory), and the next request then pays the full load
+    time before its first token. The manager loads the model at startup,
+    polls ``/api/ps`` and reloads it as soon as it is gone, so a user
+    rarely meets a cold model. First-token latency is split by whether the
+    model was resident when the request started.
+    """
+
+    def __init__(self, client: OllamaClient, check_interval: float = None, window: int = 200):
+        """Initialize the manager.
+
+        Args:
+            client: Client whose model is kept resident
+            check_interval: Seconds between ``/api/ps`` checks
+                (default: ``OLLAMA_RESIDENCY_CHECK``; 0 warms once and stops)
+            window: Recent first-token latencies kept per class
+        """
+        self.client = client
+        self.check_interval = config.OLLAMA_RESIDENCY_CHECK if check_interval is None else check_interval
+        # None until the first check or response tells us
+        self.resident = None
+        self.warmups = 0
+        self.rewarms = 0
+        self.unloads = 0
+        self.failures = 0
+        self.last_load_seconds = None
+        self.last_check = None
+        self._latency = {False: deque(maxlen=window), True: deque(maxlen=window)}
+        self._lock = threading.Lock()
+        self._thread = None
+        client.residency = self
+
+    def _set_resident(self, resident: bool) -> None:
+        if self.resident and not resident:
+            self.unloads += 1
+        self.resident = resident
+
+    def mark_resident(self) -> None:
+        """Called when the model has just answered, so it is certainly loaded."""
+        self._set_resident(True)
+
+    def check(self) -> Any:
+        """Asks Ollama whether the model is loaded; None if Ollama is unreachable."""
+        try:
+            models = self.client.running_models()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Ollama residency check failed: {e}")
+            return None
+        wanted = _model_name(self.client.model)
+        resident = any(
+            _model_name(m.get("model") or m.get("name") or "") == wanted for m in models
+        )
+        self.last_check = time.time()
+        self._set_resident(resident)
+        return resident
+
+    def warm(self) -> bool:
+        """Loads the model; returns False if Ollama could not load it."""
+        with self._lock:
+            started = time.monotonic()
+            try:
+                data = self.client.load()
+            except (requests.RequestException, ValueError) as e:
+                self.failures += 1
+                print(f"Ollama warm-up failed: {e}")
+                return False
+            load_ns = data.get("load_duration")
+            self.last_load_seconds = round(
+                load_ns / 1e9 if load_ns else time.monotonic() - started, 3
+            )
+            self.warmups += 1
+            self._set_resident(True)
+            return True
+
+    def ensure_resident(self) -> bool:
+        """Reloads the model if Ollama reports it unloaded."""
+        if self.check() is False:
+            self.rewarms += 1
+            return self.warm()
+        return bool(self.resident)
+
+    def start(self) -> None:
+        """Warm the model and keep it resident from a daemon thread (idempotent)."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            self.warm()
+            while self.check_interval > 0:
+                time.sleep(self.check_interval)
+                self.ensure_resident()
+
+        self._thread = threading.Thread(target=loop, name="ollama-residency", daemon=True)
+        self._thread.start()
+
+    def observe_first_token(self, seconds: float, was_resident: bool) -> None:
+        self._latency[was_resident].append(seconds)
+        self.mark_resident()
+
+    def stats(self) -> Dict[str, Any]:
+        latency = {}
+        for was_resident, label in ((False, "cold"), (True, "warm")):
+            values = list(self._latency[was_resident])
+            latency[label] = {
+                "count": len(values),
+                "p50": _percentile(values, 0.5),
+                "p95": _percentile(values, 0.95),
+                "max": round(max(values), 3) if values else None,
+            }
+        return {
+            "model": self.client.model,
+            "resident": self.resident,
+            "keep_alive": self.client.keep_alive,
+            "num_ctx": self.client.num_ctx,
+            "num_thread": self.client.num_thread,
+            "warmups": self.warmups,
+            "rewarms": self.rewarms,
+            "unloads": self.unloads,
+            "warmup_failures": self.failures,
+            "last_load_seconds": self.last_load_seconds,
+            "last_check": self.last_check,
+            "first_token_seconds": latency,
+        }
+
+
+# Priority classes, most important first
+PRIORITY_INSTRUCTIONS = 0
+PRIORITY_GENERATE = 1
+PRIORITY_CHAT = 2
+PRIORITY_NAMES = {
+    PRIORITY_INSTRUCTIONS: "instructions",
+    PRIORITY_GENERATE: "generate",
+    PRIORITY_CHAT: "chat",
+}
+
+_queue_wait = metrics.histogram(
+    "llm_queue_wait_seconds", "Time from arrival to a scheduler slot (admitted requests)", ("priority",)
+)
+QUEUE_WAIT = {priority: _queue_wait.labels(name) for priority, name in PRIORITY_NAMES.items()}
+
+# Token cap for each priority class's generations
+NUM_PREDICT = {
+    PRIORITY_INSTRUCTIONS: config.LLM_NUM_PREDICT_INSTRUCTIONS,
+    PRIORITY_GENERATE: config.LLM_NUM_PREDICT_GENERATE,
+    PRIORITY_CHAT: config.LLM_NUM_PREDICT_CHAT,
+}
+
+
+class LoadShedError(RuntimeError):
+    """Raised when an LLM request cannot be served within its queueing budget."""
+
+
+class _Waiter:
+    __slots__ = ("priority", "deadline", "granted", "event", "loop", "future")
+
+    def __init__(self, priority: int, deadline: float, loop: asyncio.AbstractEventLoop = None):
+        self.priority = priority
+        self.deadline = deadline
+        self.granted = False
+        # Threads block on the event; coroutines await the future on their loop
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMScheduler:
+    """Priority-aware admission control in front of Ollama.
+
+    At most ``limit`` generations run at once. The limit adapts with AIMD:
+    it grows by ``1/limit`` after each call faster than ``target_latency``
+    and is cut by ``decrease_factor`` after a slow or failed call. Waiting
+    requests sit in bounded per-priority queues and are always dispatched
+    highest-priority first. A request whose expected wait exceeds its
+    budget, or whose queue is full, is shed with :class:`LoadShedError` so
+    the caller can serve its fallback immediately.
+    """
+
+    def __init__(self, min_limit: int = None, max_limit: int = None,
+                 target_latency: float = None, queue_sizes: Dict[int, int] = None,
+                 budgets: Dict[int, float] = None, decrease_factor: float = 0.7):
+        """Initialize the scheduler.
+
+        Args:
+            min_limit: Lowest concurrency limit AIMD may shrink to
+            max_limit: Highest concurrency limit AIMD may grow to
+            target_latency: Call latency (seconds) above which the limit shrinks
+            queue_sizes: Maximum queued requests per priority class
+            budgets: Maximum seconds a request of each class may wait in queue
+            decrease_factor: Multiplier applied to the limit on congestion
+        """
+        self.min_limit = max(1, min_limit or config.LLM_MIN_CONCURRENCY)
+        self.max_limit = max(self.min_limit, max_limit or config.LLM_MAX_CONCURRENCY)
+        self.target_latency = target_latency or config.LLM_TARGET_LATENCY
+        self.decrease_factor = decrease_factor
+        self.queue_sizes = queue_sizes or {
+            PRIORITY_INSTRUCTIONS: config.LLM_QUEUE_INSTRUCTIONS,
+            PRIORITY_GENERATE: config.LLM_QUEUE_GENERATE,
+            PRIORITY_CHAT: config.LLM_QUEUE_CHAT,
+        }
+        self.budgets = budgets or {
+            PRIORITY_INSTRUCTIONS: config.LLM_BUDGET_INSTRUCTIONS,
+            PRIORITY_GENERATE: config.LLM_BUDGET_GENERATE,
+            PRIORITY_CHAT: config.LLM_BUDGET_CHAT,
+        }
+        self._limit = float(self.min_limit)
+        self._in_flight = 0
+        self._queues = {priority: deque() for priority in PRIORITY_NAMES}
+        self._avg_latency = 0.0
+        self._lock = threading.Lock()
+        self.admitted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.shed = {priority: 0 for priority in PRIORITY_NAMES}
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _enqueue(self, priority: int, loop: asyncio.AbstractEventLoop = None):
+        """Admit immediately (returns None), queue a waiter, or raise LoadShedError."""
+
+        now = time.monotonic()
+        with self._lock:
+            ahead = sum(len(self._queues[p]) for p in PRIORITY_NAMES if p <= priority)
+            if ahead == 0 and self._in_flight < self.limit:
+                self._in_flight += 1
+                self.admitted[priority] += 1
+                return None
+
+            budget = self.budgets[priority]
+            queue = self._queues[priority]
+            expected_wait = (ahead + 1) / self.limit * self._avg_latency
+            if len(queue) >= self.queue_sizes[priority] or expected_wait > budget:
+                self.shed[priority] += 1
+                raise LoadShedError(
+                    f"LLM overloaded: {PRIORITY_NAMES[priority]} request shed "
+                    f"(queued={len(queue)}, expected wait {expected_wait:.1f}s)"
+                )
+            waiter = _Waiter(priority, now + budget, loop)
+            queue.append(waiter)
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Handle a waiter whose wait ended: keep its slot if granted, else shed it."""
+
+        with self._lock:
+            if waiter.granted:
+                return
+            try:
+                self._queues[waiter.priority].remove(waiter)
+            except ValueError:
+                pass
+            self.shed[waiter.priority] += 1
+        raise LoadShedError(
+            f"LLM overloaded: {PRIORITY_NAMES[waiter.priority]} request waited over "
+            f"{self.budgets[waiter.priority]:.1f}s"
+        )
+
+    def acquire(self, priority: int) -> None:
+        """Block until a slot is free for ``priority`` or raise LoadShedError."""
+
+        started = time.monotonic()
+        waiter = self._enqueue(priority)
+        if waiter is not None:
+            waiter.event.wait(self.budgets[priority])
+            self._abandon(waiter)
+        QUEUE_WAIT[priority].observe(time.monotonic() - started)
+
+    async def acquire_async(self, priority: int) -> None:
+        """Coroutine version of :meth:`acquire`; waits without holding a thread."""
+
+        started = time.monotonic()
+        waiter = self._enqueue(priority, asyncio.get_running_loop())
+        if waiter is None:
+            QUEUE_WAIT[priority].observe(time.monotonic() - started)
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.budgets[priority])
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Give back a slot granted while we were being cancelled
+            with self._lock:
+                granted = waiter.granted
+            if granted:
+                self.release()
+            else:
+                try:
+                    self._abandon(waiter)
+                except LoadShedError:
+                    pass
+            raise
+        self._abandon(waiter)
+        QUEUE_WAIT[priority].observe(time.monotonic() - started)
+
+    def release(self, latency: float = None, ok: bool = True) -> None:
+        """Free a slot and adapt the limit; pass ``latency=None`` to skip AIMD."""
+
+        with self._lock:
+            self._in_flight -= 1
+            if latency is not None:
+                self._avg_latency = latency if not self._avg_latency else (
+                    0.8 * self._avg_latency + 0.2 * latency
+                )
+                if ok and latency <= self.target_latency:
+                    self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                else:
+                    self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            while queue and self._in_flight < self.limit:
+                waiter = queue.popleft()
+                if waiter.deadline <= now:
+                    # Its own wait() is about to time out and count the shed
+                    continue
+                waiter.granted = True
+                self._in_flight += 1
+                self.admitted[priority] += 1
+                waiter.wake()
+
+    def run(self, priority: int, fn):
+        """Run ``fn`` inside a scheduler slot of the given priority."""
+
+        self.acquire(priority)
+        started = time.monotonic()
+        try:
+            result = fn()
+        except CircuitOpenError:
+            self.release()
+            raise
+        except Exception:
+            self.release(time.monotonic() - started, ok=False)
+            raise
+        self.release(time.monotonic() - started)
+        return result
+
+    async def run_async(self, priority: int, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Coroutine version of :meth:`run`; ``fn`` returns an awaitable."""
+
+        await self.acquire_async(priority)
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except (CircuitOpenError, asyncio.CancelledError):
+            self.release()
+            raise
+        except Exception:
+            self.release(time.monotonic() - started, ok=False)
+            raise
+        self.release(time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "avg_latency": round(self._avg_latency, 3),
+                "queued": {PRIORITY_NAMES[p]: len(q) for p, q in self._queues.items()},
+                "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+                "shed": {PRIORITY_NAMES[p]: n for p, n in self.shed.items()},
+            }
+
+
+# Shared client: one connection pool and one breaker for the whole process
+ollama_client = OllamaClient()
+
+# Keeps the shared client's model loaded (started by the app when OLLAMA_WARMUP is on)
+model_manager = ModelManager(ollama_client)
+
+# Admission control for every generation sent to the shared client
+llm_scheduler = LLMScheduler()
+
+# Identical (model, prompt) generations in flight at the same time run once
+ollama_flights = SingleFlight(name="ollama_single_flight")
+
+# Validated LLM answers, shared by generate_emergency_response and /api/generate,
+# and through SQLite with every other worker process
+shared_response_cache = SharedCache(name="llm_shared_cache") if config.SHARED_CACHE_PATH else None
+response_cache = TTLCache(
+    max_size=config.LLM_CACHE_SIZE,
+    ttl=config.LLM_CACHE_TTL,
+    stale_ttl=config.LLM_CACHE_STALE_TTL,
+    name="llm_response_cache",
+    shared=shared_response_cache
+)
+
+# Counters the scheduler, breaker and single-flight group already keep, read at scrape time
+metrics.track_cache(response_cache)
+if shared_response_cache is not None:
+    metrics.track_cache(shared_response_cache)
+metrics.callback("llm_concurrency_limit", "Current adaptive concurrency limit",
+                 lambda: [((), llm_scheduler.limit)])
+metrics.callback("llm_in_flight", "Generations holding a scheduler slot",
+                 lambda: [((), llm_scheduler.stats()["in_flight"])])
+metrics.callback("llm_queued", "Requests waiting for a scheduler slot",
+                 lambda: [((name,), n) for name, n in llm_scheduler.stats()["queued"].items()],
+                 ("priority",))
+metrics.callback("llm_admitted_total", "Requests admitted by the scheduler",
+                 lambda: [((name,), n) for name, n in llm_scheduler.stats()["admitted"].items()],
+                 ("priority",), kind="counter")
+metrics.callback("llm_shed_total", "Requests shed by the scheduler",
+                 lambda: [((name,), n) for name, n in llm_scheduler.stats()["shed"].items()],
+                 ("priority",), kind="counter")
+metrics.callback("ollama_breaker_open", "1 while the Ollama circuit breaker rejects calls",
+                 lambda: [((), 0 if ollama_client.breaker.stats()["state"] == "closed" else 1)])
+metrics.callback("ollama_breaker_opened_total", "Times the Ollama circuit breaker opened",
+                 lambda: [((), ollama_client.breaker.stats()["times_opened"])], kind="counter")
+metrics.callback("ollama_model_resident", "1 while the model is loaded in Ollama",
+                 lambda: [((), None if model_manager.resident is None else int(model_manager.resident))])
+metrics.callback("ollama_model_unloads_total", "Times the model was found unloaded",
+                 lambda: [((), model_manager.unloads)], kind="counter")
+metrics.callback("ollama_model_warmups_total", "Model loads requested by the residency manager",
+                 lambda: [((), model_manager.warmups)], kind="counter")
+metrics.callback("guidance_pack_hits_total", "Instructions served from the offline guidance pack",
+                 lambda: [((), guidance_pack.hits)], kind="counter")
+metrics.callback("guidance_pack_entries", "(type, language) entries in the guidance pack",
+                 lambda: [((), guidance_pack.stats()["entries"])])
+metrics.callback("single_flight_collapsed_total", "Calls that shared an identical in-flight call",
+                 lambda: [((ollama_flights.name,), ollama_flights.collapsed)], ("group",), kind="counter")
+
+def call_ollama(prompt: str, model: str = MODEL_NAME, priority: int = PRIORITY_GENERATE) -> str:
+    """Calls the Ollama local model and returns the raw text response.
+
+    Raises :class:`CircuitOpenError` immediately while Ollama is marked
+    unhealthy and :class:`LoadShedError` when the scheduler cannot serve the
+    request's priority class in time, so callers drop to their fallback
+    without waiting on a timeout. Concurrent calls with the same prompt and
+    model share one generation (and one scheduler slot).
+    """
+
+    try:
+        return ollama_flights.do(
+            (model, prompt),
+            lambda: llm_scheduler.run(priority, lambda: ollama_client.generate(
+                prompt, model, num_predict=NUM_PREDICT.get(priority)
+            ))
+        )
+    except Exception as e:
+        print(f"[Ollama Error] {e}")
+        raise
+
+
+_prompt_eval = metrics.histogram(
+    "chat_prompt_eval_seconds",
+    "Ollama prompt evaluation time per chat turn, by whether the session context was reused",
+    ("context",)
+)
+# Pre-bound series: CHAT_PROMPT_EVAL[context_reused]
+CHAT_PROMPT_EVAL = {True: _prompt_eval.labels("reused"), False: _prompt_eval.labels("new")}
+
+# Chunks read past the answer's closing brace while waiting for the final one, which
+# carries the session context; schema-constrained output ends right after the object
+CONTEXT_DRAIN_CHUNKS = 16
+
+
+class ChatTurn:
+    """One turn of a chat session: the context sent and the final chunk received.
+
+    Generation is normally cancelled as soon as the answer's object closes.
+    A session turn instead reads up to ``CONTEXT_DRAIN_CHUNKS`` more chunks
+    for the final one, whose ``context`` lets the next turn send only its
+    own message. If it does not arrive, the next turn is rebuilt from the
+    session's saved turns.
+    """
+
+    def __init__(self, context: list = None):
+        self.context = context
+        self.final = None
+        self._drained = 0
+
+    def on_done(self, chunk: Dict[str, Any]) -> None:
+        self.final = chunk
+        if chunk.get("prompt_eval_duration"):
+            CHAT_PROMPT_EVAL[bool(self.context)].observe(chunk["prompt_eval_duration"] / 1e9)
+
+    def stop(self) -> bool:
+        """Called for each chunk after the answer closed; True once reading should stop."""
+        self._drained += 1
+        return self._drained > CONTEXT_DRAIN_CHUNKS
+
+    @property
+    def new_context(self) -> Any:
+        return self.final.get("context") if self.final else None
+
+
+def _generate_json(prompt: str, model: str, schema: Dict[str, Any], num_predict: int,
+                   turn: ChatTurn = None) -> Any:
+    extractor = JSONStreamExtractor(validator=is_valid_response)
+    stream = ollama_client.generate_stream(
+        prompt, model, schema=schema, num_predict=num_predict,
+        context=turn and turn.context, on_done=turn and turn.on_done
+    )
+    try:
+        for chunk in stream:
+            if extractor.feed(chunk) and (turn is None or turn.stop()):
+                break
+    finally:
+        # Closing the stream drops the connection, which stops Ollama generating
+        stream.close()
+    return finalize_response(extractor)
+
+
+def call_ollama_json(prompt: str, model: str = MODEL_NAME, priority: int = PRIORITY_GENERATE,
+                     schema: Dict[str, Any] = RESPONSE_SCHEMA) -> Any:
+    """Streams a schema-constrained completion and returns the answer, or None.
+
+    Generation is cancelled as soon as the top-level object closes instead
+    of waiting for whatever the model emits after it, and near-valid output
+    is repaired locally (see :func:`finalize_response`). Same breaker,
+    scheduler and single-flight behaviour as :func:`call_ollama`.
+    """
+
+    try:
+        return ollama_flights.do(
+            ("json", model, prompt),
+            lambda: llm_scheduler.run(priority, lambda: _generate_json(
+                prompt, model, schema, NUM_PREDICT.get(priority)
+            ))
+        )
+    except Exception as e:
+        print(f"[Ollama Error] {e}")
+        raise
+
+
+def call_ollama_chat(prompt: str, turn: ChatTurn, model: str = MODEL_NAME,
+                     priority: int = PRIORITY_CHAT, schema: Dict[str, Any] = RESPONSE_SCHEMA) -> Any:
+    """Runs one session turn like :func:`call_ollama_json` and returns the answer, or None.
+
+    ``turn.context`` is sent with the prompt, and the returned context is
+    left in ``turn.new_context``. Turns are never shared between callers.
+    """
+
+    try:
+        return llm_scheduler.run(priority, lambda: _generate_json(
+            prompt, model, schema, NUM_PREDICT.get(priority), turn
+        ))
     except Exception as e:
         print(f"[Ollama Error] {e}")
         raise
 
 
+def call_ollama_stream(prompt: str, model: str = MODEL_NAME, priority: int = PRIORITY_GENERATE,
+                       schema: Dict[str, Any] = None, context: list = None,
+                       on_done: Callable[[Dict[str, Any]], None] = None) -> Iterator[str]:
+    """Streams the Ollama completion, yielding text chunks as they arrive.
+
+    The scheduler slot is held until the stream finishes or is closed.
+    Pass ``schema`` (e.g. :data:`RESPONSE_SCHEMA`) to constrain the output;
+    ``context`` and ``on_done`` as in :meth:`OllamaClient.generate_stream`.
+    """
+
+    try:
+        llm_scheduler.acquire(priority)
+    except LoadShedError as e:
+        print(f"[Ollama Stream Error] {e}")
+        raise
+
+    started = time.monotonic()
+    latency, ok = None, True
+    try:
+        yield from ollama_client.generate_stream(
+            prompt, model, schema=schema, num_predict=NUM_PREDICT.get(priority),
+            context=context, on_done=on_done
+        )
+        latency = time.monotonic() - started
+    except CircuitOpenError as e:
+        print(f"[Ollama Stream Error] {e}")
+        raise
+    except Exception as e:
+        latency, ok = time.monotonic() - started, False
+        print(f"[Ollama Stream Error] {e}")
+        raise
+    finally:
+        llm_scheduler.release(latency, ok)
+
+
+async def _generate_json_async(prompt: str, model: str, schema: Dict[str, Any], num_predict: int,
+                               turn: ChatTurn = None) -> Any:
+    extractor = JSONStreamExtractor(validator=is_valid_response)
+    stream = ollama_client.generate_stream_async(
+        prompt, model, schema=schema, num_predict=num_predict,
+        context=turn and turn.context, on_done=turn and turn.on_done
+    )
+    try:
+        async for chunk in stream:
+            if extractor.feed(chunk) and (turn is None or turn.stop()):
+                break
+    finally:
+        await stream.aclose()
+    return finalize_response(extractor)
+
+
+async def call_ollama_json_async(prompt: str, model: str = MODEL_NAME, priority: int = PRIORITY_GENERATE,
+                                 schema: Dict[str, Any] = RESPONSE_SCHEMA) -> Any:
+    """Coroutine version of :func:`call_ollama_json`."""
+
+    try:
+        return await ollama_flights.ado(
+            ("json", model, prompt),
+            lambda: llm_scheduler.run_async(priority, lambda: _generate_json_async(
+                prompt, model, schema, NUM_PREDICT.get(priority)
+            ))
+        )
+    except Exception as e:
+        print(f"[Ollama Error] {e}")
+        raise
+
+
+async def call_ollama_chat_async(prompt: str, turn: ChatTurn, model: str = MODEL_NAME,
+                                 priority: int = PRIORITY_CHAT,
+                                 schema: Dict[str, Any] = RESPONSE_SCHEMA) -> Any:
+    """Coroutine version of :func:`call_ollama_chat`."""
+
+    try:
+        return await llm_scheduler.run_async(priority, lambda: _generate_json_async(
+            prompt, model, schema, NUM_PREDICT.get(priority), turn
+        ))
+    except Exception as e:
+        print(f"[Ollama Error] {e}")
+        raise
+
+
+async def call_ollama_stream_async(prompt: str, model: str = MODEL_NAME, priority: int = PRIORITY_GENERATE,
+                                   schema: Dict[str, Any] = None, context: list = None,
+                                   on_done: Callable[[Dict[str, Any]], None] = None) -> AsyncIterator[str]:
+    """Coroutine version of :func:`call_ollama_stream`."""
+
+    try:
+        await llm_scheduler.acquire_async(priority)
+    except LoadShedError as e:
+        print(f"[Ollama Stream Error] {e}")
+        raise
+
+    started = time.monotonic()
+    latency, ok = None, True
+    stream = ollama_client.generate_stream_async(
+        prompt, model, schema=schema, num_predict=NUM_PREDICT.get(priority),
+        context=context, on_done=on_done
+    )
+    try:
+        async for chunk in stream:
+            yield chunk
+        latency = time.monotonic() - started
+    except CircuitOpenError as e:
+        print(f"[Ollama Stream Error] {e}")
+        raise
+    except Exception as e:
+        latency, ok = time.monotonic() - started, False
+        print(f"[Ollama Stream Error] {e}")
+        raise
+    finally:
+        await stream.aclose()
+        llm_scheduler.release(latency, ok)
+
+
+def _scan_json_string(raw: str, start: int) -> Tuple[str, bool, int]:
+    """Decodes the JSON string literal whose body begins at ``start``.
+
+    Returns the decoded text, whether the closing quote was seen, and the
+    index just past the literal (or ``len(raw)`` if it is still open).
+    """
+
+    i = start
+    while i < len(raw):
+        c = raw[i]
+        if c == "\\":
+            step = 6 if raw[i + 1:i + 2] == "u" else 2
+            if i + step > len(raw):
+                # Escape sequence cut off mid-stream; decode what precedes it
+                break
+            i += step
+        elif c == '"':
+            try:
+                return json.loads(raw[start - 1:i + 1]), True, i + 1
+            except ValueError:
+                return raw[start:i], True, i + 1
+        else:
+            i += 1
+
+    body = raw[start:i]
+    try:
+        return json.loads(f'"{body}"'), False, len(raw)
+    except ValueError:
+        return body, False, len(raw)
+
+
+_JSON_SPECIAL = re.compile(r'[{}\[\]"\\]')
+
+
+class JSONStreamExtractor:
+    """Finds the first complete top-level JSON object in a streamed completion.
+
+    Chunks are scanned once as they arrive, tracking bracket depth and
+    string/escape state, so the object is recognized the moment its closing
+    brace streams in; text before it (prose, code fences) is skipped. Once
+    :attr:`done`, :attr:`result` holds the parsed object and :attr:`valid`
+    whether it passed ``validator``.
+    """
+
+    def __init__(self, validator: Callable[[Any], bool] = None):
+        self.validator = validator
+        self.done = False
+        self.valid = False
+        self.result = None
+        self._raw = []
+        self._object = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def text(self) -> str:
+        """All completion text fed so far."""
+        return "".join(self._raw)
+
+    def feed(self, chunk: str) -> bool:
+        """Consumes one chunk; returns True once the top-level object has closed."""
+
+        if self.done:
+            return True
+        self._raw.append(chunk)
+
+        start = 0 if self._depth else None
+        # An escape cut off at the previous chunk boundary swallows this chunk's first char
+        skip = 0 if self._escaped else -1
+        self._escaped = False
+
+        for match in _JSON_SPECIAL.finditer(chunk):
+            i = match.start()
+            if i == skip:
+                continue
+            c = chunk[i]
+            if self._depth == 0:
+                if c == "{":
+                    self._depth, start = 1, i
+                continue
+            if self._in_string:
+                if c == "\\":
+                    skip = i + 1
+                elif c == '"':
+                    self._in_string = False
+                continue
+            if c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._object.append(chunk[start:i + 1])
+                    candidate, self._object, start = "".join(self._object), [], None
+                    try:
+                        data = json.loads(candidate)
+                    except ValueError:
+                        continue
+                    if isinstance(data, dict):
+                        self.result = data
+                        self.valid = self.validator(data) if self.validator else True
+                        self.done = True
+                        return True
+
+        if self._depth and start is not None:
+            self._object.append(chunk[start:])
+        self._escaped = self._in_string and skip == len(chunk)
+        return False
+
+    def finish(self) -> Any:
+        """The extracted object, or a best-effort parse of the full text if none closed."""
+        return self.result if self.done else extract_json(self.text)
+
+
+_SUMMARY_KEY = re.compile(r'"summary"\s*:\s*"')
+_STEPS_KEY = re.compile(r'"steps"\s*:\s*\[')
+
+
+def extract_partial_fields(raw: str) -> Dict[str, Any]:
+    """Pulls ``summary`` and the completed ``steps`` out of partial LLM JSON.
+
+    Used while a completion is still streaming: the summary may be cut off
+    mid-sentence, but only steps whose string literal has closed are returned.
+    """
+
+    partial: Dict[str, Any] = {"summary": None, "steps": []}
+
+    match = _SUMMARY_KEY.search(raw)
+    if match:
+        partial["summary"], _, _ = _scan_json_string(raw, match.end())
+
+    match = _STEPS_KEY.search(raw)
+    if match:
+        i = match.end()
+        while i < len(raw):
+            c = raw[i]
+            if c in " \t\r\n,":
+                i += 1
+            elif c == '"':
+                step, closed, i = _scan_json_string(raw, i + 1)
+                if not closed:
+                    break
+                partial["steps"].append(step)
+            else:
+                break
+
+    return partial
+
+
 def extract_json(raw: str) -> dict:
     """Extracts JSON from raw LLM output safely."""
 
@@ -62,10 +1328,247 @@ def extract_json(raw: str) -> dict:
         return None
 
 
-def generate_emergency_response(emergency_type: str, location: str = "") -> Dict[str, Any]:
-    """Generates a structured emergency response using LLM."""
+def is_valid_response(data: Any) -> bool:
+    """True when ``data`` is a dict carrying every required response field."""
+    return isinstance(data, dict) and all(k in data for k in REQUIRED_FIELDS)
+
+
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+# A trailing object key (with or without its colon) that never got a value
+_DANGLING_KEY = re.compile(r',?\s*"[^"{}\[\]]*"\s*:?\s*$')
+# A trailing number or literal cut off mid-token, with its key if any
+_DANGLING_VALUE = re.compile(r',?\s*(?:"[^"{}\[\]]*"\s*:\s*)?[^",:{}\[\]\s]*$')
+
+
+def repair_json(raw: str) -> Any:
+    """Parses near-valid JSON: trailing commas, or output truncated mid-answer.
+
+    Truncated output has its open string closed, any dangling key or
+    partial literal dropped and its open arrays/objects closed in order.
+    Returns the parsed object, or None if it cannot be recovered.
+    """
+
+    start = raw.find("{")
+    if start < 0:
+        return None
+    text = raw[start:]
+
+    closers = []
+    in_string = escaped = False
+    for i, c in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            closers.append("}" if c == "{" else "]")
+        elif c in "}]" and closers:
+            closers.pop()
+            if not closers:
+                text = text[:i + 1]
+                break
+
+    if escaped:
+        text = text[:-1]
+    if in_string:
+        text += '"'
+    tail = "".join(reversed(closers))
+
+    for candidate in (text, _DANGLING_KEY.sub("", text), _DANGLING_VALUE.sub("", text)):
+        candidate = candidate.rstrip().rstrip(",") + tail
+        try:
+            data = json.loads(_TRAILING_COMMA.sub(r"\1", candidate))
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def _string_list(value: Any) -> list:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def normalize_response(data: Dict[str, Any]) -> Any:
+    """Coerces a parsed answer into the required shape and Modelfile limits.
+
+    Missing fields are filled (``sms_template`` from :data:`SMS_TEMPLATE`),
+    steps are capped at :data:`MAX_STEPS` and every step and the SMS are
+    clipped to their length limits. Returns a new dict, or None when the
+    answer has neither steps nor a summary worth keeping.
+    """
+
+    steps = [_clip(step, MAX_STEP_CHARS) for step in _string_list(data.get("steps"))][:MAX_STEPS]
+    summary = str(data.get("summary") or "").strip()
+    if not steps and not summary:
+        return None
+
+    title = str(data.get("title") or "").strip() or "Emergency guidance"
+    sms = str(data.get("sms_template") or "").strip() or SMS_TEMPLATE.format(title=title)
+
+    result = dict(data)
+    result.update({
+        "title": title,
+        "summary": summary or steps[0],
+        "steps": steps,
+        "warnings": _string_list(data.get("warnings")),
+        "sms_template": _clip(sms, MAX_SMS_CHARS),
+    })
+    return result
+
+
+class ParseStats:
+    """Counts how model answers were recovered: clean, repaired or failed."""
+
+    OUTCOMES = ("clean", "repaired", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.OUTCOMES, 0)
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        counts["total"] = total
+        # Any answer that was not clean JSON cost model time that the schema should have saved
+        counts["parse_failure_rate"] = (counts["repaired"] + counts["failed"]) / total if total else 0.0
+        counts["repair_rate"] = counts["repaired"] / total if total else 0.0
+        counts["failure_rate"] = counts["failed"] / total if total else 0.0
+        return counts
+
+
+parse_stats = ParseStats()
+metrics.callback(
+    "llm_json_parse_total", "Model answers by parse outcome (clean, repaired, failed)",
+    lambda: [((outcome,), parse_stats.stats()[outcome]) for outcome in ParseStats.OUTCOMES],
+    ("outcome",), kind="counter"
+)
+
+
+def finalize_response(extractor: "JSONStreamExtractor") -> Any:
+    """Returns the extractor's answer, locally repaired if needed, or None.
+
+    Clean answers pass through untouched; truncated or malformed output goes
+    through :func:`repair_json` and :func:`normalize_response` instead of
+    being thrown away. Each outcome is counted in :data:`parse_stats`.
+    """
+
+    data = extractor.result if extractor.done else repair_json(extractor.text)
+    fixed = normalize_response(data) if isinstance(data, dict) else None
+
+    if fixed is None:
+        parse_stats.record("failed")
+        return None
+    if extractor.valid and fixed == data:
+        parse_stats.record("clean")
+        return data
+    parse_stats.record("repaired")
+    return fixed
+
+
+_COORDINATES = re.compile(r"(-?\d+\.\d+)\D+?(-?\d+\.\d+)")
+_UNKNOWN_LOCATIONS = {"", "not specified", "location unknown", "location unavailable"}
+
+
+def normalize_location(location: str, precision: int = None) -> str:
+    """Coarsens a free-form location so nearby requests share a cache key.
+
+    Coordinate pairs (``"Lat: 12.9716, Long: 77.5946"``) are rounded to
+    ``precision`` decimals; anything else is lowercased with punctuation
+    and repeated whitespace removed.
+    """
+
+    if precision is None:
+        precision = config.LLM_CACHE_COORD_PRECISION
+    text = (location or "").strip().lower()
+
+    match = _COORDINATES.search(text)
+    if match:
+        lat, lon = (round(float(v), precision) for v in match.groups())
+        return f"{lat:.{precision}f},{lon:.{precision}f}"
+
+    text = " ".join(re.sub(r"[^\w\s]", " ", text).split())
+    return "" if text in _UNKNOWN_LOCATIONS else text
+
+
+def is_generic_location(location: str) -> bool:
+    """True when ``location`` names no place the model could use.
+
+    Missing locations and bare coordinates qualify: the model has no map,
+    so coordinates do not change its instructions (the client substitutes
+    them into the SMS itself). Named places and free text do not qualify.
+    """
+
+    text = (location or "").strip().lower()
+    if _COORDINATES.search(text):
+        text = _COORDINATES.sub(" ", text)
+        text = re.sub(r"\b(lat|latitude|long|lon|lng|longitude)\b", " ", text)
+        return not re.sub(r"[^\w]", "", text)
+    return normalize_location(text) == ""
+
+
+def make_cache_key(kind: str, location: str = "", language: str = "en", query: str = "") -> Tuple[str, ...]:
+    """Builds the response-cache key from normalized request fields."""
+
+    return (
+        (kind or "general").strip().lower(),
+        normalize_location(location),
+        (language or "en").strip().lower(),
+        " ".join((query or "").lower().split()),
+    )
+
+
+def generate_cached(prompt: str, cache_key: Tuple[str, ...],
+                    priority: int = PRIORITY_GENERATE) -> Dict[str, Any]:
+    """Returns the parsed JSON answer for ``prompt``, served from cache if possible.
+
+    On an exact-key miss, the answer to a near-identical query with the
+    same kind, location and language is reused (see
+    :class:`~.answer_cache.SimilarAnswerCache`). Only answers carrying
+    every required field are cached; any other JSON the model returns is
+    passed through uncached. Errors propagate.
+    """
+
+    scope, query = cache_key[:-1], cache_key[-1]
+
+    def load():
+        similar = answer_cache.get(scope, query)
+        if similar is not None:
+            return similar
+        data = _require_json(call_ollama_json(prompt, priority=priority))
+        if is_valid_response(data):
+            answer_cache.put(scope, query, data)
+        return data
+
+    return response_cache.get_or_load(cache_key, load, cacheable=is_valid_response)
+
+
+def _require_json(data: Any) -> Any:
+    if data is None:
+        raise ValueError("Invalid JSON from model")
+    return data
 
-    prompt = f"""
+
+def _emergency_prompt(emergency_type: str, location: str) -> str:
+    return f"""
 You are an emergency response assistant. Provide a structured response for a {emergency_type} emergency.
 
 Location: {location or 'Not specified'}
@@ -81,30 +1584,159 @@ Output ONLY a JSON object with this structure:
 (All fields required. No markdown. No explanations.)
 """
 
+
+def _require_valid(data: Any) -> Dict[str, Any]:
+    if not is_valid_response(data):
+        raise ValueError("Invalid JSON from model")
+    return data
+
+
+_fallbacks = metrics.counter(
+    "fallback_responses_total", "Answers served without the model", ("source",)
+)
+# Built-in answer from _fallback_response / a route's bundled template
+builtin_fallbacks = _fallbacks.labels("builtin")
+template_fallbacks = _fallbacks.labels("template")
+
+
+def _fallback_response(emergency_type: str) -> Dict[str, Any]:
+    builtin_fallbacks.inc()
+    return {
+        "title": f"{emergency_type.capitalize()} Emergency",
+        "summary": "Emergency information is currently unavailable.",
+        "steps": [
+            "Stay calm and assess your surroundings.",
+            "Move to a safer location if possible.",
+            "Contact emergency services immediately.",
+        ],
+        "warnings": ["Follow official safety instructions.", "Avoid unnecessary risks."],
+        "sms_template": f"EMERGENCY: {emergency_type.upper()} - Seek safety and follow emergency guidelines."
+    }
+
+
+def _is_translated(language: str) -> Callable[[Any], bool]:
+    return lambda data: is_valid_response(data) and data.get("language") == language
+
+
+def _generate_validated(emergency_type: str, location: str) -> Dict[str, Any]:
+    return _require_valid(
+        call_ollama_json(_emergency_prompt(emergency_type, location), priority=PRIORITY_INSTRUCTIONS)
+    )
+
+
+def _pack_or_fallback(emergency_type: str, language: str) -> Dict[str, Any]:
+    localized, english = guidance_pack.lookup(emergency_type, language)
+    return localized or english or _fallback_response(emergency_type)
+
+
+def build_guidance_pack(types: Iterable[str] = None, languages: Iterable[str] = None,
+                        priority: int = PRIORITY_INSTRUCTIONS) -> Dict[str, int]:
+    """Generates, validates and saves the guidance pack for every type x language.
+
+    Background refreshes pass ``PRIORITY_CHAT`` so that during a surge the
+    scheduler sheds them before any user request.
+    """
+
+    def generate(emergency_type):
+        return _require_valid(call_ollama_json(_emergency_prompt(emergency_type, ""), priority=priority))
+
+    def translate(english, language):
+        translated = translate_service.translate_response(english, language)
+        return translated if _is_translated(language)(translated) else None
+
+    return guidance_pack.build(
+        generate, translate,
+        types if types is not None else config.GUIDANCE_PACK_TYPES,
+        languages if languages is not None else config.GUIDANCE_PACK_LANGUAGES
+    )
+
+
+def generate_emergency_response(emergency_type: str, location: str = "", language: str = "en") -> Dict[str, Any]:
+    """Generates a structured emergency response using LLM.
+
+    Requests without a named place (see :func:`is_generic_location`) are
+    answered from the offline guidance pack when it has the type. Otherwise
+    the model answers in English and other languages are produced by
+    translating that answer. Validated answers are cached per normalized
+    type, coarse location and language (translations only once every field
+    was translated); on failure the packed answer for the type, or the
+    hardcoded fallback, is returned and never cached.
+    """
+
+    english = None
+    if is_generic_location(location):
+        localized, english = guidance_pack.lookup(emergency_type, language)
+        if localized is not None:
+            return localized
+
     try:
-        raw = call_ollama(prompt)
-        data = extract_json(raw)
+        if english is None:
+            english = response_cache.get_or_load(
+                make_cache_key(emergency_type, location, "en"),
+                lambda: _generate_validated(emergency_type, location),
+                cacheable=is_valid_response
+            )
+        if not language or language == "en":
+            return english
+        return response_cache.get_or_load(
+            make_cache_key(emergency_type, location, language),
+            lambda: translate_service.translate_response(english, language),
+            cacheable=_is_translated(language)
+        )
+
+    except Exception as e:
+        print(f"[Emergency Response Error] {e}")
+        return _pack_or_fallback(emergency_type, language)
 
-        # Validate
-        required = ["title", "summary", "steps", "warnings", "sms_template"]
 
-        if not data or not all(k in data for k in required):
-            raise ValueError("Invalid JSON from model")
+async def generate_cached_async(prompt: str, cache_key: Tuple[str, ...],
+                                priority: int = PRIORITY_GENERATE) -> Dict[str, Any]:
+    """Coroutine version of :func:`generate_cached`."""
 
+    scope, query = cache_key[:-1], cache_key[-1]
+
+    async def load():
+        # The answer cache (built on first use) is SQLite-backed: keep both off the event loop
+        loop = asyncio.get_running_loop()
+        similar = await loop.run_in_executor(None, lambda: answer_cache.get(scope, query))
+        if similar is not None:
+            return similar
+        data = _require_json(await call_ollama_json_async(prompt, priority=priority))
+        if is_valid_response(data):
+            await loop.run_in_executor(None, lambda: answer_cache.put(scope, query, data))
         return data
 
+    return await response_cache.aget_or_load(cache_key, load, cacheable=is_valid_response)
+
+
+async def generate_emergency_response_async(emergency_type: str, location: str = "",
+                                            language: str = "en") -> Dict[str, Any]:
+    """Coroutine version of :func:`generate_emergency_response`."""
+
+    async def load():
+        return _require_valid(await call_ollama_json_async(
+            _emergency_prompt(emergency_type, location), priority=PRIORITY_INSTRUCTIONS
+        ))
+
+    english = None
+    if is_generic_location(location):
+        localized, english = guidance_pack.lookup(emergency_type, language)
+        if localized is not None:
+            return localized
+
+    try:
+        if english is None:
+            english = await response_cache.aget_or_load(
+                make_cache_key(emergency_type, location, "en"), load, cacheable=is_valid_response
+            )
+        if not language or language == "en":
+            return english
+        return await response_cache.aget_or_load(
+            make_cache_key(emergency_type, location, language),
+            lambda: translate_service.translate_response_async(english, language),
+            cacheable=_is_translated(language)
+        )
+
     except Exception as e:
         print(f"[Emergency Response Error] {e}")
-
-        # Fallback response
-        return {
-            "title": f"{emergency_type.capitalize()} Emergency",
-            "summary": "Emergency information is currently unavailable.",
-            "steps": [
-                "Stay calm and assess your surroundings.",
-                "Move to a safer location if possible.",
-                "Contact emergency services immediately.",
-            ],
-            "warnings": ["Follow official safety instructions.", "Avoid unnecessary risks."],
-            "sms_template": f"EMERGENCY: {emergency_type.upper()} - Seek safety and follow emergency guidelines."
-        }
+        return _pack_or_fallback(emergency_type, language)
@@ -0,0 +1,308 @@
+"""
+Process metrics in the Prometheus text exposition format.
+
+Hot-path instrumentation is kept cheap: each labelled series is created
+once (``labels()`` at import time, not per request) and holds a
+pre-allocated bucket array, so observing a value is a bisect, two
+increments and an uncontended lock. Values that services already count
+(cache hits, scheduler queues, parse outcomes) are read by callbacks at
+scrape time and cost nothing between scrapes.
+"""
+import threading
+import weakref
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans cache hits (~1ms) to slow generations on CPU-only hosts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# Ollama generation speed, tokens per second
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200, 500)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # One slot per bucket plus the +Inf overflow; cumulated only when rendered
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Metric:
+    """A metric family: one child series per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Return the child series for ``values``, creating it on first use.
+
+        Look the child up once and keep it; calling this per request costs a
+        dictionary lookup that the pre-bound child avoids.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed bucket bounds."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        bounds = self.buckets + (float("inf"),)
+        for values, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_label_text(self.labelnames, values, le)} {cumulative}"
+                )
+            labels = _label_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose samples are read from ``fn`` at scrape time.
+
+    ``fn`` returns an iterable of ``(label_values, value)`` pairs.
+    """
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], Iterable[Tuple[Tuple, float]]],
+                 labelnames: Sequence[str] = (), kind: str = "gauge"):
+        self.fn = fn
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.name = name
+        self.documentation = documentation
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        try:
+            samples = list(self.fn())
+        except Exception as e:
+            print(f"[Metrics Error] {self.name}: {e}")
+            return lines
+        for values, value in samples:
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_label_text(self.labelnames, values)} {_format_value(float(value))}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric family and renders them for a ``/metrics`` scrape."""
+
+    def __init__(self, prefix: str = "aidgen_"):
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._caches = weakref.WeakSet()
+        self._register_cache_metrics()
+
+    def _add(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-imports (e.g. the app module loaded twice) share the first family
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self.prefix + name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, fn: Callable[[], Iterable[Tuple[Tuple, float]]],
+                 labelnames: Sequence[str] = (), kind: str = "gauge") -> CallbackMetric:
+        return self._add(CallbackMetric(self.prefix + name, documentation, fn, labelnames, kind))
+
+    def track_cache(self, cache: Any) -> None:
+        """Export a cache's ``stats()`` (TTLCache or SingleFlight-style) under its name."""
+        self._caches.add(cache)
+
+    def _cache_samples(self, field: str):
+        for cache in list(self._caches):
+            stats = cache.stats()
+            if field in stats:
+                yield (stats.get("name", "cache"),), stats[field]
+
+    def _register_cache_metrics(self) -> None:
+        for field, kind, documentation in (
+            ("hits", "counter", "Fresh cache hits"),
+            ("stale_hits", "counter", "Stale entries served while refreshing"),
+            ("shared_hits", "counter", "Entries another worker process stored"),
+            ("misses", "counter", "Cache misses"),
+            ("evictions", "counter", "Entries evicted to stay within max_size"),
+            ("size", "gauge", "Entries currently cached"),
+            ("hit_ratio", "gauge", "Hits (fresh or stale) over all lookups"),
+        ):
+            suffix = "_total" if kind == "counter" else ""
+            self.callback(
+                f"cache_{field}{suffix}", documentation,
+                lambda field=field: self._cache_samples(field), ("cache",), kind
+            )
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry; services register their metrics at import time
+metrics = MetricsRegistry()
+
+# Content type Prometheus expects from a text-format scrape
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RouteMetrics:
+    """Per-route request latency and response counts for the HTTP layer.
+
+    Series are looked up by route string; the latency series is created
+    when a route is registered and each status-class counter the first
+    time that class is seen, so steady-state requests allocate nothing.
+    """
+
+    def __init__(self, registry: MetricsRegistry = None):
+        registry = registry or metrics
+        self.latency = registry.histogram(
+            "http_request_duration_seconds",
+            "Time to serve a request (streams: until the last event is sent)",
+            ("route",)
+        )
+        self.responses = registry.counter(
+            "http_responses_total", "Responses by route and status class", ("route", "status")
+        )
+        self._routes: Dict[str, Tuple[_HistogramChild, List[Optional[_CounterChild]]]] = {}
+
+    def register(self, route: str) -> None:
+        if route not in self._routes:
+            self._routes[route] = (self.latency.labels(route), [None] * 6)
+
+    def observe(self, route: Optional[str], status: int, seconds: float) -> None:
+        route = route or "unmatched"
+        series = self._routes.get(route)
+        if series is None:
+            self.register(route)
+            series = self._routes[route]
+        latency, responses = series
+        latency.observe(seconds)
+        status_class = min(status // 100, 5)
+        counter = responses[status_class]
+        if counter is None:
+            counter = responses[status_class] = self.responses.labels(route, f"{status_class}xx")
+        counter.inc()
+
+
+route_metrics = RouteMetrics()
@@ -0,0 +1,130 @@
+"""
+Token-bucket rate limiting for outbound SMS.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``capacity``.
+
+    Not thread-safe on its own; :class:`SmsRateLimiter` serializes access.
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float, tokens: float = 1.0) -> float:
+        """Seconds until ``tokens`` are available (0 if available now)."""
+        self._refill(now)
+        if self.tokens >= tokens:
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return (tokens - self.tokens) / self.rate
+
+    def consume(self, tokens: float = 1.0) -> None:
+        self.tokens -= tokens
+
+
+class SmsRateLimiter:
+    """Global plus per-destination token buckets matching the SMS provider's limits.
+
+    :meth:`acquire` never blocks: it either takes a token from both the
+    global bucket and the destination's bucket and returns 0, or takes
+    nothing and returns how long to wait before trying again, so callers
+    can queue the message instead of failing it.
+
+    The buckets live in process memory unless a ``store`` is given (the SOS
+    outbox, see :meth:`~.sos_outbox.SOSOutbox.take_tokens`); with several
+    worker processes only a shared store keeps the host within the limits.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float,
+                 destination_rate: float, destination_burst: float,
+                 max_destinations: int = 100000, store=None):
+        """Initialize the limiter.
+
+        Args:
+            global_rate: Messages per second across all destinations
+            global_burst: Global bucket capacity
+            destination_rate: Messages per second to any single number
+            destination_burst: Per-destination bucket capacity
+            max_destinations: Idle per-destination buckets kept before LRU eviction
+            store: Optional cross-process bucket store with
+                ``take_tokens([(key, rate, capacity), ...])``
+        """
+        self.destination_rate = destination_rate
+        self.destination_burst = destination_burst
+        self.max_destinations = max_destinations
+        self.store = store
+        self._global = TokenBucket(global_rate, global_burst)
+        self._destinations: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.deferred = 0
+
+    def acquire(self, destination: str) -> float:
+        """Take one token for ``destination`` or return the seconds to wait."""
+        if self.store is not None:
+            wait = self.store.take_tokens([
+                ('global', self._global.rate, self._global.capacity),
+                (f"to:{destination}", self.destination_rate, max(1.0, float(self.destination_burst))),
+            ])
+            with self._lock:
+                if wait > 0:
+                    self.deferred += 1
+                else:
+                    self.granted += 1
+            return wait
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._destinations.get(destination)
+            if bucket is None:
+                bucket = self._destinations[destination] = TokenBucket(
+                    self.destination_rate, self.destination_burst
+                )
+                if len(self._destinations) > self.max_destinations:
+                    self._destinations.popitem(last=False)
+            self._destinations.move_to_end(destination)
+
+            wait = max(bucket.wait_time(now), self._global.wait_time(now))
+            if wait > 0:
+                self.deferred += 1
+                return wait
+            bucket.consume()
+            self._global.consume()
+            self.granted += 1
+            return 0.0
+
+    def wait(self, destination: str, deadline: float) -> bool:
+        """Block until a token is granted or ``deadline`` (monotonic) passes."""
+        while True:
+            delay = self.acquire(destination)
+            if delay == 0:
+                return True
+            if time.monotonic() + delay >= deadline:
+                return False
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        # With a store, the counters are this process's decisions over the shared buckets
+        with self._lock:
+            return {
+                'granted': self.granted,
+                'deferred': self.deferred,
+                'tracked_destinations': len(self._destinations),
+                'shared': self.store is not None,
+            }
@@ -1,54 +1,370 @@
 """
 Resource service for managing disaster response resources.
 """
+import bisect
+import hashlib
 import json
 import os
-from pathlib import Path
-from typing import Dict, List, Optional
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import config
+from .file_utils import directory_signature, file_lock, iter_json_values
+from .resource_store import ALL_TYPES, FORMAT_VERSION, ResourceTable
+
+_TOKEN = re.compile(r'\w+')
+
+# Resource files: JSON (a record or an array of records) and NDJSON
+RESOURCE_SUFFIXES = ('.json', '.ndjson', '.jsonl')
+
+# Field weights used when ranking keyword matches
+TITLE_WEIGHT = 3.0
+TAG_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+# Prefix matches score lower than whole-token matches, and matches inside a token lower still
+PREFIX_FACTOR = 0.5
+INFIX_FACTOR = 0.25
+# Upper bound on vocabulary tokens a single prefix (or infix) may expand to
+MAX_PREFIX_EXPANSION = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens."""
+    return _TOKEN.findall((text or '').lower())
+
+
+def _coordinates(resource: Dict) -> Optional[Tuple[float, float]]:
+    """The resource's (latitude, longitude), or None if missing or out of range."""
+    try:
+        latitude = float(resource['latitude'])
+        longitude = float(resource['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if -90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0:
+        return latitude, longitude
+    return None
+
+
+def _keywords(resource: Dict) -> Dict[str, float]:
+    """Weighted search tokens of one resource."""
+    weights: Dict[str, float] = {}
+    for token in tokenize(resource.get('title', '')):
+        weights[token] = weights.get(token, 0.0) + TITLE_WEIGHT
+    for token in tokenize(resource.get('description', '')):
+        weights[token] = weights.get(token, 0.0) + DESCRIPTION_WEIGHT
+    for tag in resource.get('tags', []):
+        for token in tokenize(str(tag)):
+            weights[token] = weights.get(token, 0.0) + TAG_WEIGHT
+    return weights
+
+
+def _match_token(table: ResourceTable, token: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted documents containing ``token`` in one of their tokens, and their scores.
+
+    Like the original substring search, "quake" finds "earthquake"; whole
+    tokens rank above prefixes, which rank above matches inside a token.
+    """
+    vocabulary = table.vocabulary
+    start = bisect.bisect_left(vocabulary, token)
+    docs, scores = [], []
+    for rank in range(start, min(start + MAX_PREFIX_EXPANSION + 1, len(vocabulary))):
+        word = vocabulary[rank]
+        if not word.startswith(token):
+            break
+        word_docs, weights = table.postings(rank)
+        docs.append(word_docs)
+        scores.append(weights if word == token else weights * PREFIX_FACTOR)
+    for rank in table.words_containing(token, MAX_PREFIX_EXPANSION):
+        word_docs, weights = table.postings(rank)
+        docs.append(word_docs)
+        scores.append(weights * INFIX_FACTOR)
+    if not docs:
+        return np.empty(0, dtype=np.int32), np.empty(0)
+    if len(docs) == 1:
+        return docs[0], scores[0].astype(np.float64)
+    unique, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+    return unique, np.bincount(inverse, weights=np.concatenate(scores))
+
 
 class ResourceService:
-    """Service for managing disaster response resources."""
-    
-    def __init__(self, data_dir: str = None):
+    """Service for managing disaster response resources.
+
+    Resource files are streamed (never loaded whole) into a columnar
+    :class:`~.resource_store.ResourceTable` with keyword and spatial
+    indexes, and reloaded only when a file in ``data_dir`` is added,
+    removed or modified. The table is saved as a snapshot keyed by the
+    files' names, sizes and mtimes; later starts and other worker
+    processes memory-map that snapshot instead of re-reading the files.
+    """
+
+    def __init__(self, data_dir: str = None, reload_interval: float = 2.0,
+                 snapshot_dir: str = None, mmap: bool = None):
         """Initialize the resource service.
-        
+
         Args:
             data_dir: Directory containing resource data files
+            reload_interval: Minimum seconds between file modification checks
+            snapshot_dir: Where table snapshots are kept (default:
+                ``RESOURCE_SNAPSHOT_DIR``); empty string disables them
+            mmap: Memory-map snapshots rather than reading them into memory
+                (default: ``RESOURCE_MMAP``)
         """
         if data_dir is None:
             data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
         self.data_dir = data_dir
-    
+        self.reload_interval = reload_interval
+        self.snapshot_dir = config.RESOURCE_SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+        self.mmap = config.RESOURCE_MMAP if mmap is None else mmap
+        self._index: Optional[ResourceTable] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loaded_from = None
+        self.load_seconds = 0.0
+
+    def signature(self) -> Tuple:
+        """Fingerprint of the resource files, see :func:`directory_signature`."""
+        return directory_signature(self.data_dir, RESOURCE_SUFFIXES)
+
+    def _records(self, signature: Tuple) -> Iterator[Any]:
+        for filename, _, _ in signature:
+            path = os.path.join(self.data_dir, filename)
+            try:
+                yield from iter_json_values(path)
+            except (ValueError, OSError) as e:
+                print(f"Error loading resources from {filename}: {e}")
+
+    def _snapshot_path(self, signature: Tuple) -> Optional[str]:
+        if not self.snapshot_dir:
+            return None
+        key = json.dumps([FORMAT_VERSION, os.path.abspath(self.data_dir), signature])
+        return os.path.join(self.snapshot_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+
+    def _open(self, signature: Tuple) -> ResourceTable:
+        """Memory-map the snapshot for ``signature``, ingesting the files if there is none."""
+        started = time.perf_counter()
+        path = self._snapshot_path(signature)
+        table = ResourceTable.load(path, self.mmap) if path else None
+        self.loaded_from = 'snapshot'
+        if table is None and path:
+            try:
+                # One worker process ingests; the others wait and map its snapshot
+                with file_lock(os.path.join(self.snapshot_dir, '.build.lock')):
+                    table = ResourceTable.load(path, self.mmap) or self._build(signature, path)
+            except OSError as e:
+                print(f"Error locking resource snapshots in {self.snapshot_dir}: {e}")
+        if table is None:
+            table = ResourceTable.build(self._records(signature), keywords=_keywords)
+            self.loaded_from = 'files'
+        self.load_seconds = time.perf_counter() - started
+        return table
+
+    def _build(self, signature: Tuple, path: str) -> ResourceTable:
+        table = ResourceTable.build(self._records(signature), keywords=_keywords)
+        self.loaded_from = 'files'
+        try:
+            table.save(path)
+            self._prune_snapshots(path)
+            # Reopen so this process shares the snapshot's pages as well
+            return ResourceTable.load(path, self.mmap) or table
+        except OSError as e:
+            print(f"Error saving resource snapshot {path}: {e}")
+            return table
+
+    def _prune_snapshots(self, keep: str) -> None:
+        # Processes still mapping an old snapshot keep reading it after the unlink
+        for entry in os.scandir(self.snapshot_dir):
+            if entry.is_dir() and entry.path != keep and not entry.name.startswith('.'):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _get_index(self) -> ResourceTable:
+        """Return the current table, reloading it if the data files changed."""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.reload_interval:
+            return self._index
+
+        if self._index is None:
+            self._lock.acquire()
+        elif not self._lock.acquire(blocking=False):
+            # Another request is checking or rebuilding; keep serving the old index
+            return self._index
+        try:
+            if self._index is not None and now - self._checked_at < self.reload_interval:
+                return self._index
+            signature = self.signature()
+            if self._index is None or signature != self._signature:
+                self._index = self._open(signature)
+                self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._index
+        finally:
+            self._lock.release()
+
+    def reload(self) -> None:
+        """Force the next access to re-scan the data directory."""
+        with self._lock:
+            self._signature = None
+            self._checked_at = 0.0
+
     def get_all_resources(self) -> List[Dict]:
         """Get all available resources.
-        
+
+        Every record is materialized; prefer :meth:`iter_resources` or
+        :meth:`search` for large datasets.
+
         Returns:
             List of resource dictionaries
         """
-        resources = []
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith('.json'):
-                with open(os.path.join(self.data_dir, filename), 'r', encoding='utf-8') as f:
-                    resources.extend(json.load(f))
-        return resources
-    
+        return list(self._get_index().records())
+
+    def iter_resources(self, located: bool = None) -> Iterator[Dict]:
+        """Yield resources one at a time.
+
+        Args:
+            located: True for only resources with coordinates, False for
+                only those without, None for all
+        """
+        table = self._get_index()
+        if located is None:
+            return table.records()
+        mask = table.is_located()
+        return table.records(np.flatnonzero(mask if located else ~mask))
+
+    def search(self, query: str = '', tag: str = None, limit: int = None,
+               offset: int = 0) -> Dict:
+        """Ranked keyword search over titles, descriptions and tags.
+
+        Every query token must match a resource: as a whole token, as a
+        prefix of one, or inside one ("quake" finds "earthquake"), ranked
+        in that order. Title matches outrank tag matches, which outrank
+        description matches.
+
+        Args:
+            query: Free-text keywords; empty matches every resource
+            tag: Optional tag the resources must carry (exact, case-insensitive)
+            limit: Maximum number of results to return (None for all)
+            offset: Number of ranked results to skip
+
+        Returns:
+            Dict with ``total`` matches and the requested page of ``resources``
+        """
+        table = self._get_index()
+        tokens = tokenize(query)
+        offset = max(0, offset or 0)
+        end = None if limit is None else offset + max(0, limit)
+
+        candidates = None
+        if tag:
+            candidates = table.tagged(tag)
+
+        if tokens:
+            docs, scores = _match_token(table, tokens[0])
+            for token in tokens[1:]:
+                if not len(docs):
+                    break
+                other_docs, other_scores = _match_token(table, token)
+                docs, mine, theirs = np.intersect1d(docs, other_docs, assume_unique=True,
+                                                    return_indices=True)
+                scores = scores[mine] + other_scores[theirs]
+            if candidates is not None:
+                keep = np.isin(docs, candidates, assume_unique=True)
+                docs, scores = docs[keep], scores[keep]
+            total = len(docs)
+            if end is not None and end <= offset:
+                # An empty page (limit 0, or an offset past the end) needs no ranking
+                docs, scores = docs[:0], scores[:0]
+            elif end is not None and end < total:
+                # Only the requested page needs ordering, not every match
+                cutoff = np.partition(scores, total - end)[total - end]
+                keep = scores >= cutoff
+                docs, scores = docs[keep], scores[keep]
+            ranked = docs[np.lexsort((docs, -scores))]
+        elif candidates is not None:
+            total = len(candidates)
+            ranked = candidates
+        else:
+            total = len(table)
+            ranked = range(total)
+
+        return {
+            'total': total,
+            'resources': list(table.records(ranked[offset:end])),
+        }
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1,
+                resource_type: str = None) -> List[Dict]:
+        """The ``k`` located resources closest to a point, nearest first.
+
+        Only resources with ``latitude`` and ``longitude`` are considered.
+
+        Args:
+            latitude: Latitude in degrees
+            longitude: Longitude in degrees
+            k: Number of resources to return
+            resource_type: Optional ``type`` the resources must have
+                (case-insensitive, e.g. "shelter" or "hospital")
+
+        Returns:
+            Copies of the resources with an added ``distance_km``
+
+        Raises:
+            ValueError: If the coordinates are out of range
+        """
+        if _coordinates({'latitude': latitude, 'longitude': longitude}) is None:
+            raise ValueError('latitude must be within [-90, 90] and longitude within [-180, 180]')
+        table = self._get_index()
+        geo = table.geo.get(resource_type.lower() if resource_type else ALL_TYPES)
+        if geo is None:
+            return []
+        return [
+            {**table.record(doc_id), 'distance_km': round(distance, 3)}
+            for doc_id, distance in geo.nearest(latitude, longitude, k)
+        ]
+
+    def nearest_shelter(self, latitude, longitude) -> Optional[str]:
+        """One-line description of the closest shelter, for SMS and alerts.
+
+        Returns:
+            e.g. "Town Hall, 1 Main St (1.2 km)", or None without
+            coordinates or a located shelter
+        """
+        try:
+            shelters = self.nearest(float(latitude), float(longitude), 1, 'shelter')
+        except (TypeError, ValueError):
+            return None
+        if not shelters:
+            return None
+        shelter = shelters[0]
+        name = shelter.get('title') or shelter.get('id', 'Shelter')
+        if shelter.get('address'):
+            name = f"{name}, {shelter['address']}"
+        return f"{name} ({shelter['distance_km']:.1f} km)"
+
+    def stats(self) -> Dict[str, Any]:
+        table = self._index
+        return {
+            'resources': len(table) if table is not None else None,
+            'bytes': table.nbytes() if table is not None else None,
+            'loaded_from': self.loaded_from,
+            'load_seconds': round(self.load_seconds, 3),
+            'mmap': bool(self.mmap and self.snapshot_dir),
+        }
+
     def find_resources_by_keyword(self, keyword: str) -> List[Dict]:
         """Find resources matching the given keyword.
-        
+
         Args:
             keyword: Keyword to search for in resource titles and descriptions
-            
+
         Returns:
-            List of matching resource dictionaries
+            List of matching resource dictionaries, best match first
         """
-        keyword = keyword.lower()
-        all_resources = self.get_all_resources()
-        return [
-            r for r in all_resources
-            if (keyword in r.get('title', '').lower() or 
-                 keyword in r.get('description', '').lower() or
-                 any(keyword in tag.lower() for tag in r.get('tags', [])))
-        ]
+        return self.search(keyword)['resources']
 
 # Create a default instance for easy importing
 resource_service = ResourceService()
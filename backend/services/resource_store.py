@@ -0,0 +1,346 @@
+"""
+Columnar resource storage: compact in-memory columns and memory-mapped snapshots.
+"""
+import json
+import math
+import os
+import shutil
+import tempfile
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .spatial_index import GeoIndex
+
+# Bumped whenever the snapshot layout or keyword weighting changes
+FORMAT_VERSION = 1
+
+# String fields stored as UTF-8 columns; anything else goes to the JSON ``extra`` column
+TEXT_FIELDS = ('id', 'title', 'description', 'url', 'address')
+
+# Key of the spatial index over every located resource, whatever its type
+ALL_TYPES = ''
+
+
+class _TextColumn:
+    """Strings appended as one UTF-8 buffer plus end offsets."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('q', [0])
+
+    def append(self, value: Optional[str]) -> None:
+        if value:
+            self.data += value.encode('utf-8')
+        self.offsets.append(len(self.data))
+
+    def arrays(self):
+        return np.frombuffer(bytes(self.data), dtype=np.uint8), np.frombuffer(self.offsets, dtype=np.int64)
+
+
+class _Interner:
+    """Maps strings to dense integer codes, in first-seen order."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __call__(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+# Exact types, so booleans (an int subclass) are not taken for numbers
+_NUMBER = (int, float)
+
+
+def _strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    text = bytes(blob)
+    return [text[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+class ResourceTable:
+    """Immutable column store of resources, with keyword postings and spatial indexes.
+
+    Instead of one dict per record, each field is a column: strings in a
+    single UTF-8 buffer with offsets, ``type`` and ``tags`` as interned
+    integer codes, coordinates and capacity as numeric arrays. Fields of
+    any other name or shape are kept as JSON in an ``extra`` column, so
+    :meth:`record` rebuilds what was ingested. Keyword postings are CSR
+    arrays (one slice of documents and weights per vocabulary word, words
+    sorted), and the k-d trees of located resources are flat arrays too.
+
+    Every array can be saved as ``.npy`` files and memory-mapped back, so
+    processes that load the same snapshot share its pages.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.arrays = arrays
+        self.meta = meta
+        self.count = meta['count']
+        self.types: List[str] = meta['types']
+        self.tags: List[str] = meta['tags']
+        self.vocabulary: List[str] = _strings(arrays['vocabulary'], arrays['vocabulary_offsets'])
+        self._vocabulary_bytes: Optional[bytes] = None
+        self._text = {field: (arrays[f'text_{field}'], arrays[f'text_{field}_offsets'])
+                      for field in TEXT_FIELDS + ('extra',)}
+        # Case-insensitive tag filter: lowercase tag -> tag codes
+        self.tag_keys: Dict[str, List[int]] = {}
+        for code, tag in enumerate(self.tags):
+            self.tag_keys.setdefault(tag.lower(), []).append(code)
+        self.geo: Dict[str, GeoIndex] = {
+            key: GeoIndex.from_arrays({part: arrays[f'geo{number}_{part}']
+                                       for part in ('points', 'ids', 'nodes', 'splits')})
+            for number, key in enumerate(meta['geo'])
+        }
+
+    @classmethod
+    def build(cls, records: Iterable[Any],
+              keywords: Callable[[Dict[str, Any]], Dict[str, float]] = None) -> 'ResourceTable':
+        """Ingest records in one streaming pass.
+
+        Args:
+            records: Resource dicts (anything else is skipped); may be a
+                generator, only one record is held at a time
+            keywords: Optional function returning ``{word: weight}`` for a
+                record, used to build the keyword postings
+        """
+        text = {field: _TextColumn() for field in TEXT_FIELDS + ('extra',)}
+        types, tags, words = _Interner(), _Interner(), _Interner()
+        type_codes = array('i')
+        tag_codes = array('i')
+        tag_offsets = array('q', [0])
+        latitudes = array('d')
+        longitudes = array('d')
+        capacities = array('q')
+        posting_words = array('i')
+        posting_docs = array('i')
+        posting_weights = array('f')
+        # This loop runs once per record, so column writes are bound up front
+        extra_column = text['extra']
+        text_data = {field: text[field].data for field in TEXT_FIELDS}
+        ends = [(column.data, column.offsets.append) for field, column in text.items() if field != 'extra']
+        word_codes = words.codes
+
+        count = 0
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            extra = None
+            type_code = -1
+            latitude = longitude = math.nan
+            capacity = -1
+            record_tags = ()
+            for key, value in record.items():
+                kind = type(value)
+                if kind is str and value and key in text_data:
+                    text_data[key] += value.encode('utf-8')
+                elif key == 'latitude' and kind in _NUMBER:
+                    latitude = value
+                elif key == 'longitude' and kind in _NUMBER:
+                    longitude = value
+                elif key == 'type' and kind is str and value:
+                    type_code = types(value)
+                elif key == 'tags' and kind is list and value and all(type(tag) is str for tag in value):
+                    record_tags = value
+                elif key == 'capacity' and kind in _NUMBER and value >= 0 and value == int(value):
+                    capacity = int(value)
+                else:
+                    if extra is None:
+                        extra = {}
+                    extra[key] = value
+            for data, append_end in ends:
+                append_end(len(data))
+            extra_column.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+            type_codes.append(type_code)
+            if record_tags:
+                tag_codes.extend(tags(tag) for tag in record_tags)
+            tag_offsets.append(len(tag_codes))
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+            capacities.append(capacity)
+            if keywords is not None:
+                for word, weight in keywords(record).items():
+                    code = word_codes.get(word)
+                    posting_words.append(words(word) if code is None else code)
+                    posting_docs.append(count)
+                    posting_weights.append(weight)
+            count += 1
+
+        arrays: Dict[str, np.ndarray] = {}
+        for field, column in text.items():
+            arrays[f'text_{field}'], arrays[f'text_{field}_offsets'] = column.arrays()
+        arrays['type'] = np.frombuffer(type_codes, dtype=np.int32)
+        arrays['tag_codes'] = np.frombuffer(tag_codes, dtype=np.int32)
+        arrays['tag_offsets'] = np.frombuffer(tag_offsets, dtype=np.int64)
+        arrays['latitude'] = np.frombuffer(latitudes, dtype=np.float64)
+        arrays['longitude'] = np.frombuffer(longitudes, dtype=np.float64)
+        arrays['capacity'] = np.frombuffer(capacities, dtype=np.int64)
+
+        # Tag -> documents, for the tag filter
+        tag_docs = np.repeat(np.arange(count, dtype=np.int32), np.diff(arrays['tag_offsets']))
+        order = np.lexsort((tag_docs, arrays['tag_codes']))
+        arrays['tag_docs'] = tag_docs[order]
+        arrays['tag_doc_offsets'] = np.concatenate(
+            ([0], np.cumsum(np.bincount(arrays['tag_codes'], minlength=len(tags.values))))
+        ).astype(np.int64)
+
+        # Keyword postings, grouped by word in sorted vocabulary order
+        vocabulary = sorted(words.values)
+        rank = np.empty(len(words.values), dtype=np.int32)
+        rank[[words.codes[word] for word in vocabulary]] = np.arange(len(vocabulary), dtype=np.int32)
+        ranked_words = rank[np.frombuffer(posting_words, dtype=np.int32)]
+        docs = np.frombuffer(posting_docs, dtype=np.int32)
+        order = np.lexsort((docs, ranked_words))
+        arrays['posting_docs'] = docs[order]
+        arrays['posting_weights'] = np.frombuffer(posting_weights, dtype=np.float32)[order]
+        arrays['posting_offsets'] = np.concatenate(
+            ([0], np.cumsum(np.bincount(ranked_words, minlength=len(vocabulary))))
+        ).astype(np.int64)
+        column = _TextColumn()
+        for word in vocabulary:
+            column.append(word)
+        arrays['vocabulary'], arrays['vocabulary_offsets'] = column.arrays()
+
+        # One k-d tree over every located resource, plus one per type
+        latitude, longitude = arrays['latitude'], arrays['longitude']
+        located = np.flatnonzero((np.abs(latitude) <= 90.0) & (np.abs(longitude) <= 180.0))
+        geo_keys = [ALL_TYPES]
+        subsets = [located]
+        type_keys: Dict[str, List[int]] = {}
+        for code, name in enumerate(types.values):
+            type_keys.setdefault(name.lower(), []).append(code)
+        for key, codes in type_keys.items():
+            subset = located[np.isin(arrays['type'][located], codes)]
+            if len(subset):
+                geo_keys.append(key)
+                subsets.append(subset)
+        for number, subset in enumerate(subsets):
+            tree = GeoIndex(latitude[subset], longitude[subset])
+            for part, values in tree.arrays().items():
+                arrays[f'geo{number}_{part}'] = values
+            # Store document numbers, so queries need no translation
+            arrays[f'geo{number}_ids'] = subset[tree.ids].astype(np.int64)
+
+        meta = {'version': FORMAT_VERSION, 'count': count, 'types': types.values,
+                'tags': tags.values, 'geo': geo_keys}
+        return cls(arrays, meta)
+
+    def save(self, path: str) -> None:
+        """Write the snapshot to directory ``path`` atomically (no-op if it exists)."""
+        if os.path.isdir(path):
+            return
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=parent)
+        try:
+            for name, values in self.arrays.items():
+                np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(values))
+            with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.meta, f, ensure_ascii=False)
+            os.rename(staging, path)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            # Another process may have published the same snapshot first
+            if not os.path.isdir(path):
+                raise
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> Optional['ResourceTable']:
+        """Open a snapshot written by :meth:`save`, or None if missing or outdated."""
+        try:
+            with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != FORMAT_VERSION:
+            return None
+        arrays = {}
+        for entry in os.scandir(path):
+            if entry.name.endswith('.npy'):
+                arrays[entry.name[:-4]] = np.load(entry.path, mmap_mode='r' if mmap else None)
+        return cls(arrays, meta)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def nbytes(self) -> int:
+        """Size of every column and index, in bytes."""
+        return sum(values.nbytes for values in self.arrays.values())
+
+    def is_located(self) -> np.ndarray:
+        """Boolean mask of the resources with valid coordinates."""
+        return (np.abs(self.arrays['latitude']) <= 90.0) & (np.abs(self.arrays['longitude']) <= 180.0)
+
+    def record(self, doc_id: int) -> Dict[str, Any]:
+        """A fresh dict of one resource, as it was ingested."""
+        record = {}
+        for field, (blob, offsets) in self._text.items():
+            start, end = offsets[doc_id], offsets[doc_id + 1]
+            if end > start:
+                value = bytes(blob[start:end]).decode('utf-8')
+                if field == 'extra':
+                    record.update(json.loads(value))
+                else:
+                    record[field] = value
+        type_code = self.arrays['type'][doc_id]
+        if type_code >= 0:
+            record['type'] = self.types[type_code]
+        start, end = self.arrays['tag_offsets'][doc_id], self.arrays['tag_offsets'][doc_id + 1]
+        if end > start:
+            record['tags'] = [self.tags[code] for code in self.arrays['tag_codes'][start:end]]
+        latitude = self.arrays['latitude'][doc_id]
+        if not math.isnan(latitude):
+            record['latitude'] = float(latitude)
+        longitude = self.arrays['longitude'][doc_id]
+        if not math.isnan(longitude):
+            record['longitude'] = float(longitude)
+        capacity = self.arrays['capacity'][doc_id]
+        if capacity >= 0:
+            record['capacity'] = int(capacity)
+        return record
+
+    def records(self, doc_ids: Iterable[int] = None) -> Iterator[Dict[str, Any]]:
+        for doc_id in range(self.count) if doc_ids is None else doc_ids:
+            yield self.record(int(doc_id))
+
+    def postings(self, rank: int):
+        """Documents and weights of the ``rank``-th vocabulary word."""
+        start, end = self.arrays['posting_offsets'][rank], self.arrays['posting_offsets'][rank + 1]
+        return self.arrays['posting_docs'][start:end], self.arrays['posting_weights'][start:end]
+
+    def words_containing(self, fragment: str, limit: int) -> List[int]:
+        """Ranks of up to ``limit`` vocabulary words containing ``fragment`` after their start.
+
+        Words starting with ``fragment`` are left out (a bisect over
+        :attr:`vocabulary` finds those). The search runs over the
+        vocabulary's UTF-8 buffer rather than word by word.
+        """
+        if self._vocabulary_bytes is None:
+            self._vocabulary_bytes = bytes(self.arrays['vocabulary'])
+        text, offsets = self._vocabulary_bytes, self.arrays['vocabulary_offsets']
+        needle = fragment.encode('utf-8')
+        ranks = []
+        position = text.find(needle, 1)
+        while position >= 0 and len(ranks) < limit:
+            rank = int(np.searchsorted(offsets, position, side='right')) - 1
+            word_end = int(offsets[rank + 1])
+            if position > offsets[rank] and position + len(needle) <= word_end:
+                ranks.append(rank)
+                position = text.find(needle, word_end + 1)
+            else:
+                position = text.find(needle, position + 1)
+        return ranks
+
+    def tagged(self, tag: str) -> np.ndarray:
+        """Sorted documents carrying ``tag`` (case-insensitive)."""
+        offsets = self.arrays['tag_doc_offsets']
+        parts = [self.arrays['tag_docs'][offsets[code]:offsets[code + 1]]
+                 for code in self.tag_keys.get(tag.lower(), ())]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
@@ -0,0 +1,170 @@
+"""
+Chat sessions: the Ollama context and recent turns of each conversation.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from typing import Any, Dict, List, Optional
+
+from ..config import config
+from .metrics_service import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id TEXT PRIMARY KEY,
+    emergency_type TEXT NOT NULL,
+    context BLOB,
+    turns TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at);
+"""
+
+# Saves between sweeps for expired and surplus sessions
+PURGE_EVERY = 100
+
+
+class SessionStore:
+    """SQLite (WAL mode) store of chat sessions, one row per session.
+
+    A session keeps the ``context`` token array Ollama returned for its
+    last turn, packed as 32-bit integers, so the next turn sends only the
+    new message. The last few turns are kept as text too. If the context
+    is missing (e.g. the turn was cut short) or too long, the prompt is
+    rebuilt from those turns.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl: float = None, max_sessions: int = None,
+                 max_turns: int = None, max_context: int = None):
+        """Initialize the store; the database is opened (and created) on first use.
+
+        Args:
+            db_path: SQLite file (default: ``SESSION_DB_PATH``); empty string
+                keeps sessions in memory only
+            ttl: Seconds an idle session is kept (default: ``SESSION_TTL``)
+            max_sessions: Sessions kept before the least recently used are
+                dropped (default: ``SESSION_MAX``)
+            max_turns: Turns kept per session (default: ``SESSION_MAX_TURNS``)
+            max_context: Longest context kept, in tokens (default:
+                ``SESSION_MAX_CONTEXT``)
+        """
+        self.db_path = config.SESSION_DB_PATH if db_path is None else db_path
+        self.ttl = config.SESSION_TTL if ttl is None else ttl
+        self.max_sessions = config.SESSION_MAX if max_sessions is None else max_sessions
+        self.max_turns = config.SESSION_MAX_TURNS if max_turns is None else max_turns
+        self.max_context = config.SESSION_MAX_CONTEXT if max_context is None else max_context
+        self._conn = None
+        self._lock = threading.Lock()
+        self._saves = 0
+        self.hits = 0
+        self.misses = 0
+        self.context_dropped = 0
+        self.purged = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """The database, opened on first use rather than at import; call with ``_lock`` held."""
+        if self._conn is None:
+            if self.db_path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(
+                self.db_path or ":memory:", isolation_level=None, check_same_thread=False, timeout=30
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The live session, or None if unknown or expired.
+
+        Returns:
+            dict with ``emergency_type``, ``context`` (list of token ids or
+            None) and ``turns`` (list of ``[message, answer]``)
+        """
+        if not session_id:
+            return None
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT emergency_type, context, turns FROM chat_sessions WHERE id = ? AND updated_at > ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        emergency_type, context, turns = row
+        if context is not None:
+            tokens = array("i")
+            tokens.frombytes(context)
+            context = tokens.tolist()
+        return {"emergency_type": emergency_type, "context": context, "turns": json.loads(turns)}
+
+    def save(self, session_id: str, emergency_type: str, turns: List[List[str]],
+             context: Optional[List[int]] = None) -> None:
+        """Store the session after a turn, applying the turn and context caps."""
+        turns = turns[-self.max_turns:] if self.max_turns > 0 else []
+        if context is not None and len(context) > self.max_context:
+            # The next turn is rebuilt from the kept turns, which also shortens it
+            context = None
+            self.context_dropped += 1
+        blob = array("i", context).tobytes() if context is not None else None
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO chat_sessions (id, emergency_type, context, turns, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, emergency_type, blob, json.dumps(turns, ensure_ascii=False), time.time())
+            )
+            self._saves += 1
+            purge = self._saves % PURGE_EVERY == 0
+        if purge:
+            self.purge()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+
+    def purge(self) -> int:
+        """Drop expired sessions and the least recently used beyond ``max_sessions``."""
+        with self._lock:
+            conn = self._connection()
+            removed = conn.execute(
+                "DELETE FROM chat_sessions WHERE updated_at <= ?", (time.time() - self.ttl,)
+            ).rowcount
+            removed += conn.execute(
+                "DELETE FROM chat_sessions WHERE id NOT IN "
+                "(SELECT id FROM chat_sessions ORDER BY updated_at DESC LIMIT ?)",
+                (self.max_sessions,)
+            ).rowcount
+        self.purged += removed
+        return removed
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.count(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "context_dropped": self.context_dropped,
+            "purged": self.purged,
+            "ttl": self.ttl,
+            "max_sessions": self.max_sessions,
+        }
+
+
+# Create a default instance for easy importing
+chat_sessions = SessionStore()
+metrics.callback("chat_sessions", "Chat sessions stored", lambda: [((), chat_sessions.count())])
+metrics.callback("chat_session_context_dropped_total", "Session contexts dropped for exceeding the cap",
+                 lambda: [((), chat_sessions.context_dropped)], kind="counter")
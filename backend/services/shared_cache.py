@@ -0,0 +1,144 @@
+"""
+Cache tier shared by every worker process on the host, backed by SQLite.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from ..config import config
+
+# Expired rows are swept and the size bound enforced once every this many writes
+_PRUNE_EVERY = 256
+
+
+class SharedCache:
+    """JSON values keyed by JSON-serializable keys, in one SQLite file.
+
+    Worker processes each keep a fast in-memory :class:`~.cache_service.TTLCache`
+    and use this as the tier below it: a value one worker stores is found by
+    every other worker (and after a restart) instead of being recomputed.
+    WAL mode lets lookups run while another process writes. Expiry uses
+    wall-clock time, which all processes on the host agree on.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_size: int = None,
+                 name: str = "shared_cache"):
+        """Initialize the cache.
+
+        Args:
+            db_path: SQLite file (default: ``SHARED_CACHE_PATH``)
+            max_size: Entries kept before the soonest to expire are dropped
+                (default: ``SHARED_CACHE_SIZE``)
+            name: Name reported in :meth:`stats` and metrics
+        """
+        self.db_path = config.SHARED_CACHE_PATH if db_path is None else db_path
+        self.max_size = config.SHARED_CACHE_SIZE if max_size is None else max_size
+        self.name = name
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """The database, opened on first use rather than at import; call with ``_lock`` held."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(
+                self.db_path, isolation_level=None, check_same_thread=False, timeout=30
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, stale_until REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_stale_until ON entries (stale_until)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return json.dumps(key, ensure_ascii=False, separators=(',', ':'))
+
+    def get(self, key: Hashable) -> Tuple[Any, Optional[float]]:
+        """The value stored for ``key`` and its wall-clock expiry.
+
+        Returns:
+            (value, expires_at), or (None, None) if absent, past its
+            stale window, or unreadable. ``expires_at`` may be in the past
+            for an entry that is still in its stale window.
+        """
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT value, expires_at FROM entries WHERE key = ? AND stale_until > ?",
+                    (self._key(key), time.time())
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None, None
+            value = json.loads(row[0])
+        except (TypeError, ValueError, sqlite3.Error) as e:
+            self.errors += 1
+            print(f"[{self.name}] Lookup failed: {e}")
+            return None, None
+        self.hits += 1
+        return value, row[1]
+
+    def set(self, key: Hashable, value: Any, expires_at: float, stale_until: float = None) -> None:
+        """Store ``value`` until ``expires_at``, served stale until ``stale_until``."""
+        try:
+            params = (self._key(key), json.dumps(value, ensure_ascii=False),
+                      expires_at, max(expires_at, stale_until or expires_at))
+            with self._lock:
+                self._connection().execute(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at, stale_until) "
+                    "VALUES (?, ?, ?, ?)", params
+                )
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    self._prune()
+        except (TypeError, ValueError, sqlite3.Error) as e:
+            # Values that are not JSON (or a busy database) just stay process-local
+            self.errors += 1
+            print(f"[{self.name}] Store failed: {e}")
+
+    def delete(self, key: Hashable) -> None:
+        try:
+            with self._lock:
+                self._connection().execute("DELETE FROM entries WHERE key = ?", (self._key(key),))
+        except (TypeError, ValueError, sqlite3.Error) as e:
+            self.errors += 1
+            print(f"[{self.name}] Delete failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM entries")
+
+    def _prune(self) -> None:
+        self._conn.execute("DELETE FROM entries WHERE stale_until <= ?", (time.time(),))
+        excess = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_size
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY stale_until LIMIT ?)", (excess,)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
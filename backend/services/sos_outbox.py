@@ -0,0 +1,459 @@
+"""
+Durable SQLite outbox for SOS alerts and the background dispatcher that drains it.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sos_alerts (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT UNIQUE,
+    created_at REAL NOT NULL,
+    emergency_type TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    location_desc TEXT,
+    maps_link TEXT,
+    timestamp TEXT,
+    message_body TEXT NOT NULL,
+    device_id TEXT
+);
+CREATE TABLE IF NOT EXISTS sos_deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    alert_id TEXT NOT NULL REFERENCES sos_alerts(id),
+    contact TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    error TEXT,
+    response TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sos_deliveries_due ON sos_deliveries (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_sos_deliveries_alert ON sos_deliveries (alert_id);
+CREATE TABLE IF NOT EXISTS sms_rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    rate REAL NOT NULL,
+    capacity REAL NOT NULL
+);
+"""
+
+# Full token buckets are deleted (a missing bucket is a full one) once every this many grants
+_PRUNE_BUCKETS_EVERY = 256
+
+# Columns added after the first release; older databases are migrated on open
+_ADDED_COLUMNS = {
+    'sos_alerts': [('device_id', 'TEXT')],
+}
+
+
+class SOSOutbox:
+    """SQLite (WAL mode) store of queued SOS alerts and their per-contact deliveries.
+
+    Each delivery moves ``pending`` -> ``sending`` (leased to a dispatcher)
+    -> ``sent`` or ``failed``; a lease that expires, e.g. because the process
+    died mid-send, makes the delivery claimable again.
+    """
+
+    def __init__(self, db_path: str):
+        """Open (and create if needed) the outbox database.
+
+        Args:
+            db_path: Path of the SQLite database file
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(
+            db_path, isolation_level=None, check_same_thread=False, timeout=30
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sos_alerts_device ON sos_alerts (device_id, created_at)"
+        )
+        self._lock = threading.Lock()
+        self._grants = 0
+
+    def _migrate(self) -> None:
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for name, column_type in columns:
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+    @contextmanager
+    def _transaction(self):
+        """Run a write transaction under the connection lock."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, emergency_type: str, contacts: List[Dict[str, str]],
+                message_body: str, latitude=None, longitude=None,
+                location_desc: str = None, maps_link: str = None,
+                timestamp: str = None, idempotency_key: str = None,
+                device_id: str = None, debounce_window: float = 0) -> Tuple[str, str]:
+        """Store an alert and one pending delivery per contact in one transaction.
+
+        A repeated ``idempotency_key`` returns the existing alert untouched.
+        If ``device_id`` raised an alert of the same type within the last
+        ``debounce_window`` seconds, that alert's location and message are
+        updated instead (deliveries still queued go out with the new text)
+        and nothing new is queued.
+
+        Returns:
+            Tuple of (alert id, one of ``"queued"``, ``"duplicate"``, ``"debounced"``)
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if idempotency_key:
+                row = conn.execute(
+                    "SELECT id FROM sos_alerts WHERE idempotency_key = ?", (idempotency_key,)
+                ).fetchone()
+                if row:
+                    return row["id"], "duplicate"
+
+            if device_id and debounce_window > 0:
+                row = conn.execute(
+                    "SELECT id FROM sos_alerts WHERE device_id = ? AND emergency_type = ? "
+                    "AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+                    (device_id, emergency_type, now - debounce_window)
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE sos_alerts SET latitude = ?, longitude = ?, location_desc = ?, "
+                        "maps_link = ?, timestamp = ?, message_body = ? WHERE id = ?",
+                        (latitude, longitude, location_desc, maps_link, timestamp,
+                         message_body, row["id"])
+                    )
+                    return row["id"], "debounced"
+
+            alert_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO sos_alerts (id, idempotency_key, created_at, emergency_type, "
+                "latitude, longitude, location_desc, maps_link, timestamp, message_body, device_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (alert_id, idempotency_key, now, emergency_type, latitude, longitude,
+                 location_desc, maps_link, timestamp, message_body, device_id)
+            )
+            conn.executemany(
+                "INSERT INTO sos_deliveries (alert_id, contact, phone, next_attempt_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(alert_id, c['name'], c['phone'], now, now) for c in contacts]
+            )
+        return alert_id, "queued"
+
+    def claim_batch(self, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` due deliveries to the caller.
+
+        Returns:
+            List of dicts with the delivery id, contact, phone, attempts and
+            the alert's message body
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT d.id, d.contact, d.phone, d.attempts, a.message_body "
+                "FROM sos_deliveries d JOIN sos_alerts a ON a.id = d.alert_id "
+                "WHERE (d.status = 'pending' AND d.next_attempt_at <= ?) "
+                "   OR (d.status = 'sending' AND d.lease_until < ?) "
+                "ORDER BY d.next_attempt_at LIMIT ?",
+                (now, now, limit)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE sos_deliveries SET status = 'sending', lease_until = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    [(now + lease_seconds, now, row["id"]) for row in rows]
+                )
+        return [dict(row) for row in rows]
+
+    def record_results(self, outcomes: List[Tuple[int, str, int, Optional[str],
+                                                  Optional[dict], float]]) -> None:
+        """Persist send outcomes in one transaction.
+
+        Args:
+            outcomes: Tuples of (delivery id, new status, attempts, error,
+                provider response, next attempt time)
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE sos_deliveries SET status = ?, attempts = ?, error = ?, "
+                "response = ?, next_attempt_at = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                [
+                    (status, attempts, error,
+                     json.dumps(response) if response is not None else None,
+                     next_attempt_at, now, delivery_id)
+                    for delivery_id, status, attempts, error, response, next_attempt_at in outcomes
+                ]
+            )
+
+    def get_status(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of an alert and each of its deliveries, or None."""
+        with self._lock:
+            alert = self._conn.execute(
+                "SELECT * FROM sos_alerts WHERE id = ?", (alert_id,)
+            ).fetchone()
+            if alert is None:
+                return None
+            deliveries = self._conn.execute(
+                "SELECT contact, phone, status, attempts, error, response "
+                "FROM sos_deliveries WHERE alert_id = ? ORDER BY id", (alert_id,)
+            ).fetchall()
+
+        results = []
+        for row in deliveries:
+            result = {
+                'contact': row["contact"],
+                'phone': row["phone"],
+                'status': row["status"],
+                'attempts': row["attempts"],
+            }
+            if row["error"]:
+                result['error'] = row["error"]
+            if row["response"]:
+                result['response'] = json.loads(row["response"])
+            results.append(result)
+
+        statuses = {r['status'] for r in results}
+        if statuses & {'pending', 'sending'}:
+            status = 'sending' if any(r['attempts'] for r in results) else 'queued'
+        elif statuses == {'sent'}:
+            status = 'sent'
+        elif 'sent' in statuses:
+            status = 'partial'
+        else:
+            status = 'failed'
+
+        return {
+            'alert_id': alert["id"],
+            'status': status,
+            'type': alert["emergency_type"],
+            'created_at': alert["created_at"],
+            'location': {
+                'latitude': alert["latitude"],
+                'longitude': alert["longitude"],
+                'description': alert["location_desc"],
+                'maps_link': alert["maps_link"],
+            },
+            'timestamp': alert["timestamp"],
+            'results': results,
+        }
+
+    def take_tokens(self, buckets: List[Tuple[str, float, float]]) -> float:
+        """Take one token from every bucket, or from none, across all processes.
+
+        The token buckets of :class:`~.rate_limit.SmsRateLimiter` live here
+        when worker processes share the outbox, so the provider's limits
+        hold for the whole host rather than per process.
+
+        Args:
+            buckets: (key, tokens per second, capacity) of each bucket
+
+        Returns:
+            0 if the tokens were taken, else seconds until all are available
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            levels = []
+            wait = 0.0
+            for key, rate, capacity in buckets:
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM sms_rate_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = capacity if row is None else min(
+                    capacity, row["tokens"] + max(0.0, now - row["updated_at"]) * rate
+                )
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate if rate > 0 else float('inf'))
+                levels.append((key, tokens - 1, now, rate, capacity))
+            if wait > 0:
+                return wait
+            conn.executemany(
+                "INSERT OR REPLACE INTO sms_rate_buckets (key, tokens, updated_at, rate, capacity) "
+                "VALUES (?, ?, ?, ?, ?)", levels
+            )
+            self._grants += 1
+            if self._grants % _PRUNE_BUCKETS_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM sms_rate_buckets WHERE tokens + (? - updated_at) * rate >= capacity",
+                    (now,)
+                )
+        return 0.0
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sos_deliveries WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+
+
+class OutboxDispatcher:
+    """Background thread that drains :class:`SOSOutbox` in batches.
+
+    ``deliver(contact, message_body, deadline)`` performs one send (with its
+    own short in-call retries) and returns ``(result, retryable)``. Failed,
+    retryable deliveries are rescheduled with jittered exponential backoff
+    until ``max_attempts`` is reached. With a ``rate_limiter``, deliveries
+    that would exceed the provider's throughput are pushed back until a
+    token is available, without using up an attempt.
+
+    ``deliver`` must not start a send after its deadline, and each send must
+    return within ``send_timeout``. The lease has to outlast both, or a
+    delivery still in flight is claimed again and sent twice; a shorter
+    ``lease_seconds`` is raised to that bound.
+    """
+
+    def __init__(self, outbox: SOSOutbox, deliver: Callable, executor,
+                 batch_size: int = 50, lease_seconds: float = 60.0,
+                 send_deadline: float = 15.0, send_timeout: float = 10.0,
+                 max_attempts: int = 5,
+                 retry_base_delay: float = 2.0, retry_max_delay: float = 60.0,
+                 poll_interval: float = 1.0, rate_limiter=None):
+        self.outbox = outbox
+        self.deliver = deliver
+        self.executor = executor
+        self.batch_size = batch_size
+        # Slack for claiming the batch and recording the outcomes
+        min_lease = send_deadline + send_timeout + 5
+        if lease_seconds < min_lease:
+            logger.error(
+                "SOS outbox lease %gs is shorter than the send deadline plus the SMS "
+                "timeout (%gs + %gs); using %gs",
+                lease_seconds, send_deadline, send_timeout, min_lease
+            )
+            lease_seconds = min_lease
+        self.lease_seconds = lease_seconds
+        self.send_deadline = send_deadline
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.poll_interval = poll_interval
+        self.rate_limiter = rate_limiter
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sos-outbox-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self) -> None:
+        """Wake the dispatcher right away instead of at the next poll."""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                drained = self.dispatch_once()
+            except Exception as exc:
+                logger.error("SOS outbox dispatch failed: %s", exc)
+                drained = 0
+            if drained < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def dispatch_once(self) -> int:
+        """Claim one batch, send it concurrently and record the outcomes.
+
+        Returns:
+            Number of deliveries processed
+        """
+        batch = self.outbox.claim_batch(self.batch_size, self.lease_seconds)
+        if not batch:
+            return 0
+
+        outcomes = []
+        if self.rate_limiter is not None:
+            ready = []
+            for row in batch:
+                delay = self.rate_limiter.acquire(row['phone'])
+                if delay:
+                    outcomes.append((row['id'], 'pending', row['attempts'], None, None,
+                                     time.time() + delay))
+                else:
+                    ready.append(row)
+            batch = ready
+
+        deadline = time.monotonic() + self.send_deadline
+        futures = [
+            self.executor.submit(
+                self.deliver,
+                {'name': row['contact'], 'phone': row['phone']},
+                row['message_body'],
+                deadline
+            )
+            for row in batch
+        ]
+
+        # A send still running at the deadline keeps its lease and is recorded when it returns
+        wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        late = 0
+        for row, future in zip(batch, futures):
+            if future.done():
+                outcomes.append(self._outcome(row, future))
+            else:
+                late += 1
+                future.add_done_callback(lambda f, row=row: self._record_late(row, f))
+
+        self.outbox.record_results(outcomes)
+        return len(outcomes) + late
+
+    def _outcome(self, row: Dict[str, Any], future) -> Tuple:
+        attempts = row['attempts'] + 1
+        try:
+            result, retryable = future.result()
+        except Exception as exc:
+            result, retryable = {'status': 'failed', 'error': str(exc)}, True
+
+        if result.get('status') == 'sent':
+            return (row['id'], 'sent', attempts, None, result.get('response'), 0)
+        if retryable and attempts < self.max_attempts:
+            delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** (attempts - 1)))
+            next_attempt = time.time() + random.uniform(delay / 2, delay)
+            return (row['id'], 'pending', attempts, result.get('error'),
+                    result.get('response'), next_attempt)
+        return (row['id'], 'failed', attempts, result.get('error'), result.get('response'), 0)
+
+    def _record_late(self, row: Dict[str, Any], future) -> None:
+        try:
+            self.outbox.record_results([self._outcome(row, future)])
+        except Exception as exc:
+            # The lease expires and the delivery is retried
+            logger.error("Recording late SOS delivery %s failed: %s", row['id'], exc)
@@ -1,22 +1,90 @@
 import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-
-from vonage import Auth, HttpClientOptions, Vonage
-from vonage_sms import SmsMessage
+from urllib.parse import urlparse
 
 from ..config import config
+from .fake_sms import FakeSmsClient
+from .metrics_service import metrics
+from .rate_limit import SmsRateLimiter
+from .resource_service import resource_service
+from .sos_outbox import OutboxDispatcher, SOSOutbox
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Vonage SMS statuses worth retrying: 1 = Throttled, 5 = Internal Error
+TRANSIENT_SMS_STATUSES = {'1', '5'}
+
+# One observation per send attempt: sent, rejected (permanent), throttled (retryable) or error
+_sms_seconds = metrics.histogram(
+    "sms_send_seconds", "SMS gateway round trip per contact attempt", ("outcome",)
+)
+SMS_SENT = _sms_seconds.labels("sent")
+SMS_REJECTED = _sms_seconds.labels("rejected")
+SMS_THROTTLED = _sms_seconds.labels("throttled")
+SMS_ERROR = _sms_seconds.labels("error")
+
+# Sender ID the fake SMS client uses when no Vonage number is configured
+FAKE_SMS_SENDER = 'AidGen'
+
 class SOSService:
-    def __init__(self):
-        """Initialize the SOS service for outbound SMS."""
+    def __init__(self, sms_client=None, outbox=None):
+        """Initialize the SOS service for outbound SMS.
+
+        Args:
+            sms_client: Optional object with a Vonage-style ``send(SmsMessage)``
+                method, used instead of building a Vonage client. The Vonage
+                SDK is only imported when the first SMS is sent.
+            outbox: Optional SOSOutbox; by default one is opened at
+                ``SOS_OUTBOX_PATH`` when ``SOS_USE_OUTBOX`` is enabled
+        """
         self.default_contacts = self._parse_emergency_contacts(
             config.SOS_EMERGENCY_CONTACTS
         )
         self._vonage_client = None
-        self._sms_client = None
+        self._sms_client = sms_client
+        self._vonage_configured = False
+        self._client_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.SOS_MAX_WORKERS, thread_name_prefix='sos-sms'
+        )
+        self.debounced = 0
+        self.outbox = outbox
+        if self.outbox is None and config.SOS_USE_OUTBOX:
+            self.outbox = SOSOutbox(config.SOS_OUTBOX_PATH)
+        # Buckets in the outbox are shared by every worker process on the host
+        self.rate_limiter = SmsRateLimiter(
+            global_rate=config.SOS_RATE_GLOBAL,
+            global_burst=config.SOS_RATE_GLOBAL_BURST,
+            destination_rate=config.SOS_RATE_PER_DESTINATION,
+            destination_burst=config.SOS_RATE_PER_DESTINATION_BURST,
+            store=self.outbox
+        )
+        self.dispatcher = None
+        if self.outbox is not None:
+            self.dispatcher = OutboxDispatcher(
+                self.outbox,
+                self.deliver,
+                self._executor,
+                batch_size=config.SOS_OUTBOX_BATCH_SIZE,
+                lease_seconds=config.SOS_OUTBOX_LEASE,
+                send_deadline=config.SOS_CONTACT_DEADLINE,
+                send_timeout=config.SOS_SMS_TIMEOUT,
+                max_attempts=config.SOS_OUTBOX_MAX_ATTEMPTS,
+                rate_limiter=self.rate_limiter
+            )
+        if self._sms_client is None and config.SOS_FAKE_SMS:
+            self._sms_client = FakeSmsClient(latency=config.SOS_FAKE_SMS_LATENCY)
+            logger.warning("SOS service is using the fake SMS client; no real SMS will be sent")
+        if self._sms_client is not None:
+            logger.info("SOS service initialized with %s", type(self._sms_client).__name__)
+            return
+
         missing_vars = [
             var for var in [
                 'VONAGE_API_KEY',
@@ -29,16 +97,40 @@ class SOSService:
         if missing_vars:
             logger.warning("Missing Vonage configuration: %s", ", ".join(missing_vars))
         else:
-            try:
-                auth = Auth(api_key=config.VONAGE_API_KEY, api_secret=config.VONAGE_API_SECRET)
-                http_options = HttpClientOptions(api_server=config.VONAGE_API_URL)
-                self._vonage_client = Vonage(auth=auth, http_client_options=http_options)
-                self._sms_client = self._vonage_client.sms
-            except Exception as exc:
-                logger.error("Failed to initialize Vonage client: %s", exc)
+            self._vonage_configured = True
 
         logger.info("SOS service initialized for Vonage SMS")
 
+    def sms_available(self):
+        """Whether an SMS client is set or can be built, without building it."""
+        return self._sms_client is not None or self._vonage_configured
+
+    def _get_sms_client(self):
+        """The SMS client, building the Vonage client on first use.
+
+        The Vonage SDK is the slowest import in the app, so it is deferred
+        until an SMS is actually sent.
+        """
+        if self._sms_client is None and self._vonage_configured:
+            with self._client_lock:
+                if self._sms_client is None and self._vonage_configured:
+                    try:
+                        from vonage import Auth, HttpClientOptions, Vonage
+
+                        auth = Auth(api_key=config.VONAGE_API_KEY, api_secret=config.VONAGE_API_SECRET)
+                        # The SDK builds https://<rest_host>/sms/json itself; it has no api_server option
+                        rest_host = urlparse(config.VONAGE_API_URL).netloc or 'rest.nexmo.com'
+                        # The SDK waits forever by default. A call may not outlast a contact's
+                        # deadline, nor the outbox lease. Its own retries are off: deliver() retries.
+                        timeout = max(1, min(config.SOS_SMS_TIMEOUT, math.ceil(config.SOS_CONTACT_DEADLINE)))
+                        http_options = HttpClientOptions(rest_host=rest_host, timeout=timeout, max_retries=0)
+                        self._vonage_client = Vonage(auth=auth, http_client_options=http_options)
+                        self._sms_client = self._vonage_client.sms
+                    except Exception as exc:
+                        self._vonage_configured = False
+                        logger.error("Failed to initialize Vonage client: %s", exc)
+        return self._sms_client
+
     @staticmethod
     def _parse_emergency_contacts(value: str):
         """Parse SOS_EMERGENCY_CONTACTS env var into a list of contact dicts."""
@@ -57,6 +149,150 @@ class SOSService:
             contacts.append({'name': name, 'phone': phone})
         return contacts
 
+    @staticmethod
+    def build_message(emergency_type, latitude=None, longitude=None, location_desc=None,
+                      nearest_shelter=None):
+        """Build the SOS SMS text.
+
+        Returns:
+            Tuple of (message body, Google Maps link or None, timestamp string)
+        """
+        timestamp = datetime.now().strftime("%Y-%m-%d %I:%M:%S %p")
+        lines = [f"🚨 EMERGENCY ALERT - {emergency_type.upper()} 🚨", '',
+                 "I need immediate help! I'm experiencing an emergency.", '']
+        maps_link = None
+
+        if latitude is not None and longitude is not None:
+            lines.append('📍 My Location:')
+            lines.append(f"Latitude: {latitude:.6f}")
+            lines.append(f"Longitude: {longitude:.6f}")
+            maps_link = (
+                f"https://www.google.com/maps/dir/?api=1&destination="
+                f"{latitude},{longitude}"
+            )
+            lines.extend(['', '🗺️ Get Directions:', maps_link])
+            if nearest_shelter:
+                lines.extend(['', f"🏠 Nearest shelter: {nearest_shelter}"])
+        elif location_desc:
+            lines.append('📍 My Location:')
+            lines.append(location_desc)
+        else:
+            lines.append('📍 My Location: [LOCATION UNAVAILABLE]')
+
+        lines.extend(['', f"⏰ Time: {timestamp}", '', 'Please send help immediately!'])
+        message_body = ' '.join(line.strip() for line in lines if line.strip())
+        return message_body, maps_link, timestamp
+
+    def enqueue_emergency_sms(
+        self,
+        emergency_type,
+        latitude=None,
+        longitude=None,
+        location_desc=None,
+        emergency_contacts=None,
+        idempotency_key=None,
+        device_id=None
+    ):
+        """
+        Queue an emergency SMS in the durable outbox and return immediately
+
+        The background dispatcher delivers it; poll :meth:`get_alert_status`
+        for progress. A repeated ``idempotency_key`` returns the alert that
+        was already queued instead of creating a new one, and a repeat SOS
+        from the same ``device_id`` within ``SOS_DEBOUNCE_WINDOW`` only
+        updates that alert's location.
+
+        Returns:
+            dict with the alert id and queue status
+        """
+        if self.outbox is None:
+            return self.send_emergency_sms(
+                emergency_type, latitude, longitude, location_desc, emergency_contacts
+            )
+
+        contacts = emergency_contacts or self.default_contacts
+        if not contacts:
+            error_msg = 'No emergency contacts configured for SOS alerts.'
+            logger.error(error_msg)
+            return {'success': False, 'error': error_msg}
+
+        if not self.sms_available():
+            error_msg = 'Vonage client is not configured. Check API credentials.'
+            logger.error(error_msg)
+            return {'success': False, 'error': error_msg}
+
+        message_body, maps_link, timestamp = self.build_message(
+            emergency_type, latitude, longitude, location_desc,
+            resource_service.nearest_shelter(latitude, longitude)
+        )
+        alert_id, state = self.outbox.enqueue(
+            emergency_type,
+            contacts,
+            message_body,
+            latitude=latitude,
+            longitude=longitude,
+            location_desc=location_desc,
+            maps_link=maps_link,
+            timestamp=timestamp,
+            idempotency_key=idempotency_key,
+            device_id=device_id,
+            debounce_window=config.SOS_DEBOUNCE_WINDOW
+        )
+        if state == 'debounced':
+            self.debounced += 1
+        if self.dispatcher:
+            self.start_dispatcher()
+            self.dispatcher.notify()
+
+        messages = {
+            'queued': 'Emergency alert queued',
+            'duplicate': 'Emergency alert already queued',
+            'debounced': 'Emergency alert already sent; location updated',
+        }
+        return {
+            'success': True,
+            'alert_id': alert_id,
+            'status': 'queued',
+            'duplicate': state == 'duplicate',
+            'debounced': state == 'debounced',
+            'message': messages[state],
+            'location': {
+                'latitude': latitude,
+                'longitude': longitude,
+                'maps_link': maps_link
+            },
+            'timestamp': timestamp
+        }
+
+    def get_alert_status(self, alert_id):
+        """Delivery status of a queued alert, or None if unknown."""
+        if self.outbox is None:
+            return None
+        return self.outbox.get_status(alert_id)
+
+    def stats(self):
+        """Counters for diagnostics."""
+        return {
+            'debounced': self.debounced,
+            'rate_limiter': self.rate_limiter.stats(),
+            'outbox_pending': self.outbox.pending_count() if self.outbox else 0,
+        }
+
+    def start_dispatcher(self):
+        """Start draining the outbox in the background (idempotent)."""
+        if self.dispatcher:
+            self.dispatcher.start()
+
+    def shutdown(self, timeout=None):
+        """Stop claiming outbox work and let in-flight deliveries finish.
+
+        Deliveries still running after ``timeout`` seconds are abandoned;
+        their outbox leases expire and another worker process sends them.
+        """
+        if self.dispatcher:
+            self.dispatcher.stop(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
     def send_emergency_sms(
         self,
         emergency_type,
@@ -75,7 +311,9 @@ class SOSService:
             emergency_contacts: List of dicts with 'name' and 'phone' keys
 
         Returns:
-            dict with status and message details
+            dict with status and message details. A contact whose send was
+            still in flight at the deadline has status ``unknown``: the
+            provider may yet deliver it.
         """
         contacts = emergency_contacts or self.default_contacts
         if not contacts:
@@ -83,116 +321,219 @@ class SOSService:
             logger.error(error_msg)
             return {'success': False, 'error': error_msg}
 
-        if not self._sms_client:
+        if not self.sms_available():
             error_msg = 'Vonage client is not configured. Check API credentials.'
             logger.error(error_msg)
             return {'success': False, 'error': error_msg}
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %I:%M:%S %p")
-        lines = [f"🚨 EMERGENCY ALERT - {emergency_type.upper()} 🚨", '',
-                 "I need immediate help! I'm experiencing an emergency.", '']
-        maps_link = None
+        message_body, maps_link, timestamp = self.build_message(
+            emergency_type, latitude, longitude, location_desc,
+            resource_service.nearest_shelter(latitude, longitude)
+        )
 
-        if latitude is not None and longitude is not None:
-            lines.append('📍 My Location:')
-            lines.append(f"Latitude: {latitude:.6f}")
-            lines.append(f"Longitude: {longitude:.6f}")
-            maps_link = (
-                f"https://www.google.com/maps/dir/?api=1&destination="
-                f"{latitude},{longitude}"
+        # Send SMS to all emergency contacts in parallel; each gets its own deadline
+        deadline = time.monotonic() + config.SOS_CONTACT_DEADLINE
+        futures = [
+            self._executor.submit(self._send_to_contact, contact, message_body, deadline)
+            for contact in contacts
+        ]
+        wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+        results = []
+        for contact, future in zip(contacts, futures):
+            if future.done():
+                results.append(future.result())
+                continue
+            if future.cancel():
+                # Still queued behind other sends, so nothing went out
+                status, error = 'failed', 'Deadline exceeded before sending'
+            else:
+                # The request is with the provider and may still be delivered
+                status, error = 'unknown', 'Deadline exceeded; delivery not confirmed'
+            logger.error(
+                "SMS send to %s (%s) missed its %.1fs deadline (%s)",
+                contact['name'],
+                contact['phone'],
+                config.SOS_CONTACT_DEADLINE,
+                status
             )
-            lines.extend(['', '🗺️ Get Directions:', maps_link])
-        elif location_desc:
-            lines.append('📍 My Location:')
-            lines.append(location_desc)
+            results.append({
+                'contact': contact['name'],
+                'phone': contact['phone'],
+                'status': status,
+                'error': error
+            })
+
+        # Check if all messages sent successfully
+        all_sent = all(r['status'] == 'sent' for r in results)
+        if all_sent:
+            summary = 'All emergency alerts sent'
+        elif any(r['status'] == 'failed' for r in results):
+            summary = 'Some alerts failed'
         else:
-            lines.append('📍 My Location: [LOCATION UNAVAILABLE]')
+            summary = 'Some alerts not yet confirmed'
 
-        lines.extend(['', f"⏰ Time: {timestamp}", '', 'Please send help immediately!'])
-        message_body = ' '.join(line.strip() for line in lines if line.strip())
+        return {
+            'success': all_sent,
+            'message': summary,
+            'results': results,
+            'location': {
+                'latitude': latitude,
+                'longitude': longitude,
+                'maps_link': maps_link
+            },
+            'timestamp': timestamp
+        }
 
-        results = []
+    @staticmethod
+    def _backoff_delay(attempt):
+        """Exponential backoff before retry ``attempt``, jittered over the upper half."""
+        cap = min(config.SOS_RETRY_MAX_DELAY, config.SOS_RETRY_BASE_DELAY * (2 ** attempt))
+        return random.uniform(cap / 2, cap)
 
-        # Send SMS to each emergency contact
-        for contact in contacts:
-            try:
-                sms_message = SmsMessage(
-                    from_=config.VONAGE_FROM_NUMBER,
-                    to=contact['phone'].lstrip('+'),
-                    text=message_body
-                )
-            except Exception as exc:
-                logger.error(
-                    "Invalid SMS payload for %s (%s): %s",
-                    contact['name'],
-                    contact['phone'],
-                    exc
-                )
-                results.append({
-                    'contact': contact['name'],
-                    'phone': contact['phone'],
-                    'status': 'failed',
-                    'error': f'Invalid payload: {exc}'
-                })
-                continue
+    def _send_to_contact(self, contact, message_body, deadline):
+        """Send one SMS, retrying transient failures until ``deadline``.
+
+        Waits (queues) for the rate limiter before sending.
+
+        Returns:
+            Per-contact result dict (``contact``, ``phone``, ``status``, ...)
+        """
+        if not self.rate_limiter.wait(contact['phone'], deadline):
+            logger.error(
+                "SMS to %s (%s) rate-limited past its deadline",
+                contact['name'],
+                contact['phone']
+            )
+            return {
+                'contact': contact['name'],
+                'phone': contact['phone'],
+                'status': 'failed',
+                'error': 'Rate limited'
+            }
+        return self.deliver(contact, message_body, deadline)[0]
+
+    def deliver(self, contact, message_body, deadline):
+        """Send one SMS, retrying transient failures until ``deadline``.
+
+        The caller takes a rate-limiter token for the first attempt; each
+        retry takes its own. No attempt starts after ``deadline``, so with
+        the client's HTTP timeout a call returns by ``deadline + SOS_SMS_TIMEOUT``.
+
+        Returns:
+            Tuple of (per-contact result dict, whether a later retry may succeed)
+        """
+        sms_client = self._get_sms_client()
+        if sms_client is None:
+            return {
+                'contact': contact['name'],
+                'phone': contact['phone'],
+                'status': 'failed',
+                'error': 'Vonage client is not configured. Check API credentials.'
+            }, False
+
+        try:
+            from vonage_sms import SmsMessage
+
+            sender = config.VONAGE_FROM_NUMBER
+            if not sender and isinstance(sms_client, FakeSmsClient):
+                # Offline runs need no Vonage account, but SmsMessage still requires a sender
+                sender = FAKE_SMS_SENDER
+            sms_message = SmsMessage(
+                from_=sender,
+                to=contact['phone'].lstrip('+'),
+                text=message_body
+            )
+        except Exception as exc:
+            logger.error(
+                "Invalid SMS payload for %s (%s): %s",
+                contact['name'],
+                contact['phone'],
+                exc
+            )
+            return {
+                'contact': contact['name'],
+                'phone': contact['phone'],
+                'status': 'failed',
+                'error': f'Invalid payload: {exc}'
+            }, False
+
+        if time.monotonic() >= deadline:
+            # Queued behind other sends for too long; nothing went out, so retrying is safe
+            return {
+                'contact': contact['name'],
+                'phone': contact['phone'],
+                'status': 'failed',
+                'error': 'Deadline exceeded before sending'
+            }, True
+
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
             try:
-                response = self._sms_client.send(sms_message)
+                response = sms_client.send(sms_message)
                 messages = response.messages if hasattr(response, 'messages') else []
                 if not messages:
                     raise ValueError('Vonage SMS response missing messages payload')
 
                 message = messages[0]
-                if message.status != '0':
-                    error_text = getattr(message, 'error_text', 'Unknown Vonage error')
-                    logger.error(
-                        "Vonage API error for %s (%s): %s",
-                        contact['name'],
-                        contact['phone'],
-                        error_text
-                    )
-                    results.append({
+                if message.status == '0':
+                    SMS_SENT.observe(time.monotonic() - started)
+                    return {
                         'contact': contact['name'],
                         'phone': contact['phone'],
-                        'status': 'failed',
-                        'error': error_text,
+                        'status': 'sent',
+                        'attempts': attempt,
                         'response': response.model_dump()
-                    })
-                    continue
+                    }, False
 
-                results.append({
+                error_text = getattr(message, 'error_text', None) or 'Unknown Vonage error'
+                logger.error(
+                    "Vonage API error for %s (%s), attempt %d: %s",
+                    contact['name'],
+                    contact['phone'],
+                    attempt,
+                    error_text
+                )
+                result = {
                     'contact': contact['name'],
                     'phone': contact['phone'],
-                    'status': 'sent',
+                    'status': 'failed',
+                    'attempts': attempt,
+                    'error': error_text,
                     'response': response.model_dump()
-                })
+                }
+                transient = message.status in TRANSIENT_SMS_STATUSES
+                (SMS_THROTTLED if transient else SMS_REJECTED).observe(time.monotonic() - started)
             except Exception as exc:
+                SMS_ERROR.observe(time.monotonic() - started)
                 logger.error(
-                    "Vonage SMS send failed for %s (%s): %s",
+                    "Vonage SMS send failed for %s (%s), attempt %d: %s",
                     contact['name'],
                     contact['phone'],
+                    attempt,
                     exc
                 )
-                results.append({
+                result = {
                     'contact': contact['name'],
                     'phone': contact['phone'],
                     'status': 'failed',
+                    'attempts': attempt,
                     'error': str(exc)
-                })
-
-        # Check if all messages sent successfully
-        all_sent = all(r['status'] == 'sent' for r in results)
+                }
+                # Network and gateway errors are worth another try
+                transient = True
 
-        return {
-            'success': all_sent,
-            'message': 'All emergency alerts sent' if all_sent else 'Some alerts failed',
-            'results': results,
-            'location': {
-                'latitude': latitude,
-                'longitude': longitude,
-                'maps_link': maps_link
-            },
-            'timestamp': timestamp
-        }
+            if not transient or attempt > config.SOS_MAX_RETRIES:
+                return result, transient
+            delay = self._backoff_delay(attempt - 1)
+            if time.monotonic() + delay >= deadline:
+                return result, transient
+            time.sleep(delay)
+            # A retry is another message as far as the provider's limits go
+            if not self.rate_limiter.wait(contact['phone'], deadline):
+                return result, transient
 
     def send_whatsapp_emergency(self, *args, **kwargs):
         raise NotImplementedError("WhatsApp alerts no longer supported")
\ No newline at end of file
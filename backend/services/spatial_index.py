@@ -0,0 +1,163 @@
+"""
+Array-backed k-d tree for nearest-neighbour queries on latitude/longitude points.
+"""
+import heapq
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Points per leaf: leaves are scanned with one vectorized distance computation
+LEAF_SIZE = 64
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """Points on the unit sphere (x, y, z) for degrees of latitude and longitude."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(squared_chord) -> np.ndarray:
+    """Great-circle distance for squared straight-line distances between unit vectors."""
+    chord = np.sqrt(np.asarray(squared_chord, dtype=np.float64))
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2.0, 1.0))
+
+
+class GeoIndex:
+    """Immutable k-d tree over points on the Earth's surface.
+
+    Points are stored as unit vectors, where straight-line distance ranks
+    points the same way as great-circle distance, so there are no special
+    cases at the poles or the antimeridian. The tree lives in flat NumPy
+    arrays: the points are reordered so each leaf is a contiguous slice,
+    and each node stores its slice bounds, split axis and split value.
+    """
+
+    def __init__(self, latitudes: Sequence[float], longitudes: Sequence[float],
+                 leaf_size: int = LEAF_SIZE):
+        """Build the tree.
+
+        Args:
+            latitudes: Latitude of each point, in degrees
+            longitudes: Longitude of each point, in degrees
+            leaf_size: Maximum points per leaf
+        """
+        points = to_unit_vectors(latitudes, longitudes).reshape(-1, 3)
+        # One row per axis, reordered in place as nodes split, so every node's
+        # points are a contiguous slice and nothing is gathered at random
+        axis_rows = np.ascontiguousarray(points.T)
+        order = np.arange(len(points))
+        starts, ends, axes, splits, lefts, rights = [], [], [], [], [], []
+
+        def add_node(start, end):
+            starts.append(start)
+            ends.append(end)
+            axes.append(-1)
+            splits.append(0.0)
+            lefts.append(-1)
+            rights.append(-1)
+            return len(starts) - 1
+
+        stack = [add_node(0, len(points))] if len(points) else []
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            if end - start <= leaf_size:
+                continue
+            block = axis_rows[:, start:end]
+            axis = int(np.argmax(block.max(axis=1) - block.min(axis=1)))
+            middle = (end - start) // 2
+            partition = np.argpartition(block[axis], middle)
+            axis_rows[:, start:end] = block[:, partition]
+            order[start:end] = order[start:end][partition]
+            axes[node] = axis
+            splits[node] = float(axis_rows[axis, start + middle])
+            lefts[node] = add_node(start, start + middle)
+            rights[node] = add_node(start + middle, end)
+            stack.extend((lefts[node], rights[node]))
+
+        self.points = np.ascontiguousarray(axis_rows.T)
+        # Position of each stored point in the caller's sequence
+        self.ids = order
+        self._starts = starts
+        self._ends = ends
+        self._axes = axes
+        self._splits = splits
+        self._lefts = lefts
+        self._rights = rights
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The tree as flat arrays, for :meth:`from_arrays` (e.g. after a save)."""
+        return {
+            'points': self.points,
+            'ids': self.ids,
+            'nodes': np.array([self._starts, self._ends, self._axes, self._lefts, self._rights],
+                              dtype=np.int64).reshape(5, -1),
+            'splits': np.array(self._splits, dtype=np.float64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'GeoIndex':
+        """Rebuild a tree from :meth:`arrays` without re-partitioning the points.
+
+        ``points`` and ``ids`` are used as given, so memory-mapped arrays stay
+        shared with other processes.
+        """
+        index = cls.__new__(cls)
+        index.points = arrays['points']
+        index.ids = arrays['ids']
+        # Node fields are read one at a time while querying, which is faster from lists
+        (index._starts, index._ends, index._axes, index._lefts,
+         index._rights) = (row.tolist() for row in np.asarray(arrays['nodes']))
+        index._splits = np.asarray(arrays['splits']).tolist()
+        return index
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1) -> List[Tuple[int, float]]:
+        """The ``k`` points closest to a location, nearest first.
+
+        Returns:
+            List of (position in the input sequences, distance in km)
+        """
+        if k <= 0 or not len(self.ids):
+            return []
+        query = to_unit_vectors(latitude, longitude)
+        # Best-first: nodes ordered by a lower bound on their squared distance
+        pending = [(0.0, 0)]
+        best_d = np.empty(0)
+        best_i = np.empty(0, dtype=np.intp)
+        bound = math.inf
+        while pending:
+            floor, node = heapq.heappop(pending)
+            if floor > bound:
+                break
+            axis = self._axes[node]
+            if axis < 0:
+                start, end = self._starts[node], self._ends[node]
+                diff = self.points[start:end] - query
+                distances = np.einsum('ij,ij->i', diff, diff)
+                best_d = np.concatenate((best_d, distances))
+                best_i = np.concatenate((best_i, np.arange(start, end)))
+                if len(best_d) > k:
+                    keep = np.argpartition(best_d, k - 1)[:k]
+                    best_d, best_i = best_d[keep], best_i[keep]
+                if len(best_d) == k:
+                    bound = float(best_d.max())
+                continue
+            offset = float(query[axis]) - self._splits[node]
+            near, far = (self._lefts[node], self._rights[node]) if offset < 0 else \
+                (self._rights[node], self._lefts[node])
+            heapq.heappush(pending, (floor, near))
+            far_floor = max(floor, offset * offset)
+            if far_floor <= bound:
+                heapq.heappush(pending, (far_floor, far))
+
+        ranked = np.argsort(best_d, kind='stable')
+        kilometres = chord_to_km(best_d[ranked])
+        return [(int(self.ids[i]), float(km)) for i, km in zip(best_i[ranked], kilometres)]
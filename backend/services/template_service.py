@@ -3,69 +3,224 @@ Template service for managing message templates.
 """
 import os
 import json
-from pathlib import Path
+import re
+import threading
+import time
 from typing import Dict, Optional, Any
 
+from .file_utils import directory_signature, load_json_file
+
+# "[LOCATION]" (fallback templates) and "{nearest_shelter}" (Modelfile SMS) styles
+_PLACEHOLDER = re.compile(r'\[([A-Z][A-Z_]*)\]|\{([a-z][a-z_]*)\}')
+
+
+class _CompiledString:
+    """A template string pre-split into literal text and placeholder slots."""
+
+    __slots__ = ('parts',)
+
+    def __init__(self, text: str):
+        parts = []
+        last = 0
+        for match in _PLACEHOLDER.finditer(text):
+            if match.start() > last:
+                parts.append(text[last:match.start()])
+            name = (match.group(1) or match.group(2)).lower()
+            # Keep the original token so unfilled placeholders render unchanged
+            parts.append((name, match.group(0)))
+            last = match.end()
+        if last < len(text):
+            parts.append(text[last:])
+        self.parts = tuple(parts)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                value = values.get(part[0])
+                out.append(part[1] if value is None else str(value))
+        return ''.join(out)
+
+
+def _compile(node: Any) -> Any:
+    if isinstance(node, dict):
+        return {key: _compile(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_compile(value) for value in node]
+    if isinstance(node, str) and _PLACEHOLDER.search(node):
+        return _CompiledString(node)
+    return node
+
+
+def _render(node: Any, values: Dict[str, Any]) -> Any:
+    # Containers are rebuilt on every render so callers never share state
+    if isinstance(node, dict):
+        return {key: _render(value, values) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_render(value, values) for value in node]
+    if isinstance(node, _CompiledString):
+        return node.render(values)
+    return node
+
+
 class TemplateService:
-    """Service for managing message templates."""
-    
-    def __init__(self, templates_dir: str = None):
+    """Service for managing message templates.
+
+    All templates are parsed and compiled once and kept in memory; the
+    directory is re-checked at most every ``reload_interval`` seconds and
+    recompiled only when a template file changed. Every lookup returns a
+    fresh copy, so callers may modify the result freely.
+    """
+
+    def __init__(self, templates_dir: str = None, reload_interval: float = 2.0):
         """Initialize the template service.
-        
+
         Args:
             templates_dir: Directory containing template files
+            reload_interval: Minimum seconds between file modification checks
         """
         if templates_dir is None:
             templates_dir = os.path.join(
                 os.path.dirname(__file__), '..', 'templates'
             )
         self.templates_dir = templates_dir
+        self.reload_interval = reload_interval
+        self._compiled: Optional[Dict[str, Any]] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
         self._ensure_templates_dir()
-    
+
     def _ensure_templates_dir(self):
         """Ensure the templates directory exists."""
         os.makedirs(self.templates_dir, exist_ok=True)
-    
+
+    def _load_all(self, signature) -> Dict[str, Any]:
+        compiled = {}
+        for filename, _, _ in signature:
+            name = filename[:-len('.json')]
+            try:
+                compiled[name] = _compile(
+                    load_json_file(os.path.join(self.templates_dir, filename))
+                )
+            except (ValueError, IOError) as e:
+                print(f"Error loading template {name}: {e}")
+        return compiled
+
+    def _templates(self) -> Dict[str, Any]:
+        """Return the compiled templates, recompiling if the files changed."""
+        now = time.monotonic()
+        if self._compiled is not None and now - self._checked_at < self.reload_interval:
+            return self._compiled
+
+        if self._compiled is None:
+            self._lock.acquire()
+        elif not self._lock.acquire(blocking=False):
+            return self._compiled
+        try:
+            if self._compiled is not None and now - self._checked_at < self.reload_interval:
+                return self._compiled
+            signature = directory_signature(self.templates_dir)
+            if self._compiled is None or signature != self._signature:
+                self._compiled = self._load_all(signature)
+                self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._compiled
+        finally:
+            self._lock.release()
+
+    def reload(self) -> None:
+        """Force the next lookup to re-scan the templates directory."""
+        with self._lock:
+            self._signature = None
+            self._checked_at = 0.0
+
+    def list_templates(self):
+        """Names of all available templates."""
+        return sorted(self._templates())
+
     def load_template(self, template_name: str) -> Optional[Dict[str, Any]]:
         """Load a template by name.
-        
+
         Args:
             template_name: Name of the template to load
-            
+
         Returns:
-            Template data as a dictionary, or None if not found
+            A fresh copy of the template data, or None if not found
         """
-        template_path = os.path.join(
-            self.templates_dir, f"{template_name}.json"
-        )
-        
-        if not os.path.exists(template_path):
-            return None
-            
-        try:
-            with open(template_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Error loading template {template_name}: {e}")
+        return self.render_template(template_name)
+
+    def render_template(self, template_name: str, **values: Any) -> Optional[Dict[str, Any]]:
+        """Render a template with placeholder values.
+
+        Both ``[LOCATION]`` and ``{location}`` style placeholders are filled
+        from ``values`` (keys are lowercase, e.g. ``location`` or
+        ``nearest_shelter``); placeholders without a value are left as-is.
+
+        Args:
+            template_name: Name of the template to render
+            **values: Placeholder values
+
+        Returns:
+            Rendered copy of the template, or None if not found
+        """
+        compiled = self._templates().get(template_name)
+        if compiled is None:
             return None
-    
+        return _render(compiled, values)
+
+    @staticmethod
+    def fill(data: Dict[str, Any], **values: Any) -> Dict[str, Any]:
+        """Fill placeholders in already-loaded template data (e.g. a translated copy).
+
+        Args:
+            data: Template data as a dictionary
+            **values: Placeholder values, see :meth:`render_template`
+
+        Returns:
+            Rendered copy of ``data``
+        """
+        return _render(_compile(data), values)
+
+    def get_fallback_template(self, emergency_type: str, **values: Any) -> Optional[Dict[str, Any]]:
+        """Render the fallback template for an emergency type.
+
+        Looks up ``<type>``, then ``<type>_alert``, then ``general``.
+
+        Args:
+            emergency_type: Emergency type (e.g. "earthquake")
+            **values: Placeholder values, see :meth:`render_template`
+
+        Returns:
+            Rendered copy of the template, or None if none exists
+        """
+        templates = self._templates()
+        emergency_type = (emergency_type or 'general').strip().lower()
+        for name in (emergency_type, f"{emergency_type}_alert", 'general'):
+            if name in templates:
+                return _render(templates[name], values)
+        return None
+
     def save_template(self, template_name: str, template_data: Dict[str, Any]) -> bool:
         """Save a template.
-        
+
         Args:
             template_name: Name of the template to save
             template_data: Template data as a dictionary
-            
+
         Returns:
             True if successful, False otherwise
         """
         template_path = os.path.join(
             self.templates_dir, f"{template_name}.json"
         )
-        
+
         try:
             with open(template_path, 'w', encoding='utf-8') as f:
                 json.dump(template_data, f, indent=2, ensure_ascii=False)
+            self.reload()
             return True
         except IOError as e:
             print(f"Error saving template {template_name}: {e}")
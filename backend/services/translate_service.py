@@ -1,52 +1,402 @@
 """
 Translation service for the application.
 """
+import asyncio
+import hashlib
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
 import requests
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+
+from ..config import config
+from .cache_service import TTLCache
+from .metrics_service import metrics
+
+# Fields of an LLM answer or template that carry user-facing text
+TRANSLATABLE_FIELDS = ('title', 'summary', 'steps', 'warnings', 'sms_template', 'subject', 'body')
+
+_translate_seconds = metrics.histogram(
+    "translate_request_seconds", "Translation server round trip (one request per batch)", ("outcome",)
+)
+TRANSLATE_SECONDS = {True: _translate_seconds.labels("ok"), False: _translate_seconds.labels("error")}
+
+
+def _batch_rejected(status: int) -> bool:
+    """Whether an HTTP error status means the server refused the batch request itself.
+
+    A 4xx (other than 429 Too Many Requests) is worth retrying one string at
+    a time; a 429 or 5xx means the server is overloaded or failing, and
+    sending it one request per string would only make that worse.
+    """
+    return 400 <= status < 500 and status != 429
+
+
+class TranslationMemo:
+    """Persistent translation memo: SQLite on disk, TTLCache in front of it."""
+
+    def __init__(self, db_path: Optional[str], memory_size: int = 10000):
+        """Initialize the memo.
+
+        Args:
+            db_path: SQLite file for persistence, or None for memory only
+            memory_size: Number of translations kept in memory
+        """
+        self._memory = TTLCache(max_size=memory_size, ttl=7 * 24 * 3600, name="translation_memo")
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """The database, opened on first use rather than at import; call with ``_lock`` held."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, translated TEXT NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def key(text: str, source: str, target: str) -> str:
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        return f"{digest}:{source}:{target}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._memory.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing and self.db_path:
+            with self._lock:
+                conn = self._connection()
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT key, translated FROM translations WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                    for key, translated in rows:
+                        found[key] = translated
+                        self._memory.set(key, translated)
+        return found
+
+    def put_many(self, items: Dict[str, str]) -> None:
+        for key, translated in items.items():
+            self._memory.set(key, translated)
+        if items and self.db_path:
+            with self._lock:
+                conn = self._connection()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations (key, translated) VALUES (?, ?)",
+                    list(items.items())
+                )
+                conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._memory.stats()
+
 
 class TranslateService:
-    """Service for handling translations."""
-    
-    def __init__(self, base_url: str = "http://localhost:5000"):
+    """Service for handling translations.
+
+    Talks to a LibreTranslate-compatible server. Every translation is
+    memoized per (text hash, source, target) in memory and on disk, and
+    batches are sent as a single request.
+    """
+
+    def __init__(self, base_url: str = None, memo_path: str = None,
+                 max_workers: int = 8):
         """Initialize the translation service.
-        
+
         Args:
-            base_url: Base URL of the translation service
+            base_url: Base URL of the translation service (default: ``TRANSLATE_URL``)
+            memo_path: SQLite file for the translation memo (default:
+                ``TRANSLATE_MEMO_PATH``; empty string disables persistence)
+            max_workers: Parallel requests when the server cannot batch
         """
-        self.base_url = base_url
-    
+        self.base_url = (base_url or config.TRANSLATE_URL).rstrip('/')
+        if memo_path is None:
+            memo_path = config.TRANSLATE_MEMO_PATH
+        self.memo = TranslationMemo(memo_path or None)
+        self.max_workers = max_workers
+        self._async_session = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translate')
+        metrics.track_cache(self.memo)
+
+    def _request(self, q, target_lang: str, source_lang: str):
+        started = time.monotonic()
+        ok = False
+        try:
+            response = self.session.post(
+                f"{self.base_url}/translate",
+                json={
+                    'q': q,
+                    'source': source_lang,
+                    'target': target_lang,
+                    'format': 'text'
+                },
+                timeout=(config.TRANSLATE_CONNECT_TIMEOUT, config.TRANSLATE_READ_TIMEOUT)
+            )
+            response.raise_for_status()
+            result = response.json().get('translatedText')
+            ok = True
+            return result
+        finally:
+            TRANSLATE_SECONDS[ok].observe(time.monotonic() - started)
+
     def translate(self, text: str, target_lang: str, source_lang: str = 'en') -> Optional[str]:
         """Translate text to the target language.
-        
+
         Args:
             text: Text to translate
             target_lang: Target language code (e.g., 'es', 'fr')
             source_lang: Source language code (default: 'en')
-            
+
         Returns:
-            Translated text or None if translation fails
+            Translated text, or the original text if translation fails
         """
         if not text or not target_lang:
             return text
-            
+        translated = self.translate_batch([text], target_lang, source_lang)
+        return translated[0] if translated[0] is not None else text
+
+    def _lookup(self, texts: List[str], target_lang: str, source_lang: str):
+        """Memo keys, memoized translations, and (key, text) pairs still to fetch."""
+        keys = [TranslationMemo.key(t, source_lang, target_lang) if t else None for t in texts]
+        found = self.memo.get_many([k for k in set(keys) if k])
+        pending = {}
+        for text, key in zip(texts, keys):
+            if key and key not in found:
+                pending[key] = text
+        return keys, found, list(pending.items())
+
+    def _store(self, texts, keys, found, misses, translated) -> List[Optional[str]]:
+        fresh = {key: value for (key, _), value in zip(misses, translated) if value is not None}
+        self.memo.put_many(fresh)
+        found.update(fresh)
+        return [
+            text if not key else found.get(key)
+            for text, key in zip(texts, keys)
+        ]
+
+    def translate_batch(self, texts: List[str], target_lang: str,
+                        source_lang: str = 'en') -> List[Optional[str]]:
+        """Translate many strings with at most one round trip.
+
+        Memoized strings are served locally; the rest go to the server as a
+        single batched request, falling back to concurrent per-string
+        requests if the server does not accept batches. If the server is
+        unreachable, rate-limited (429) or failing (5xx), only memoized
+        strings are translated.
+
+        Returns:
+            Translations in input order; None where translation failed
+        """
+        if not target_lang or target_lang == source_lang:
+            return list(texts)
+
+        keys, found, misses = self._lookup(texts, target_lang, source_lang)
+        translated = []
+        if misses:
+            translated = None
+            try:
+                result = self._request([text for _, text in misses], target_lang, source_lang)
+                if isinstance(result, list) and len(result) == len(misses):
+                    translated = result
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Server unreachable: per-string retries would only fail slower
+                print(f"Translation error: {e}")
+                translated = [None] * len(misses)
+            except requests.HTTPError as e:
+                print(f"Translation error: {e}")
+                if not _batch_rejected(e.response.status_code):
+                    translated = [None] * len(misses)
+            except Exception as e:
+                print(f"Translation error: {e}")
+
+            if translated is None:
+                futures = [
+                    self._executor.submit(self._request, text, target_lang, source_lang)
+                    for _, text in misses
+                ]
+                translated = []
+                for future in futures:
+                    try:
+                        value = future.result()
+                        translated.append(value if isinstance(value, str) else None)
+                    except Exception as e:
+                        print(f"Translation error: {e}")
+                        translated.append(None)
+
+        return self._store(texts, keys, found, misses, translated)
+
+    @staticmethod
+    def _response_texts(data: Dict[str, Any]):
+        slots = []
+        texts = []
+        for field in TRANSLATABLE_FIELDS:
+            value = data.get(field)
+            if isinstance(value, str) and value:
+                slots.append((field, None))
+                texts.append(value)
+            elif isinstance(value, list):
+                for i, item in enumerate(value):
+                    if isinstance(item, str) and item:
+                        slots.append((field, i))
+                        texts.append(item)
+        return slots, texts
+
+    @staticmethod
+    def _apply(data: Dict[str, Any], slots, translated, target_lang: str) -> Dict[str, Any]:
+        result = dict(data)
+        for field in TRANSLATABLE_FIELDS:
+            if isinstance(result.get(field), list):
+                result[field] = list(result[field])
+        complete = True
+        for (field, index), value in zip(slots, translated):
+            if value is None:
+                complete = False
+                continue
+            if index is None:
+                result[field] = value
+            else:
+                result[field][index] = value
+        if complete:
+            result['language'] = target_lang
+        return result
+
+    def translate_response(self, data: Dict[str, Any], target_lang: str,
+                           source_lang: str = 'en') -> Dict[str, Any]:
+        """Translate every user-facing field of a structured answer in one batch.
+
+        Covers ``title``, ``summary``, each ``steps``/``warnings`` entry and
+        ``sms_template`` (plus template ``subject``/``body``). Returns a new
+        dict; ``language`` is set to ``target_lang`` only if every field was
+        translated, otherwise untranslated fields keep their original text.
+        """
+        if not data or not target_lang or target_lang == source_lang:
+            return data
+        slots, texts = self._response_texts(data)
+        return self._apply(data, slots, self.translate_batch(texts, target_lang, source_lang), target_lang)
+
+    def _get_async_session(self):
+        # httpx is only needed by the async (ASGI) serving mode
+        if self._async_session is None:
+            import httpx
+            self._async_session = httpx.AsyncClient(
+                timeout=httpx.Timeout(config.TRANSLATE_READ_TIMEOUT, connect=config.TRANSLATE_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.max_workers)
+            )
+        return self._async_session
+
+    async def _request_async(self, q, target_lang: str, source_lang: str):
+        started = time.monotonic()
+        ok = False
         try:
-            response = requests.post(
+            response = await self._get_async_session().post(
                 f"{self.base_url}/translate",
                 json={
-                    'q': text,
+                    'q': q,
                     'source': source_lang,
                     'target': target_lang,
                     'format': 'text'
-                },
-                timeout=10
+                }
             )
-            if response.status_code == 200:
-                return response.json().get('translatedText', text)
-            return text
-        except Exception as e:
-            print(f"Translation error: {e}")
-            return text
+            response.raise_for_status()
+            result = response.json().get('translatedText')
+            ok = True
+            return result
+        finally:
+            TRANSLATE_SECONDS[ok].observe(time.monotonic() - started)
+
+    async def translate_batch_async(self, texts: List[str], target_lang: str,
+                                    source_lang: str = 'en') -> List[Optional[str]]:
+        """Coroutine version of :meth:`translate_batch`.
+
+        The memo is SQLite, which may wait on another process's write lock,
+        so it is read and written on the loop's default executor.
+        """
+        import httpx
+
+        if not target_lang or target_lang == source_lang:
+            return list(texts)
+
+        loop = asyncio.get_running_loop()
+        keys, found, misses = await loop.run_in_executor(
+            None, self._lookup, texts, target_lang, source_lang
+        )
+        translated = []
+        if misses:
+            translated = None
+            try:
+                result = await self._request_async([text for _, text in misses], target_lang, source_lang)
+                if isinstance(result, list) and len(result) == len(misses):
+                    translated = result
+            except httpx.TransportError as e:
+                print(f"Translation error: {e}")
+                translated = [None] * len(misses)
+            except httpx.HTTPStatusError as e:
+                print(f"Translation error: {e}")
+                if not _batch_rejected(e.response.status_code):
+                    translated = [None] * len(misses)
+            except Exception as e:
+                print(f"Translation error: {e}")
+
+            if translated is None:
+                results = await asyncio.gather(
+                    *(self._request_async(text, target_lang, source_lang) for _, text in misses),
+                    return_exceptions=True
+                )
+                translated = []
+                for value in results:
+                    if isinstance(value, Exception):
+                        print(f"Translation error: {value}")
+                    translated.append(value if isinstance(value, str) else None)
+
+        if not misses:
+            return self._store(texts, keys, found, misses, translated)
+        return await loop.run_in_executor(None, self._store, texts, keys, found, misses, translated)
+
+    async def translate_response_async(self, data: Dict[str, Any], target_lang: str,
+                                       source_lang: str = 'en') -> Dict[str, Any]:
+        """Coroutine version of :meth:`translate_response`."""
+        if not data or not target_lang or target_lang == source_lang:
+            return data
+        slots, texts = self._response_texts(data)
+        translated = await self.translate_batch_async(texts, target_lang, source_lang)
+        return self._apply(data, slots, translated, target_lang)
+
+    async def aclose(self) -> None:
+        """Close the async connection pool (ASGI shutdown)."""
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
+
+    def warm_templates(self, template_service, languages: List[str]) -> None:
+        """Pre-translate every template into ``languages`` to fill the memo."""
+        for name in template_service.list_templates():
+            template = template_service.load_template(name)
+            for language in languages:
+                self.translate_response(template, language)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'base_url': self.base_url, 'memo': self.memo.stats()}
 
 # Create a default instance for easy importing
 translate_service = TranslateService()
@@ -0,0 +1,102 @@
+"""
+Startup-time report: where the app's cold start goes.
+
+Imports the app in a fresh interpreter under ``-X importtime`` and prints
+the slowest modules, the total per top-level package, and the services
+whose construction is deferred to first use.
+
+    python -m backend.startup                   # top 25 modules
+    python -m backend.startup --top 50 --module backend.asgi
+    python backend/app.py --startup-report
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Run in the child: time the import itself and list the lazy services afterwards
+_PROBE = """
+import json, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter() - started
+from backend.services.lazy_service import lazy_services
+print(json.dumps({{
+    'import_seconds': imported,
+    'lazy_services': [service.build_stats() for service in lazy_services],
+}}))
+"""
+
+
+def parse_importtime(text: str) -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) for each ``-X importtime`` line."""
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def profile(module: str = 'backend.app') -> Dict:
+    """Import ``module`` in a subprocess and collect its import-time breakdown."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(module=module)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['modules'] = parse_importtime(result.stderr)
+    return report
+
+
+def print_report(report: Dict, top: int = 25) -> None:
+    modules = report['modules']
+    print(f"Import wall time: {report['import_seconds'] * 1000:.1f} ms "
+          f"({len(modules)} modules)")
+
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    print('\nSelf time by top-level package:')
+    for package, total in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {total / 1000:9.1f} ms  {package}")
+
+    print(f"\nSlowest {top} modules (cumulative, including what they import):")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda row: -row[2])[:top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms  {self_us / 1000:7.1f} ms self  {name}")
+
+    print('\nDeferred services (built on first use):')
+    for service in report['lazy_services']:
+        state = f"built in {service['build_seconds'] * 1000:.1f} ms" if service['built'] \
+            else 'not built during import'
+        print(f"  {service['name']:<20} {state}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='backend.app', help='module to import')
+    parser.add_argument('--top', type=int, default=25, help='modules and packages to list')
+    parser.add_argument('--json', action='store_true', help='print the raw report as JSON')
+    args = parser.parse_args(argv)
+
+    report = profile(args.module)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.top)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""
+Local stand-ins for Ollama, Vonage SMS and LibreTranslate.
+
+Each fake is a small threaded HTTP server on 127.0.0.1 with configurable
+latency, so the benchmark runs on a machine with no network access.
+"""
+import json
+import os
+import random
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# What the fake model "generates": a valid answer at the Modelfile limits' midpoint
+ANSWER = {
+    "title": "Earthquake Safety",
+    "summary": "Drop, cover and hold on until the shaking stops, then move to open ground.",
+    "steps": [
+        "Drop to your hands and knees before the shaking knocks you down.",
+        "Cover your head and neck under a sturdy table or desk.",
+        "Hold on until the shaking stops completely.",
+        "Move away from windows, shelves and heavy objects.",
+        "Once outside, stay clear of buildings, trees and power lines.",
+    ],
+    "warnings": ["Do not use elevators.", "Expect aftershocks."],
+    "sms_template": "EMERGENCY: Earthquake. I need help at {location}. Nearest shelter: {nearest_shelter}.",
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (cancelled streams, app shutdown) are expected
+        pass
+
+
+class FakeServer:
+    """Base class: runs ``handler_class`` on an ephemeral port in a daemon thread."""
+
+    handler_class = None
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        """Initialize the server.
+
+        Args:
+            latency: Seconds added before every response
+            jitter: Extra random seconds (uniform, 0..jitter) added to ``latency``
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self.aborted = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def delay(self) -> None:
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def count(self, field: str = "requests") -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _wrap_socket(self, httpd) -> None:
+        pass
+
+    def start(self) -> "FakeServer":
+        fake = self
+
+        class Handler(self.handler_class):
+            server_fake = fake
+
+        self._httpd = _Server(("127.0.0.1", 0), Handler)
+        self._wrap_socket(self._httpd)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def stats(self):
+        return {"requests": self.requests, "aborted": self.aborted}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ----------------------------------------------------------------------
+# OLLAMA
+# ----------------------------------------------------------------------
+class _OllamaHandler(_Handler):
+    def do_GET(self):
+        fake = self.server_fake
+        if self.path == "/api/tags":
+            self.send_json({"models": [{"name": fake.model}]})
+        elif self.path == "/api/ps":
+            models = [{"name": fake.model, "model": fake.model, "size_vram": 0}] if fake.resident else []
+            self.send_json({"models": models})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        fake = self.server_fake
+        request = json.loads(self.read_body() or b"{}")
+        fake.count()
+        if self.path != "/api/generate":
+            self.send_json({"error": "not found"}, 404)
+            return
+
+        load_seconds = fake.load()
+        if not request.get("prompt"):
+            # An empty prompt only loads the model (Ollama's warm-up idiom)
+            self.send_json({"model": request.get("model"), "response": "", "done": True,
+                            "done_reason": "load", "load_duration": int(load_seconds * 1e9)})
+            return
+
+        tokens = fake.tokens()
+        limit = (request.get("options") or {}).get("num_predict")
+        if limit:
+            tokens = tokens[:limit]
+        # Only the new prompt is evaluated; a passed-in context is already "cached"
+        prompt_tokens = max(1, len(request["prompt"]) // 4)
+        prompt_seconds = prompt_tokens / fake.prompt_tokens_per_second if fake.prompt_tokens_per_second else 0.0
+        time.sleep(prompt_seconds)
+        fake.delay()
+        final = {
+            "model": request.get("model"), "response": "", "done": True, "eval_count": len(tokens),
+            "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(prompt_seconds * 1e9) or 1,
+            "context": list(request.get("context") or []) + [1] * (prompt_tokens + len(tokens)),
+        }
+
+        if not request.get("stream", True):
+            time.sleep(len(tokens) / fake.tokens_per_second)
+            self.send_json({**final, "response": "".join(tokens)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        interval = 1.0 / fake.tokens_per_second
+        try:
+            for token in tokens:
+                time.sleep(interval)
+                self._chunk({"model": request.get("model"), "response": token, "done": False})
+            self._chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client closed the stream: that is how generation gets cancelled
+            fake.count("aborted")
+            self.close_connection = True
+
+    def _chunk(self, payload):
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+
+class FakeOllama(FakeServer):
+    """Fake Ollama ``/api/generate`` (streaming and not), ``/api/tags`` and ``/api/ps``.
+
+    ``latency`` is the time to first token; tokens then arrive at
+    ``tokens_per_second``. After the answer the model keeps "talking" for
+    ``trailing_tokens`` tokens, as real models often do. The first request
+    after start or :meth:`unload` also waits ``load_time`` seconds, like a
+    model being read into memory. Prompts are evaluated at
+    ``prompt_tokens_per_second`` (0: instantly), except for the ``context``
+    passed back from an earlier turn.
+    """
+
+    handler_class = _OllamaHandler
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05,
+                 tokens_per_second: float = 400.0, trailing_tokens: int = 40,
+                 model: str = "aidgen:latest", load_time: float = 0.0,
+                 prompt_tokens_per_second: float = 0.0):
+        super().__init__(latency, jitter)
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.tokens_per_second = tokens_per_second
+        self.trailing_tokens = trailing_tokens
+        self.model = model
+        self.load_time = load_time
+        self.resident = False
+        self.loads = 0
+        self._load_lock = threading.Lock()
+
+    def load(self) -> float:
+        """Load the model unless resident; returns the seconds spent loading."""
+        with self._load_lock:
+            if self.resident:
+                return 0.0
+            time.sleep(self.load_time)
+            self.resident = True
+            self.loads += 1
+            return self.load_time
+
+    def unload(self) -> None:
+        """Evict the model, as Ollama does when keep_alive expires."""
+        self.resident = False
+
+    def stats(self):
+        return {**super().stats(), "loads": self.loads}
+
+    def tokens(self):
+        answer = json.dumps(ANSWER)
+        trailing = ("\nStay safe and follow official guidance." * self.trailing_tokens)[:self.trailing_tokens * 4]
+        text = answer + trailing
+        # Roughly four characters per token, like real tokenizers on English text
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+# ----------------------------------------------------------------------
+# LIBRETRANSLATE
+# ----------------------------------------------------------------------
+class _TranslateHandler(_Handler):
+    def do_POST(self):
+        fake = self.server_fake
+        fake.count()
+        if self.path != "/translate":
+            self.send_json({"error": "not found"}, 404)
+            return
+        request = json.loads(self.read_body() or b"{}")
+        fake.delay()
+        q = request.get("q", "")
+        target = request.get("target", "")
+        if isinstance(q, list):
+            translated = [f"[{target}] {text}" for text in q]
+        else:
+            translated = f"[{target}] {q}"
+        self.send_json({"translatedText": translated})
+
+
+class FakeTranslate(FakeServer):
+    """Fake LibreTranslate ``/translate``; accepts a string or a batch list in ``q``."""
+
+    handler_class = _TranslateHandler
+
+
+# ----------------------------------------------------------------------
+# VONAGE SMS
+# ----------------------------------------------------------------------
+class _VonageHandler(_Handler):
+    def do_POST(self):
+        fake = self.server_fake
+        fake.count()
+        body = self.read_body().decode("utf-8")
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(body or "{}")
+        else:
+            params = {k: v[0] for k, v in parse_qs(body).items()}
+        fake.delay()
+        to = params.get("to", "")
+        if random.random() < fake.throttle_rate:
+            message = {"to": to, "status": "1", "error-text": "Throughput Rate Exceeded"}
+        else:
+            message = {
+                "to": to,
+                "message-id": f"fake-{random.getrandbits(48):012x}",
+                "status": "0",
+                "remaining-balance": "100.00",
+                "message-price": "0.01",
+                "network": "00000",
+            }
+        self.send_json({"message-count": "1", "messages": [message]})
+
+
+class FakeVonage(FakeServer):
+    """Fake Vonage SMS API (``POST /sms/json``) served over HTTPS.
+
+    The Vonage SDK only speaks https, so the server uses a throwaway
+    self-signed certificate; point ``REQUESTS_CA_BUNDLE`` at :attr:`cafile`.
+    Requires the ``openssl`` command.
+    """
+
+    handler_class = _VonageHandler
+
+    def __init__(self, latency: float = 0.15, jitter: float = 0.05, throttle_rate: float = 0.0):
+        super().__init__(latency, jitter)
+        self.throttle_rate = throttle_rate
+        self._tmpdir = tempfile.mkdtemp(prefix="fake-vonage-")
+        self.cafile = os.path.join(self._tmpdir, "cert.pem")
+        self._keyfile = os.path.join(self._tmpdir, "key.pem")
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which("openssl") is not None
+
+    def _wrap_socket(self, httpd) -> None:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+             "-keyout", self._keyfile, "-out", self.cafile],
+            check=True, capture_output=True
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.cafile, self._keyfile)
+        httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+
+    @property
+    def url(self) -> str:
+        return f"https://127.0.0.1:{self.port}"
+
+    def stop(self) -> None:
+        super().stop()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
@@ -0,0 +1,50 @@
+"""
+Nearest-shelter lookup benchmark.
+
+Builds the spatial index over random points spread across a country-sized
+box and reports build time and k-nearest query latency percentiles.
+
+    python -m benchmarks.nearest                       # 1M points, k = 1, 5, 20
+    python -m benchmarks.nearest --points 5000000 --k 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend.services.spatial_index import GeoIndex
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--bbox", type=float, nargs=4, default=[8.0, 68.0, 35.0, 97.0],
+                        metavar=("LAT_MIN", "LON_MIN", "LAT_MAX", "LON_MAX"))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    lat_min, lon_min, lat_max, lon_max = args.bbox
+    latitudes = rng.uniform(lat_min, lat_max, args.points)
+    longitudes = rng.uniform(lon_min, lon_max, args.points)
+
+    started = time.perf_counter()
+    index = GeoIndex(latitudes, longitudes)
+    print(f"build       {len(index)} points in {time.perf_counter() - started:.2f}s")
+
+    queries = np.column_stack((rng.uniform(lat_min, lat_max, args.queries),
+                               rng.uniform(lon_min, lon_max, args.queries)))
+    for k in args.k:
+        timings = []
+        for latitude, longitude in queries:
+            started = time.perf_counter()
+            index.nearest(latitude, longitude, k)
+            timings.append(time.perf_counter() - started)
+        p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1e6
+        print(f"k={k:<4}      p50 {p50:7.1f}µs  p95 {p95:7.1f}µs  p99 {p99:7.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
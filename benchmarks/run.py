@@ -0,0 +1,575 @@
+"""
+AidGen load test and benchmark.
+
+Starts fake Ollama, Vonage and LibreTranslate servers on localhost, boots
+the app against them in a subprocess, drives it with realistic traffic and
+reports per-endpoint latency percentiles, throughput and fallback rates.
+No network access is needed.
+
+    python -m benchmarks.run                          # all scenarios, Flask server
+    python -m benchmarks.run --server asgi            # the uvicorn entry point
+    python -m benchmarks.run --server serve --workers 4   # multi-process server
+    python -m benchmarks.run --scenario mixed --duration 30 --concurrency 64
+    python -m benchmarks.run --save default           # write baselines/default.json
+    python -m benchmarks.run --compare default        # exit 1 on regression
+
+Scenarios:
+    surge   a burst of identical emergency-instruction requests
+    chat    distinct chat messages (plain and streamed)
+    sos     SOS taps from many devices at once, with repeat taps
+    mixed   weighted traffic over every route in backend/app.py
+
+Before the scenarios, the app is launched ``--cold-starts`` times and the
+time from spawn to its first answered request is reported as
+``cold_start/first_request``; ``--compare`` flags a slower start.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .fakes import FakeOllama, FakeTranslate, FakeVonage
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+KINDS = ["earthquake", "flood", "fire", "tsunami"]
+LOCATIONS = ["Lat: 12.9716, Long: 77.5946", "Lat: 19.0760, Long: 72.8777", "Chennai", "Kochi", ""]
+LANGUAGES = ["en", "en", "en", "hi", "es"]
+QUESTIONS = [
+    "Where should I go during the shaking?",
+    "Is it safe to go back inside?",
+    "How do I purify water?",
+    "What should I pack in a go-bag?",
+    "How high should I climb to escape flooding?",
+    "Can I use the elevator?",
+    "What do I do if someone is trapped?",
+]
+
+# Replies /api/chat gives when the scheduler sheds it, or when it has no model answer
+CHAT_SHED_PREFIX = "⚠️ Error: AidGen is busy"
+CHAT_FALLBACK_PREFIXES = ("⚠️", "I'm not sure")
+
+
+# ----------------------------------------------------------------------
+# MEASUREMENT
+# ----------------------------------------------------------------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency and outcome counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.counts = defaultdict(lambda: {"ok": 0, "fallback": 0, "shed": 0, "error": 0})
+
+    def record(self, endpoint, latency, outcome):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            self.counts[endpoint][outcome] += 1
+
+    def summary(self, elapsed):
+        report = {}
+        for endpoint in sorted(self.counts):
+            values = sorted(self.latencies[endpoint])
+            counts = self.counts[endpoint]
+            total = sum(counts.values())
+            report[endpoint] = {
+                "requests": total,
+                "errors": counts["error"],
+                "fallbacks": counts["fallback"],
+                "shed": counts["shed"],
+                "error_rate": round(counts["error"] / total, 4),
+                "fallback_rate": round(counts["fallback"] / total, 4),
+                "shed_rate": round(counts["shed"] / total, 4),
+                "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+            }
+        return report
+
+
+def classify(endpoint, response, payload):
+    """'ok', 'fallback', 'shed' or 'error' for one finished request."""
+    if response.status_code >= 500 or (response.status_code >= 400 and endpoint != "sos_status"):
+        return "error"
+    if not isinstance(payload, dict):
+        return "ok"
+    if payload.get("fallback"):
+        return "fallback"
+    reply = payload.get("reply")
+    if isinstance(reply, str) and reply.startswith(CHAT_SHED_PREFIX):
+        return "shed"
+    if isinstance(reply, str) and reply.startswith(CHAT_FALLBACK_PREFIXES):
+        return "fallback"
+    return "ok"
+
+
+def last_sse_payload(text):
+    payload = None
+    for line in text.splitlines():
+        if line.startswith("data: "):
+            try:
+                payload = json.loads(line[len("data: "):])
+            except ValueError:
+                pass
+    return payload
+
+
+# ----------------------------------------------------------------------
+# TRAFFIC
+# ----------------------------------------------------------------------
+class Client:
+    """Issues requests against the app and records every outcome."""
+
+    def __init__(self, base_url, recorder, pool_size):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.alert_ids = []
+        self.accepted = {}
+        self._lock = threading.Lock()
+
+    def call(self, endpoint, method, path, body=None, headers=None, stream=False):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, json=body, headers=headers, timeout=120
+            )
+            text = response.text
+        except requests.RequestException:
+            self.recorder.record(endpoint, time.perf_counter() - started, "error")
+            return None
+        latency = time.perf_counter() - started
+
+        if stream:
+            payload = last_sse_payload(text)
+        elif response.headers.get("Content-Type", "").startswith("application/json"):
+            payload = response.json()
+        else:
+            payload = None
+        self.recorder.record(endpoint, latency, classify(endpoint, response, payload))
+        return payload
+
+    # One method per route in backend/app.py
+    def index(self, rng):
+        self.call("static", "GET", rng.choice(["/", "/earthquake.html", "/styles.css"]))
+
+    def resources(self, rng):
+        query = rng.choice(["", "shelter", "water", "hosp", "first aid"])
+        self.call("resources", "GET", f"/api/resources?q={query}&limit=20")
+
+    def fallback(self, rng):
+        self.call("fallback", "GET", f"/api/fallback/earthquake_alert?language={rng.choice(LANGUAGES)}")
+
+    def translate(self, rng):
+        self.call("translate", "POST", "/api/translate",
+                  {"text": rng.choice(QUESTIONS), "from": "en", "to": rng.choice(["hi", "es", "kn"])})
+
+    def alert(self, rng):
+        # earthquake_alert.json is the only bundled template; other types 404
+        self.call("alert", "POST", "/api/alert",
+                  {"type": "earthquake", "location": rng.choice(LOCATIONS), "language": rng.choice(LANGUAGES)})
+
+    def instructions(self, rng):
+        self.call("instructions", "POST", "/api/emergency/instructions",
+                  {"type": rng.choice(KINDS), "location": rng.choice(LOCATIONS), "language": rng.choice(LANGUAGES)})
+
+    def generate(self, rng):
+        self.call("generate", "POST", "/api/generate",
+                  {"kind": rng.choice(KINDS), "location": rng.choice(LOCATIONS),
+                   "query": rng.choice(QUESTIONS), "language": rng.choice(LANGUAGES)})
+
+    def generate_stream(self, rng):
+        self.call("generate_stream", "POST", "/api/generate/stream",
+                  {"kind": rng.choice(KINDS), "location": rng.choice(LOCATIONS),
+                   "query": rng.choice(QUESTIONS)}, stream=True)
+
+    def chat(self, rng):
+        self.call("chat", "POST", "/api/chat",
+                  {"message": f"{rng.choice(QUESTIONS)} ({rng.randrange(10 ** 6)})",
+                   "emergency_type": rng.choice(KINDS)})
+
+    def chat_stream(self, rng):
+        self.call("chat_stream", "POST", "/api/chat/stream",
+                  {"message": f"{rng.choice(QUESTIONS)} ({rng.randrange(10 ** 6)})",
+                   "emergency_type": rng.choice(KINDS)}, stream=True)
+
+    def sos(self, rng, device=None):
+        device = device or f"bench-{rng.randrange(10 ** 9)}"
+        payload = self.call(
+            "sos", "POST", "/api/sos",
+            {"type": rng.choice(KINDS), "latitude": 12.97 + rng.random(), "longitude": 77.59 + rng.random()},
+            headers={"Idempotency-Key": f"{device}-{rng.randrange(10 ** 12)}", "X-Device-Id": device}
+        )
+        if payload and payload.get("alert_id"):
+            with self._lock:
+                if payload["alert_id"] not in self.accepted:
+                    self.accepted[payload["alert_id"]] = time.perf_counter()
+                    self.alert_ids.append(payload["alert_id"])
+
+    def wait_delivered(self, timeout=60.0):
+        """Poll every accepted alert until its SMS fan-out finishes.
+
+        Records ``sos_delivered``: time from acceptance to the final status.
+        """
+        pending = dict(self.accepted)
+        deadline = time.monotonic() + timeout
+        while pending and time.monotonic() < deadline:
+            for alert_id, accepted_at in list(pending.items()):
+                try:
+                    alert = self.session.get(f"{self.base_url}/api/sos/{alert_id}", timeout=10).json()["alert"]
+                except (requests.RequestException, ValueError, KeyError):
+                    continue
+                if alert["status"] in ("queued", "sending"):
+                    continue
+                outcome = {"sent": "ok", "partial": "fallback"}.get(alert["status"], "error")
+                self.recorder.record("sos_delivered", time.perf_counter() - accepted_at, outcome)
+                del pending[alert_id]
+            time.sleep(0.05)
+        for alert_id, accepted_at in pending.items():
+            self.recorder.record("sos_delivered", time.perf_counter() - accepted_at, "error")
+
+    def sos_status(self, rng):
+        with self._lock:
+            alert_id = rng.choice(self.alert_ids) if self.alert_ids else "missing"
+        self.call("sos_status", "GET", f"/api/sos/{alert_id}")
+
+    def diagnostics(self, rng):
+        self.call("diagnostics", "GET", "/api/diagnostics")
+
+
+MIXED_WEIGHTS = {
+    "instructions": 20, "generate": 10, "generate_stream": 5, "chat": 15, "chat_stream": 10,
+    "resources": 10, "fallback": 5, "alert": 5, "translate": 5, "sos": 4, "sos_status": 4,
+    "index": 5, "diagnostics": 2,
+}
+
+
+def run_closed_loop(client, actions, weights, concurrency, duration, seed):
+    """``concurrency`` users each issue back-to-back requests for ``duration`` seconds."""
+    deadline = time.monotonic() + duration
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < deadline:
+            getattr(client, rng.choices(actions, weights)[0])(rng)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user, range(concurrency)))
+
+
+def scenario_surge(client, args):
+    # Everyone in the affected area asks for the same instructions at once
+    rng = random.Random(args.seed)
+    body = {"type": "earthquake", "location": "Lat: 12.9716, Long: 77.5946", "language": "en"}
+    total = max(args.concurrency, args.surge_requests)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(
+            lambda _: client.call("instructions_surge", "POST", "/api/emergency/instructions", body),
+            range(total)
+        ))
+    client.diagnostics(rng)
+
+
+def scenario_chat(client, args):
+    run_closed_loop(client, ["chat", "chat_stream"], [2, 1], args.concurrency, args.duration, args.seed)
+
+
+def scenario_sos(client, args):
+    rng = random.Random(args.seed)
+    devices = [f"bench-device-{i}" for i in range(args.concurrency * 2)]
+    # First taps, then a wave of panicked repeat taps from the same phones
+    taps = devices + [rng.choice(devices) for _ in range(len(devices))]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda device: client.sos(random.Random(hash(device)), device), taps))
+        list(pool.map(lambda i: client.sos_status(random.Random(i)), range(len(devices))))
+    client.wait_delivered()
+
+
+def scenario_mixed(client, args):
+    actions = list(MIXED_WEIGHTS)
+    run_closed_loop(client, actions, [MIXED_WEIGHTS[a] for a in actions],
+                    args.concurrency, args.duration, args.seed)
+
+
+SCENARIOS = {
+    "surge": scenario_surge,
+    "chat": scenario_chat,
+    "sos": scenario_sos,
+    "mixed": scenario_mixed,
+}
+
+
+# ----------------------------------------------------------------------
+# SERVER UNDER TEST
+# ----------------------------------------------------------------------
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def launch_app(server, env, port, log_path):
+    if server == "asgi":
+        command = [sys.executable, "-m", "uvicorn", "backend.asgi:application",
+                   "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    elif server == "serve":
+        # Worker count comes from SERVER_WORKERS, see app_env
+        command = [sys.executable, "-m", "backend.serve",
+                   "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-c",
+                   "from backend.app import app; "
+                   f"app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    # A file, not a pipe: an unread pipe fills up with access logs and stalls the app
+    log = open(log_path, "wb")
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    return process
+
+
+def wait_ready(process, url, log_path, timeout=60.0, interval=0.2):
+    """Poll ``url`` until it answers 200; returns the seconds that took."""
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            with open(log_path, encoding="utf-8", errors="replace") as f:
+                raise RuntimeError(f"App exited during startup:\n{f.read()}")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return time.monotonic() - started
+        except requests.RequestException:
+            pass
+        time.sleep(interval)
+    process.kill()
+    raise RuntimeError(f"App did not start within {timeout:.0f}s; see {log_path}")
+
+
+def stop_app(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def start_app(server, env, port, log_path):
+    process = launch_app(server, env, port, log_path)
+    wait_ready(process, f"http://127.0.0.1:{port}/api/diagnostics", log_path)
+    return process
+
+
+def measure_cold_start(args, env, workdir):
+    """Time from spawning the app to its first successful request, over fresh processes.
+
+    The first request is a fallback-template lookup: it needs the app
+    and its templates loaded, but no model or SMS gateway.
+    """
+    recorder = Recorder()
+    started = time.perf_counter()
+    for i in range(args.cold_starts):
+        port = free_port()
+        log_path = os.path.join(workdir, f"cold_start_{i}.log")
+        spawned = time.monotonic()
+        process = launch_app(args.server, env, port, log_path)
+        try:
+            wait_ready(process, f"http://127.0.0.1:{port}/api/fallback/earthquake_alert",
+                       log_path, interval=0.005)
+            recorder.record("first_request", time.monotonic() - spawned, "ok")
+        finally:
+            stop_app(process)
+    return recorder.summary(time.perf_counter() - started)
+
+
+def app_env(args, ollama, translate, vonage, workdir):
+    env = dict(os.environ)
+    env.update({
+        "OLLAMA_URL": ollama.url,
+        "TRANSLATE_URL": translate.url,
+        "TRANSLATE_MEMO_PATH": os.path.join(workdir, "translations.sqlite3"),
+        "TRANSLATE_LANGUAGES": "hi,es",
+        "GUIDANCE_PACK_PATH": os.path.join(workdir, "guidance_pack.json.gz"),
+        "SOS_OUTBOX_PATH": os.path.join(workdir, "sos_outbox.sqlite3"),
+        # Every store on disk lives in the run's directory, so runs never start warm
+        "SHARED_CACHE_PATH": os.path.join(workdir, "shared_cache.sqlite3"),
+        "ANSWER_CACHE_PATH": os.path.join(workdir, "answer_cache.sqlite3"),
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.sqlite3"),
+        "RESOURCE_SNAPSHOT_DIR": os.path.join(workdir, "resources"),
+        "SERVER_WORKERS": str(args.workers),
+        "SOS_EMERGENCY_CONTACTS": "Alice:+15550000001,Bob:+15550000002,Carol:+15550000003",
+        "VONAGE_API_KEY": "bench",
+        "VONAGE_API_SECRET": "bench",
+        "VONAGE_FROM_NUMBER": "AidGen",
+        # Every alert goes to the same configured contacts, so the default
+        # per-phone cap would measure the throttle policy, not the pipeline
+        "SOS_RATE_PER_DESTINATION": str(args.sms_per_destination_rate),
+        "SOS_RATE_PER_DESTINATION_BURST": str(max(1.0, args.sms_per_destination_rate)),
+        "PYTHONUNBUFFERED": "1",
+    })
+    if vonage is not None:
+        env.update({
+            "VONAGE_API_URL": f"{vonage.url}/sms/json",
+            "REQUESTS_CA_BUNDLE": vonage.cafile,
+            "SOS_FAKE_SMS": "False",
+        })
+    else:
+        env["SOS_FAKE_SMS"] = "True"
+    return env
+
+
+# ----------------------------------------------------------------------
+# REPORTING
+# ----------------------------------------------------------------------
+COLUMNS = ["requests", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "fallback_rate", "shed_rate", "error_rate"]
+
+
+def print_report(title, report):
+    print(f"\n== {title}")
+    print(f"{'endpoint':<20}" + "".join(f"{c:>15}" for c in COLUMNS))
+    for endpoint, row in report.items():
+        print(f"{endpoint:<20}" + "".join(f"{row[c]:>15}" for c in COLUMNS))
+
+
+def compare(results, baseline, tolerance):
+    """Print regressions against ``baseline``; returns True if any were found."""
+    regressions = []
+    for scenario, report in results["scenarios"].items():
+        base_report = baseline.get("scenarios", {}).get(scenario, {})
+        for endpoint, row in report.items():
+            base = base_report.get(endpoint)
+            if not base:
+                continue
+            if row["p95_ms"] > base["p95_ms"] * (1 + tolerance) + 5:
+                regressions.append((scenario, endpoint, "p95_ms", base["p95_ms"], row["p95_ms"]))
+            if row["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                regressions.append((scenario, endpoint, "throughput_rps", base["throughput_rps"], row["throughput_rps"]))
+            for rate in ("fallback_rate", "shed_rate", "error_rate"):
+                if row[rate] > base.get(rate, 0.0) + 0.05:
+                    regressions.append((scenario, endpoint, rate, base.get(rate, 0.0), row[rate]))
+
+    print(f"\n== Comparison with baseline (tolerance {tolerance:.0%})")
+    if not regressions:
+        print("No regressions.")
+    for scenario, endpoint, metric, before, after in regressions:
+        print(f"REGRESSION {scenario}/{endpoint} {metric}: {before} -> {after}")
+    return bool(regressions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["flask", "asgi", "serve"], default="flask")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes for --server serve")
+    parser.add_argument("--scenario", choices=["all"] + list(SCENARIOS), default="all")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per timed scenario")
+    parser.add_argument("--surge-requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ollama-latency", type=float, default=0.2, help="seconds to first token")
+    parser.add_argument("--ollama-tps", type=float, default=400.0, help="tokens per second")
+    parser.add_argument("--sms-latency", type=float, default=0.15)
+    parser.add_argument("--sms-per-destination-rate", type=float, default=100.0,
+                        help="SOS_RATE_PER_DESTINATION for the app under test")
+    parser.add_argument("--translate-latency", type=float, default=0.05)
+    parser.add_argument("--save", metavar="NAME", help="save results as baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--cold-starts", type=int, default=5,
+                        help="app launches timed to their first request (0 to skip)")
+    args = parser.parse_args(argv)
+
+    ollama = FakeOllama(latency=args.ollama_latency, tokens_per_second=args.ollama_tps).start()
+    translate = FakeTranslate(latency=args.translate_latency, jitter=0.02).start()
+    vonage = FakeVonage(latency=args.sms_latency).start() if FakeVonage.available() else None
+    if vonage is None:
+        print("openssl not found: using the in-process fake SMS client instead of fake Vonage")
+
+    workdir = tempfile.mkdtemp(prefix="aidgen-bench-")
+    env = app_env(args, ollama, translate, vonage, workdir)
+    cold_start = measure_cold_start(args, env, workdir) if args.cold_starts > 0 else None
+    port = free_port()
+    log_path = os.path.join(workdir, "app.log")
+    app = start_app(args.server, env, port, log_path)
+    print(f"App ({args.server}) on port {port}, log at {log_path}")
+
+    results = {
+        "meta": {
+            "server": args.server,
+            "workers": args.workers if args.server == "serve" else 1,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "ollama_latency": args.ollama_latency,
+            "ollama_tps": args.ollama_tps,
+            "sms_latency": args.sms_latency,
+            "sms_per_destination_rate": args.sms_per_destination_rate,
+            "translate_latency": args.translate_latency,
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scenarios": {},
+    }
+    if cold_start:
+        results["scenarios"]["cold_start"] = cold_start
+        print_report("cold_start", cold_start)
+    try:
+        names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+        for name in names:
+            recorder = Recorder()
+            client = Client(f"http://127.0.0.1:{port}", recorder, args.concurrency)
+            started = time.perf_counter()
+            SCENARIOS[name](client, args)
+            report = recorder.summary(time.perf_counter() - started)
+            results["scenarios"][name] = report
+            print_report(name, report)
+
+        diagnostics = requests.get(f"http://127.0.0.1:{port}/api/diagnostics", timeout=5).json()
+        results["fakes"] = {
+            "ollama": ollama.stats(),
+            "translate": translate.stats(),
+            "vonage": vonage.stats() if vonage else None,
+        }
+        results["diagnostics"] = diagnostics
+        print(f"\nFake servers: {json.dumps(results['fakes'])}")
+    finally:
+        stop_app(app)
+        for fake in (ollama, translate, vonage):
+            if fake is not None:
+                fake.stop()
+
+    regressed = False
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), encoding="utf-8") as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Saved baseline to {path}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Test settings: every on-disk store goes to a throwaway directory, and nothing
+talks to Ollama or starts background work at import.
+"""
+import os
+import sys
+import tempfile
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+_store = tempfile.mkdtemp(prefix="aidgen-tests-")
+for name, filename in {
+    'SOS_OUTBOX_PATH': 'sos_outbox.sqlite3',
+    'TRANSLATE_MEMO_PATH': 'translations.sqlite3',
+    'GUIDANCE_PACK_PATH': 'guidance_pack.json.gz',
+    'RESOURCE_SNAPSHOT_DIR': 'resources',
+    'SHARED_CACHE_PATH': 'shared_cache.sqlite3',
+    'SESSION_DB_PATH': 'sessions.sqlite3',
+    'ANSWER_CACHE_PATH': 'answer_cache.sqlite3',
+}.items():
+    os.environ.setdefault(name, os.path.join(_store, filename))
+os.environ.setdefault('OLLAMA_WARMUP', 'False')
+os.environ.setdefault('GUIDANCE_PACK_REFRESH', '0')
@@ -0,0 +1,68 @@
+import pytest
+
+from backend.services.answer_cache import SimilarAnswerCache, normalize_query
+
+SCOPE = ("chat", "flood")
+
+
+@pytest.fixture
+def cache():
+    return SimilarAnswerCache(db_path="", max_size=64, ttl=3600, threshold=0.85)
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("when should I evacuate", "where should I evacuate"),
+    ("turn on the gas", "turn the gas"),
+    ("turn on the gas", "turn off the gas"),
+    ("who should I call", "what should I call"),
+    ("can I use the elevator", "can't I use the elevator"),
+    ("should I stay inside", "should I stay outside"),
+])
+def test_questions_differing_in_meaning_do_not_share_an_answer(cache, cached, asked):
+    cache.put(SCOPE, cached, {"summary": cached})
+    assert cache.get(SCOPE, asked) is None
+    assert cache.get(SCOPE, cached) == {"summary": cached}
+
+
+@pytest.mark.parametrize("asked", [
+    "When should I evacuate?",
+    "when should i evacuate please",
+    "Hi, when should I evacuate",
+])
+def test_rewordings_share_an_answer(cache, asked):
+    cache.put(SCOPE, "when should I evacuate", {"summary": "now"})
+    assert cache.get(SCOPE, asked) == {"summary": "now"}
+
+
+def test_normalization_keeps_question_words_negations_and_prepositions():
+    assert normalize_query("Where should I NOT go?") == "where should i not go"
+    assert normalize_query("Please turn off the gas") == "turn off gas"
+    assert normalize_query("Don’t use the elevator") == "don't use elevator"
+
+
+def test_other_scopes_never_match(cache):
+    cache.put(("chat", "flood"), "when should I evacuate", {"summary": "flood"})
+    assert cache.get(("chat", "fire"), "when should I evacuate") is None
+
+
+def test_a_closer_question_in_another_scope_does_not_mask_the_match(cache):
+    cache.put(("chat", "fire"), "when should I evacuate the house", {"summary": "fire"})
+    cache.put(SCOPE, "when should I evacuate my house now", {"summary": "flood"})
+    assert cache.get(SCOPE, "when should I evacuate the house") == {"summary": "flood"}
+    assert cache.get(("chat", "fire"), "when should I evacuate my house now") == {"summary": "fire"}
+
+
+def test_expired_answers_never_match(cache):
+    cache.put(SCOPE, "when should I evacuate", {"summary": "now"})
+    cache.ttl = 0
+    assert cache.get(SCOPE, "when should I evacuate") is None
+    assert cache.get(SCOPE, "When should I evacuate?") is None
+
+
+def test_answers_reach_other_processes_through_the_database(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    writer = SimilarAnswerCache(db_path=path, threshold=0.85, sync_interval=0)
+    reader = SimilarAnswerCache(db_path=path, threshold=0.85, sync_interval=0)
+    writer.put(SCOPE, "when should I evacuate", {"summary": "now"})
+    assert reader.get(SCOPE, "When should I evacuate?") == {"summary": "now"}
+    assert reader.get(("chat", "fire"), "when should I evacuate") is None
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.cache_service import SingleFlight, TTLCache
+from backend.services.shared_cache import SharedCache
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.005)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_their_ttl():
+    cache = TTLCache(ttl=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_get_or_load_loads_once_and_skips_uncacheable_values():
+    cache = TTLCache(ttl=60)
+    calls = []
+    load = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_load("a", load) == 1
+    assert cache.get_or_load("a", load) == 1
+    assert calls == [1]
+
+    assert cache.get_or_load("b", lambda: None, cacheable=lambda v: v is not None) is None
+    assert cache.get_or_load("b", lambda: "loaded", cacheable=lambda v: v is not None) == "loaded"
+
+
+def test_loader_errors_propagate_and_are_not_cached():
+    cache = TTLCache(ttl=60)
+
+    def fail():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("a", fail)
+    assert cache.get_or_load("a", lambda: "ok") == "ok"
+
+
+def test_stale_entries_are_served_while_one_refresh_runs():
+    cache = TTLCache(ttl=0.05, stale_ttl=60)
+    cache.set("a", "old")
+    time.sleep(0.1)
+    release = threading.Event()
+    calls = []
+
+    def reload():
+        calls.append(1)
+        release.wait(2)
+        return "new"
+
+    assert cache.get_or_load("a", reload) == "old"
+    assert cache.get_or_load("a", reload) == "old"
+    release.set()
+    wait_until(lambda: cache.get("a") == "new")
+    assert calls == [1]
+
+
+def test_workers_share_values_through_the_shared_tier(tmp_path):
+    shared = SharedCache(db_path=str(tmp_path / "shared.sqlite3"))
+    first = TTLCache(ttl=60, shared=shared)
+    second = TTLCache(ttl=60, shared=SharedCache(db_path=shared.db_path))
+    first.set(("model", "prompt"), {"summary": "x"})
+    assert second.get_or_load(("model", "prompt"), lambda: pytest.fail("loaded")) == {"summary": "x"}
+    assert second.stats()["shared_hits"] == 1
+
+
+def test_concurrent_calls_with_one_key_run_once():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(2)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("k", work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flights.collapsed == 4)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert calls == [1]
+    assert len(results) == 5 and all(result is results[0] for result in results)
+    assert flights.stats()["in_flight"] == 0
+    # A later call runs again
+    flights.do("k", lambda: None)
+    assert flights.executions == 2
+
+
+def test_waiters_receive_the_leaders_exception():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait(2)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flights.do("k", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flights.collapsed == 2)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert len(errors) == 3 and all(error is errors[0] for error in errors)
+
+
+def test_concurrent_coroutines_with_one_key_run_once():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("k", work) for _ in range(4)),
+                                    flights.ado("other", work))
+
+    assert asyncio.run(main()) == ["done"] * 5
+    assert calls == [1, 1]
+    assert flights.collapsed == 3
@@ -0,0 +1,99 @@
+import pytest
+import requests
+
+from backend.services import llm_service
+from backend.services.llm_service import CircuitBreaker, CircuitOpenError, OllamaClient
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_service, "time", clock)
+    return clock
+
+
+def make_breaker():
+    return CircuitBreaker(failure_threshold=3, slow_call_threshold=5.0, reset_timeout=30.0)
+
+
+def fail(breaker, times=1):
+    for _ in range(times):
+        assert breaker.allow()
+        breaker.record(0.1, ok=False)
+
+
+def test_opens_after_consecutive_failures_only(clock):
+    breaker = make_breaker()
+    fail(breaker, 2)
+    assert breaker.allow()
+    breaker.record(0.1, ok=True)
+    fail(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED
+    fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["times_opened"] == 1 and breaker.stats()["rejected"] == 1
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(6.0, ok=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(clock):
+    breaker = make_breaker()
+    fail(breaker, 3)
+    clock.now += 29.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record(0.1, ok=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["consecutive_failures"] == 0
+    assert breaker.allow()
+
+
+def test_a_failed_probe_reopens_for_another_full_timeout(clock):
+    breaker = make_breaker()
+    fail(breaker, 3)
+    clock.now += 30
+    fail(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["times_opened"] == 2
+    clock.now += 29.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+
+
+def test_an_open_breaker_fails_ollama_calls_without_sending_them(clock, monkeypatch):
+    client = OllamaClient(base_url="http://ollama.invalid", breaker=make_breaker())
+    sent = []
+
+    def post(*args, **kwargs):
+        sent.append(args)
+        raise requests.ConnectionError("refused")
+
+    monkeypatch.setattr(client.session, "post", post)
+    for _ in range(3):
+        with pytest.raises(requests.ConnectionError):
+            client.generate("prompt")
+    with pytest.raises(CircuitOpenError):
+        client.generate("prompt")
+    assert len(sent) == 3
+    # The open breaker's own rejection is not counted as another failure
+    assert client.breaker.stats()["consecutive_failures"] == 3
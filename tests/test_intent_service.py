@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from backend.services.intent_service import IntentMatcher
+from backend.services.resource_service import ResourceService
+from backend.services.template_service import TemplateService
+
+FAQ = [
+    {"id": "earthquake-during", "type": "earthquake",
+     "questions": ["What do I do during an earthquake?", "The ground is shaking"],
+     "answer": "Drop, cover and hold on."},
+    {"id": "earthquake-after", "type": "earthquake",
+     "questions": ["What do I do after an earthquake?"],
+     "answer": "Expect aftershocks."},
+    {"id": "flood-after", "type": "flood",
+     "questions": ["What do I do after a flood?"],
+     "answer": "Avoid floodwater."},
+    {"id": "fire-smoke", "type": "fire",
+     "questions": ["How do I escape smoke?"],
+     "answer": "Stay low under the smoke."},
+]
+
+
+@pytest.fixture
+def matcher(tmp_path):
+    faq_dir = tmp_path / "faq"
+    faq_dir.mkdir()
+    (faq_dir / "faq.json").write_text(json.dumps(FAQ))
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "resources.json").write_text(json.dumps([
+        {"id": "guide", "title": "Tsunami Evacuation Map", "tags": ["tsunami"],
+         "description": "Coastal evacuation routes", "url": "https://example.org/map"},
+    ]))
+    return IntentMatcher(
+        faq_dir=str(faq_dir),
+        templates=TemplateService(templates_dir=str(tmp_path / "templates")),
+        resources=ResourceService(data_dir=str(data_dir), snapshot_dir=""),
+        threshold=0.6,
+    )
+
+
+def test_a_clear_faq_question_is_answered_locally(matcher):
+    match = matcher.match("What should I do during an earthquake?")
+    assert match["id"] == "earthquake-during" and match["source"] == "faq"
+    assert match["answer"] == "Drop, cover and hold on."
+    assert match["confidence"] == 1.0
+    assert matcher.match("help, the ground is shaking!")["id"] == "earthquake-during"
+    assert matcher.stats()["answered"] == 2
+
+
+def test_resources_are_answered_with_their_link(matcher):
+    match = matcher.match("tsunami evacuation map")
+    assert match["source"] == "resource"
+    assert match["answer"] == "Tsunami Evacuation Map: Coastal evacuation routes https://example.org/map"
+
+
+def test_off_topic_questions_go_to_the_model(matcher):
+    assert matcher.match("What is the capital of France?") is None
+    # One known word is not enough when the rest of the question is unknown
+    assert matcher.match("How much smoke does a volcano in Iceland produce?") is None
+    # Nothing but stopwords
+    assert matcher.match("what do I do?") is None
+    assert matcher.stats() == {
+        "documents": 6, "threshold": 0.6, "lookups": 3, "answered": 0, "answer_ratio": 0.0,
+    }
+
+
+def test_an_ambiguous_question_goes_to_the_model(matcher):
+    # Matches the earthquake and flood entries equally well
+    assert matcher.match("What do I do after?") is None
+
+
+def test_the_emergency_type_breaks_ties(matcher):
+    assert matcher.match("What do I do after?", "flood")["id"] == "flood-after"
+    assert matcher.match("What do I do after?", "Earthquake")["id"] == "earthquake-after"
+    # It does not override a question that names another emergency
+    assert matcher.match("What do I do after a flood?", "earthquake")["id"] == "flood-after"
+
+
+def test_the_index_is_rebuilt_when_the_faq_changes(matcher, tmp_path):
+    assert matcher.match("Where is the nearest sandbag depot?") is None
+    faq = FAQ + [{"id": "sandbags", "type": "flood", "questions": ["Where can I get sandbags?"],
+                  "answer": "At the fire station."}]
+    (tmp_path / "faq" / "faq.json").write_text(json.dumps(faq, indent=1))
+    matcher.reload_interval = 0
+    assert matcher.match("Where can I get sandbags?")["id"] == "sandbags"
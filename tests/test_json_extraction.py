@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from backend.services.llm_service import JSONStreamExtractor, repair_json
+
+ANSWER = {"summary": 'Stay {calm}, say "help" \\ wave', "steps": ["Move [up]", "Call 112"]}
+
+
+def feed_all(extractor, chunks):
+    return [extractor.feed(chunk) for chunk in chunks]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_object_is_found_whatever_the_chunk_boundaries(size):
+    text = "Sure! ```json\n" + json.dumps(ANSWER) + "\n``` Anything else?"
+    extractor = JSONStreamExtractor()
+    done = feed_all(extractor, [text[i:i + size] for i in range(0, len(text), size)])
+    assert extractor.done and extractor.valid
+    assert extractor.result == ANSWER
+    # Done from the chunk that closed the object, and it stays done
+    first = done.index(True)
+    assert all(done[first:])
+    assert "}" in text[first * size:(first + 1) * size]
+
+
+def test_an_escape_split_across_chunks_does_not_end_the_string():
+    extractor = JSONStreamExtractor()
+    feed_all(extractor, ['{"summary": "say \\', '"hi\\', '" now"}'])
+    assert extractor.result == {"summary": 'say "hi" now'}
+
+
+def test_invalid_objects_are_skipped_and_the_validator_is_applied():
+    extractor = JSONStreamExtractor(validator=lambda data: "steps" in data)
+    feed_all(extractor, ['{not json} then ', '{"summary": "x"}'])
+    assert extractor.done
+    assert extractor.result == {"summary": "x"}
+    assert not extractor.valid
+
+
+def test_finish_returns_the_object_or_none_if_it_never_closed():
+    extractor = JSONStreamExtractor()
+    feed_all(extractor, ['{"summary": "x"}', ' {"summary": "ignored"}'])
+    assert extractor.finish() == {"summary": "x"}
+
+    extractor = JSONStreamExtractor()
+    feed_all(extractor, ['{"summary": "cut ', 'off'])
+    assert not extractor.done
+    assert extractor.finish() is None
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+    ('Here: {"a": "x"} trailing {"b": 2}', {"a": "x"}),
+    ('{"summary": "Stay ins', {"summary": "Stay ins"}),
+    ('{"summary": "ok", "steps": ["one", "tw', {"summary": "ok", "steps": ["one", "tw"]}),
+    ('{"summary": "ok", "steps": ["one"], "warn', {"summary": "ok", "steps": ["one"]}),
+    ('{"summary": "ok", "steps":', {"summary": "ok"}),
+    ('{"summary": "ok", "count": 12', {"summary": "ok", "count": 12}),
+    ('{"summary": "ok", "safe": tr', {"summary": "ok"}),
+    ('{"a": {"b": [{"c": "d"', {"a": {"b": [{"c": "d"}]}}),
+    ('{"summary": "a \\"quote\\" and \\', {"summary": 'a "quote" and '}),
+])
+def test_repair_json_recovers_near_valid_output(raw, expected):
+    assert repair_json(raw) == expected
+
+
+@pytest.mark.parametrize("raw", ["", "no json here", "[1, 2, 3]"])
+def test_repair_json_gives_up_without_an_object(raw):
+    assert repair_json(raw) is None
@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+
+from backend.services.llm_service import (
+    PRIORITY_CHAT,
+    PRIORITY_GENERATE,
+    PRIORITY_INSTRUCTIONS,
+    LLMScheduler,
+    LoadShedError,
+)
+
+PRIORITIES = (PRIORITY_INSTRUCTIONS, PRIORITY_GENERATE, PRIORITY_CHAT)
+
+
+def make_scheduler(limit=1, max_limit=None, queue_size=4, budget=5.0, target_latency=1.0):
+    return LLMScheduler(
+        min_limit=limit,
+        max_limit=max_limit or limit,
+        target_latency=target_latency,
+        queue_sizes={p: queue_size for p in PRIORITIES},
+        budgets={p: budget for p in PRIORITIES},
+    )
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.005)
+
+
+def queue_in_thread(scheduler, priority, granted):
+    def acquire():
+        scheduler.acquire(priority)
+        granted.append(priority)
+
+    thread = threading.Thread(target=acquire, daemon=True)
+    thread.start()
+    return thread
+
+
+def queued(scheduler):
+    return sum(scheduler.stats()["queued"].values())
+
+
+def test_admits_up_to_the_limit_then_queues_and_sheds_a_full_queue():
+    scheduler = make_scheduler(limit=2, queue_size=1)
+    scheduler.acquire(PRIORITY_GENERATE)
+    scheduler.acquire(PRIORITY_GENERATE)
+    granted = []
+    thread = queue_in_thread(scheduler, PRIORITY_GENERATE, granted)
+    wait_until(lambda: queued(scheduler) == 1)
+
+    with pytest.raises(LoadShedError):
+        scheduler.acquire(PRIORITY_GENERATE)
+    assert scheduler.shed[PRIORITY_GENERATE] == 1
+
+    scheduler.release()
+    thread.join(2)
+    assert granted == [PRIORITY_GENERATE]
+    assert scheduler.stats()["in_flight"] == 2
+
+
+def test_freed_slots_go_to_the_highest_priority_first():
+    scheduler = make_scheduler(limit=1)
+    scheduler.acquire(PRIORITY_GENERATE)
+    granted = []
+    chat = queue_in_thread(scheduler, PRIORITY_CHAT, granted)
+    wait_until(lambda: queued(scheduler) == 1)
+    instructions = queue_in_thread(scheduler, PRIORITY_INSTRUCTIONS, granted)
+    wait_until(lambda: queued(scheduler) == 2)
+
+    scheduler.release()
+    instructions.join(2)
+    assert granted == [PRIORITY_INSTRUCTIONS]
+    scheduler.release()
+    chat.join(2)
+    assert granted == [PRIORITY_INSTRUCTIONS, PRIORITY_CHAT]
+
+
+def test_sheds_at_once_when_the_expected_wait_exceeds_the_budget():
+    scheduler = make_scheduler(limit=1, budget=1.0, target_latency=20.0)
+    scheduler.acquire(PRIORITY_CHAT)
+    scheduler.release(latency=10.0)
+    scheduler.acquire(PRIORITY_CHAT)
+
+    started = time.monotonic()
+    with pytest.raises(LoadShedError):
+        scheduler.acquire(PRIORITY_CHAT)
+    assert time.monotonic() - started < 0.5
+    assert queued(scheduler) == 0
+
+
+def test_a_request_still_waiting_at_its_budget_is_shed():
+    scheduler = make_scheduler(limit=1, budget=0.05)
+    scheduler.acquire(PRIORITY_CHAT)
+    with pytest.raises(LoadShedError):
+        scheduler.acquire(PRIORITY_CHAT)
+    assert scheduler.shed[PRIORITY_CHAT] == 1
+    assert queued(scheduler) == 0
+    # The abandoned waiter never takes the slot once it frees up
+    scheduler.release()
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_limit_grows_additively_and_shrinks_multiplicatively():
+    scheduler = make_scheduler(limit=1, max_limit=3)
+    scheduler.run(PRIORITY_GENERATE, lambda: None)
+    assert scheduler.limit == 2
+    for _ in range(10):
+        scheduler.run(PRIORITY_GENERATE, lambda: None)
+    assert scheduler.limit == 3
+
+    def fail():
+        raise ValueError("model error")
+
+    with pytest.raises(ValueError):
+        scheduler.run(PRIORITY_GENERATE, fail)
+    assert scheduler.limit == 2
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            scheduler.run(PRIORITY_GENERATE, fail)
+    assert scheduler.limit == 1
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_slow_calls_shrink_the_limit():
+    scheduler = make_scheduler(limit=1, max_limit=4, target_latency=0.01)
+    scheduler._limit = 4.0
+    scheduler.acquire(PRIORITY_GENERATE)
+    scheduler.release(latency=0.5)
+    assert scheduler.limit == 2
@@ -0,0 +1,115 @@
+import pytest
+
+from backend.services import rate_limit, sos_outbox
+from backend.services.rate_limit import SmsRateLimiter
+from backend.services.sos_outbox import SOSOutbox
+
+
+class Clock:
+    """Stands in for the time module: ``sleep`` advances the clock instead of waiting."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    monkeypatch.setattr(sos_outbox, "time", clock)
+    return clock
+
+
+def make_limiter(store=None, **kwargs):
+    settings = dict(global_rate=1.0, global_burst=3, destination_rate=0.5, destination_burst=1)
+    settings.update(kwargs)
+    return SmsRateLimiter(store=store, **settings)
+
+
+@pytest.fixture(params=["memory", "shared"])
+def limiter(request, clock, tmp_path):
+    store = SOSOutbox(str(tmp_path / "outbox.sqlite3")) if request.param == "shared" else None
+    return make_limiter(store)
+
+
+def test_each_destination_has_its_own_limit(limiter, clock):
+    assert limiter.acquire("+1") == 0
+    assert limiter.acquire("+1") == pytest.approx(2.0)
+    assert limiter.acquire("+2") == 0
+    assert limiter.stats()["granted"] == 2 and limiter.stats()["deferred"] == 1
+
+
+def test_the_global_limit_applies_across_destinations(limiter, clock):
+    for destination in ("+1", "+2", "+3"):
+        assert limiter.acquire(destination) == 0
+    assert limiter.acquire("+4") == pytest.approx(1.0)
+
+
+def test_tokens_refill_over_time(limiter, clock):
+    for destination in ("+1", "+2", "+3"):
+        assert limiter.acquire(destination) == 0
+    clock.now += 0.5
+    assert limiter.acquire("+4") == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.acquire("+4") == 0
+    # Destination buckets refill at their own, slower rate: +1 was last used 2 s ago, +4 1 s ago
+    clock.now += 1.0
+    assert limiter.acquire("+1") == 0
+    assert limiter.acquire("+4") == pytest.approx(1.0)
+
+
+def test_wait_sleeps_until_a_token_is_granted(limiter, clock):
+    assert limiter.acquire("+1") == 0
+    assert limiter.wait("+1", deadline=clock.now + 5)
+    assert clock.slept == [pytest.approx(2.0)]
+
+
+def test_wait_gives_up_when_the_token_would_come_after_the_deadline(limiter, clock):
+    assert limiter.acquire("+1") == 0
+    assert not limiter.wait("+1", deadline=clock.now + 1.5)
+    assert clock.slept == []
+
+
+def test_idle_destinations_are_evicted_least_recently_used_first(clock):
+    limiter = make_limiter(global_burst=100, max_destinations=2)
+    assert limiter.acquire("+1") == 0
+    assert limiter.acquire("+2") == 0
+    assert limiter.acquire("+1") > 0
+    # +1 was used last, so +3 pushes +2 out
+    assert limiter.acquire("+3") == 0
+    assert limiter.stats()["tracked_destinations"] == 2
+    assert limiter.acquire("+1") > 0
+    assert limiter.acquire("+2") == 0
+
+
+def test_limiters_sharing_a_store_share_the_limits(clock, tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    first, second = make_limiter(SOSOutbox(path)), make_limiter(SOSOutbox(path))
+    assert first.acquire("+1") == 0
+    assert second.acquire("+1") > 0
+    assert second.acquire("+2") == 0
+    assert first.acquire("+3") == 0
+    assert second.acquire("+4") > 0
+    assert first.stats()["shared"] and second.stats()["shared"]
+
+
+def test_tokens_are_taken_from_every_bucket_or_none(clock, tmp_path):
+    outbox = SOSOutbox(str(tmp_path / "outbox.sqlite3"))
+    global_bucket = ("global", 1.0, 5)
+    assert outbox.take_tokens([global_bucket, ("to:+1", 1.0, 1)]) == 0
+    assert outbox.take_tokens([global_bucket, ("to:+1", 1.0, 1)]) == pytest.approx(1.0)
+    # The refused request above left the global bucket untouched: 4 tokens remain
+    for _ in range(4):
+        assert outbox.take_tokens([global_bucket]) == 0
+    assert outbox.take_tokens([global_bucket]) > 0
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from backend.services.resource_service import ResourceService
+
+RESOURCES = [
+    {"id": "eq-1", "title": "Earthquake Safety Guide", "description": "Drop, cover and hold on.",
+     "tags": ["earthquake", "guide"]},
+    {"id": "eq-2", "title": "Aftershock Checklist", "description": "What to check after an earthquake.",
+     "tags": ["earthquake"]},
+    {"id": "fl-1", "title": "Flood Evacuation Routes", "description": "Move to higher ground.",
+     "tags": ["flood", "guide"]},
+    {"id": "fi-1", "title": "Fire Safety Guide", "description": "Stay low under smoke.",
+     "tags": ["fire", "guide"]},
+]
+
+
+@pytest.fixture
+def service(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "resources.json").write_text(json.dumps(RESOURCES))
+    return ResourceService(data_dir=str(data_dir), snapshot_dir="")
+
+
+def ids(page):
+    return [resource["id"] for resource in page["resources"]]
+
+
+@pytest.mark.parametrize("query", ["guide", "earthquake", ""])
+def test_an_empty_page_still_reports_the_total(service, query):
+    full = service.search(query)
+    page = service.search(query, limit=0)
+    assert page == {"total": full["total"], "resources": []}
+
+
+@pytest.mark.parametrize("offset", [3, 4, 10])
+def test_an_offset_past_the_last_match_returns_an_empty_page(service, offset):
+    page = service.search("guide", limit=2, offset=offset)
+    assert page == {"total": 3, "resources": []}
+
+
+def test_resources_route_accepts_limit_zero(service, monkeypatch):
+    import backend.app as flask_app
+    monkeypatch.setattr(flask_app, "resource_service", service)
+    response = flask_app.app.test_client().get("/api/resources?q=earthquake&limit=0")
+    assert response.status_code == 200
+    assert response.get_json()["total"] == 2
+    assert response.get_json()["resources"] == []
+
+
+def test_a_fragment_inside_a_word_matches_like_the_original_substring_search(service):
+    page = service.search("quake")
+    assert page["total"] == 2
+    # "Earthquake" is in eq-1's title, only in eq-2's description
+    assert ids(page) == ["eq-1", "eq-2"]
+    assert ids(service.search("shock")) == ["eq-2"]
+
+
+def test_whole_tokens_outrank_prefixes_which_outrank_infixes(service, tmp_path):
+    data_dir = tmp_path / "ranked"
+    data_dir.mkdir()
+    (data_dir / "resources.json").write_text(json.dumps([
+        {"id": "infix", "title": "Reflood notes"},
+        {"id": "prefix", "title": "Flooding notes"},
+        {"id": "whole", "title": "Flood notes"},
+    ]))
+    ranked = ResourceService(data_dir=str(data_dir), snapshot_dir="")
+    assert ids(ranked.search("flood")) == ["whole", "prefix", "infix"]
+
+
+def test_title_matches_outrank_tag_and_description_matches(service):
+    assert ids(service.search("earthquake")) == ["eq-1", "eq-2"]
+    assert ids(service.search("smoke fire")) == ["fi-1"]
+    assert service.search("flood earthquake")["total"] == 0
+
+
+def test_tag_filter_is_exact_and_case_insensitive(service):
+    assert ids(service.search(tag="GUIDE")) == ["eq-1", "fl-1", "fi-1"]
+    assert ids(service.search("safety", tag="fire")) == ["fi-1"]
+    assert service.search(tag="guid")["total"] == 0
+
+
+def test_pages_follow_the_ranking(service):
+    ranked = ids(service.search("guide"))
+    assert len(ranked) == 3
+    pages = [ids(service.search("guide", limit=2, offset=offset)) for offset in (0, 2)]
+    assert pages[0] + pages[1] == ranked
+    assert ids(service.search("guide", limit=1, offset=1)) == ranked[1:2]
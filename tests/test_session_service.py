@@ -0,0 +1,101 @@
+import pytest
+
+from backend.services import session_service
+from backend.services.session_service import SessionStore
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_service, "time", clock)
+    return clock
+
+
+def make_store(**kwargs):
+    settings = dict(ttl=60, max_sessions=3, max_turns=2, max_context=5)
+    settings.update(kwargs)
+    return SessionStore(db_path="", **settings)
+
+
+def test_sessions_expire_after_the_ttl(clock):
+    store = make_store()
+    store.save("a", "flood", [["hi", "hello"]], [1, 2, 3])
+    clock.now += 59.9
+    assert store.get("a")["emergency_type"] == "flood"
+    clock.now += 0.1
+    assert store.get("a") is None
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+    # The expired row stays until the next purge
+    assert store.count() == 1
+    assert store.purge() == 1 and store.count() == 0
+
+
+def test_purge_keeps_the_most_recently_updated_sessions(clock):
+    store = make_store()
+    for session_id in ("a", "b", "c", "d", "e"):
+        store.save(session_id, "fire", [])
+        clock.now += 1
+    # Updating "a" makes it the most recently used again
+    store.save("a", "fire", [["q", "a"]])
+    assert store.purge() == 2
+    assert {s for s in "abcde" if store.get(s)} == {"a", "d", "e"}
+    assert store.stats()["purged"] == 2
+
+
+def test_saves_purge_periodically(clock, monkeypatch):
+    monkeypatch.setattr(session_service, "PURGE_EVERY", 4)
+    store = make_store(max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        store.save(session_id, "fire", [])
+        clock.now += 1
+    assert store.count() == 3
+    store.save("d", "fire", [])
+    assert store.count() == 2
+
+
+def test_a_context_over_the_cap_is_dropped(clock):
+    store = make_store()
+    store.save("a", "flood", [["q", "a"]], [1, 2, 3, 4, 5])
+    assert store.get("a")["context"] == [1, 2, 3, 4, 5]
+    store.save("a", "flood", [["q", "a"]], [1, 2, 3, 4, 5, 6])
+    session = store.get("a")
+    assert session["context"] is None and session["turns"] == [["q", "a"]]
+    assert store.stats()["context_dropped"] == 1
+
+
+def test_only_the_last_turns_are_kept(clock):
+    store = make_store()
+    turns = [["q1", "a1"], ["q2", "a2"], ["q3", "a3"]]
+    store.save("a", "earthquake", turns)
+    assert store.get("a")["turns"] == [["q2", "a2"], ["q3", "a3"]]
+    store.save("b", "earthquake", turns, [])
+    assert store.get("b")["context"] == []
+    assert make_store(max_turns=0).get("missing") is None
+
+
+def test_context_tokens_round_trip_as_int32(clock):
+    store = make_store(max_context=10)
+    tokens = [0, 1, -1, 2 ** 31 - 1, -(2 ** 31), 151643]
+    store.save("a", "tsunami", [["ümlaut", "ok"]], tokens)
+    session = store.get("a")
+    assert session["context"] == tokens
+    assert session["turns"] == [["ümlaut", "ok"]]
+    with pytest.raises(OverflowError):
+        store.save("b", "tsunami", [], [2 ** 31])
+
+
+def test_deleted_and_unknown_sessions_are_misses(clock):
+    store = make_store()
+    store.save("a", "flood", [])
+    store.delete("a")
+    assert store.get("a") is None
+    assert store.get("") is None
+    assert store.get("unknown") is None
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from backend.services.sos_outbox import SOSOutbox
+
+CONTACTS = [
+    {"name": "Alice", "phone": "+15550000001"},
+    {"name": "Bob", "phone": "+15550000002"},
+]
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return SOSOutbox(str(tmp_path / "outbox.sqlite3"))
+
+
+def enqueue(outbox, **kwargs):
+    return outbox.enqueue("flood", CONTACTS, kwargs.pop("message_body", "Help"), **kwargs)
+
+
+def test_repeated_idempotency_key_returns_the_same_alert(outbox):
+    alert_id, state = enqueue(outbox, idempotency_key="tap-1")
+    assert state == "queued"
+    assert enqueue(outbox, idempotency_key="tap-1", message_body="Help again") == (alert_id, "duplicate")
+    assert outbox.pending_count() == len(CONTACTS)
+    claimed = outbox.claim_batch(10, lease_seconds=30)
+    assert {row["message_body"] for row in claimed} == {"Help"}
+
+
+def test_repeat_taps_within_the_window_update_the_queued_alert(outbox):
+    alert_id, _ = enqueue(outbox, device_id="phone-1", debounce_window=60)
+    again = enqueue(outbox, device_id="phone-1", debounce_window=60,
+                    message_body="Help, now at the school", latitude=1.0, longitude=2.0)
+    assert again == (alert_id, "debounced")
+    assert outbox.pending_count() == len(CONTACTS)
+    assert outbox.get_status(alert_id)["location"]["latitude"] == 1.0
+    claimed = outbox.claim_batch(10, lease_seconds=30)
+    assert {row["message_body"] for row in claimed} == {"Help, now at the school"}
+
+
+def test_debounce_is_per_device_and_type(outbox):
+    alert_id, _ = enqueue(outbox, device_id="phone-1", debounce_window=60)
+    other_device, state = enqueue(outbox, device_id="phone-2", debounce_window=60)
+    assert state == "queued" and other_device != alert_id
+    _, state = outbox.enqueue("fire", CONTACTS, "Help", device_id="phone-1", debounce_window=60)
+    assert state == "queued"
+    _, state = enqueue(outbox, device_id="phone-1", debounce_window=0)
+    assert state == "queued"
+    assert outbox.pending_count() == 4 * len(CONTACTS)
+
+
+def test_claimed_deliveries_are_leased_until_the_lease_expires(outbox):
+    enqueue(outbox)
+    claimed = outbox.claim_batch(10, lease_seconds=0.2)
+    assert sorted(row["contact"] for row in claimed) == ["Alice", "Bob"]
+    assert outbox.claim_batch(10, lease_seconds=0.2) == []
+    time.sleep(0.3)
+    reclaimed = outbox.claim_batch(10, lease_seconds=30)
+    assert sorted(row["id"] for row in reclaimed) == sorted(row["id"] for row in claimed)
+
+
+def test_claim_respects_the_limit(outbox):
+    enqueue(outbox)
+    assert len(outbox.claim_batch(1, lease_seconds=30)) == 1
+    assert len(outbox.claim_batch(10, lease_seconds=30)) == 1
+
+
+def test_recorded_results_drive_the_alert_status(outbox):
+    alert_id, _ = enqueue(outbox)
+    assert outbox.get_status(alert_id)["status"] == "queued"
+    alice, bob = sorted(outbox.claim_batch(10, lease_seconds=30), key=lambda row: row["contact"])
+    now = time.time()
+    outbox.record_results([
+        (alice["id"], "sent", 1, None, {"message-id": "m1"}, now),
+        (bob["id"], "pending", 1, "Throttled", None, now + 60),
+    ])
+    status = outbox.get_status(alert_id)
+    assert status["status"] == "sending"
+    assert status["results"][0]["response"] == {"message-id": "m1"}
+    # Bob's retry is not due yet, and Alice is done
+    assert outbox.claim_batch(10, lease_seconds=30) == []
+
+    outbox.record_results([(bob["id"], "failed", 3, "Invalid number", None, now)])
+    assert outbox.get_status(alert_id)["status"] == "partial"
+    assert outbox.pending_count() == 0
+
+
+def test_unknown_alert_has_no_status(outbox):
+    assert outbox.get_status("missing") is None
@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from backend.config import config
+from backend.services.fake_sms import FakeSmsClient
+from backend.services.sos_service import SOSService
+
+CONTACT = {"name": "Alex", "phone": "+15550100"}
+
+
+@pytest.fixture
+def unset_sender(monkeypatch):
+    monkeypatch.setattr(config, "VONAGE_FROM_NUMBER", None)
+
+
+def test_the_fake_client_sends_without_a_vonage_number(unset_sender):
+    client = FakeSmsClient(latency=0)
+    result, _ = SOSService(sms_client=client).deliver(CONTACT, "Help", time.monotonic() + 5)
+    assert result["status"] == "sent"
+    assert [(m.from_, m.to, m.text) for m in client.sent] == [("AidGen", "15550100", "Help")]
+
+
+def test_the_fake_client_uses_the_configured_number(monkeypatch):
+    monkeypatch.setattr(config, "VONAGE_FROM_NUMBER", "15550199")
+    client = FakeSmsClient(latency=0)
+    result, _ = SOSService(sms_client=client).deliver(CONTACT, "Help", time.monotonic() + 5)
+    assert result["status"] == "sent" and client.sent[0].from_ == "15550199"
+
+
+def test_a_real_client_still_needs_a_vonage_number(unset_sender):
+    class Client:
+        def send(self, message):
+            raise AssertionError("nothing should be sent")
+
+    result, retry = SOSService(sms_client=Client()).deliver(CONTACT, "Help", time.monotonic() + 5)
+    assert result["status"] == "failed" and result["error"].startswith("Invalid payload")
+    assert not retry
@@ -0,0 +1,148 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from backend.services.resource_service import ResourceService
+from backend.services.spatial_index import EARTH_RADIUS_KM, GeoIndex
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def brute_force(latitudes, longitudes, latitude, longitude, k):
+    distances = haversine_km(latitude, longitude, latitudes, longitudes)
+    order = np.argsort(distances, kind="stable")[:k]
+    return [(int(i), float(distances[i])) for i in order]
+
+
+def random_points(rng, count):
+    # Uniform on the sphere, plus clusters at both poles and across the antimeridian
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+    longitudes = rng.uniform(-180, 180, count)
+    cluster = count // 8
+    latitudes[:cluster] = rng.uniform(88, 90, cluster)
+    latitudes[cluster:2 * cluster] = rng.uniform(-90, -88, cluster)
+    longitudes[2 * cluster:3 * cluster] = rng.choice([-1, 1], cluster) * rng.uniform(179, 180, cluster)
+    return latitudes, longitudes
+
+
+QUERIES = [
+    (0.0, 0.0), (12.97, 77.59), (-33.9, 151.2),
+    (89.99, 0.0), (89.5, -120.0), (-89.99, 45.0), (-90.0, 0.0), (90.0, 180.0),
+    (0.0, 179.99), (0.0, -179.99), (10.0, 180.0), (-10.0, -180.0), (65.0, 179.5),
+]
+
+
+@pytest.mark.parametrize("leaf_size", [1, 4, 64])
+@pytest.mark.parametrize("k", [1, 5, 40])
+def test_nearest_matches_brute_force_haversine(leaf_size, k):
+    rng = np.random.default_rng(leaf_size * 100 + k)
+    latitudes, longitudes = random_points(rng, 2000)
+    index = GeoIndex(latitudes, longitudes, leaf_size=leaf_size)
+    queries = QUERIES + list(zip(*random_points(rng, 30)))
+    for latitude, longitude in queries:
+        found = index.nearest(latitude, longitude, k)
+        expected = brute_force(latitudes, longitudes, latitude, longitude, k)
+        assert [doc for doc, _ in found] == [doc for doc, _ in expected]
+        assert [km for _, km in found] == pytest.approx([km for _, km in expected], abs=1e-6)
+
+
+def test_points_across_the_antimeridian_and_over_the_pole_are_close():
+    index = GeoIndex([0.0, 0.0, 89.9, 10.0], [179.9, -179.9, 0.0, 170.0])
+    (first, near_km), (second, _), _, _ = index.nearest(0.0, 179.95, 4)
+    assert {first, second} == {0, 1}
+    assert near_km == pytest.approx(haversine_km(0.0, 179.95, 0.0, 179.9), abs=1e-6)
+    # The opposite side of the pole is 0.2 degrees of arc away, not half the world
+    doc, km = index.nearest(89.9, 180.0, 1)[0]
+    assert doc == 2 and km == pytest.approx(0.2 * math.pi / 180 * EARTH_RADIUS_KM, rel=1e-6)
+
+
+def test_k_larger_than_the_index_returns_every_point_in_order():
+    index = GeoIndex([1.0, 2.0, 3.0], [0.0, 0.0, 0.0])
+    found = index.nearest(0.0, 0.0, 10)
+    assert [doc for doc, _ in found] == [0, 1, 2]
+    assert index.nearest(0.0, 0.0, 0) == []
+
+
+def test_an_empty_index_finds_nothing():
+    index = GeoIndex([], [])
+    assert len(index) == 0
+    assert index.nearest(0.0, 0.0, 3) == []
+
+
+def test_a_tree_rebuilt_from_its_arrays_answers_the_same():
+    rng = np.random.default_rng(7)
+    latitudes, longitudes = random_points(rng, 500)
+    index = GeoIndex(latitudes, longitudes, leaf_size=8)
+    copy = GeoIndex.from_arrays(index.arrays())
+    for latitude, longitude in QUERIES:
+        assert copy.nearest(latitude, longitude, 5) == index.nearest(latitude, longitude, 5)
+
+
+RESOURCES = [
+    {"id": "sh-1", "type": "shelter", "title": "Town Hall", "address": "1 Main St",
+     "latitude": 12.97, "longitude": 77.59},
+    {"id": "sh-2", "type": "Shelter", "title": "School", "latitude": 13.10, "longitude": 77.60},
+    {"id": "ho-1", "type": "hospital", "title": "City Hospital", "latitude": 12.971, "longitude": 77.591},
+    {"id": "guide", "title": "Earthquake Safety Guide"},
+]
+
+
+@pytest.fixture
+def service(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "resources.json").write_text(json.dumps(RESOURCES))
+    return ResourceService(data_dir=str(data_dir), snapshot_dir="")
+
+
+def test_type_filter_uses_the_per_type_tree(service):
+    assert [r["id"] for r in service.nearest(12.9705, 77.5905, 3)] == ["ho-1", "sh-1", "sh-2"]
+    assert [r["id"] for r in service.nearest(12.9705, 77.5905, 3, "SHELTER")] == ["sh-1", "sh-2"]
+    assert [r["id"] for r in service.nearest(12.9705, 77.5905, 3, "hospital")] == ["ho-1"]
+    assert service.nearest(12.9705, 77.5905, 3, "school") == []
+
+
+def test_unlocated_resources_are_never_returned(service):
+    found = service.nearest(0.0, 0.0, 10)
+    assert len(found) == 3 and "guide" not in {r["id"] for r in found}
+    assert found[0]["distance_km"] == pytest.approx(haversine_km(0.0, 0.0, 12.97, 77.59), abs=1e-3)
+
+
+def test_nearest_shelter_names_the_closest_one_for_the_sms(service):
+    assert service.nearest_shelter(12.97, 77.59) == "Town Hall, 1 Main St (0.0 km)"
+    assert service.nearest_shelter(13.2, 77.6) == "School (11.1 km)"
+    assert service.nearest_shelter(None, 77.6) is None
+
+
+def test_no_located_resources(tmp_path):
+    data_dir = tmp_path / "empty"
+    data_dir.mkdir()
+    (data_dir / "resources.json").write_text(json.dumps([{"id": "guide", "title": "Guide"}]))
+    service = ResourceService(data_dir=str(data_dir), snapshot_dir="")
+    assert service.nearest(0.0, 0.0, 5) == []
+    assert service.nearest_shelter(0.0, 0.0) is None
+
+
+def test_out_of_range_coordinates_are_rejected(service):
+    with pytest.raises(ValueError):
+        service.nearest(91.0, 0.0)
+    with pytest.raises(ValueError):
+        service.nearest(0.0, 181.0)
+
+
+def test_nearest_route(service, monkeypatch):
+    import backend.app as flask_app
+    monkeypatch.setattr(flask_app, "resource_service", service)
+    client = flask_app.app.test_client()
+    response = client.get("/api/resources/nearest?lat=12.9705&lon=77.5905&k=5&type=shelter")
+    assert response.status_code == 200
+    assert [r["id"] for r in response.get_json()["resources"]] == ["sh-1", "sh-2"]
+    assert client.get("/api/resources/nearest?lat=95&lon=0").status_code == 400
+    assert client.get("/api/resources/nearest?lat=1").status_code == 400
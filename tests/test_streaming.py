@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import backend.app as flask_app
+from backend.services.llm_service import JSONStreamExtractor, PRIORITY_GENERATE
+
+SUMMARY = 'Move to higher ground now. Avoid "flooded" roads \\ bridges, and don’t drive.'
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def parse_events(frames):
+    events = []
+    for frame in frames:
+        event = frame.split("\n")[0][len("event: "):]
+        data = json.loads(frame.split("\n")[1][len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def stream(monkeypatch, text, size):
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+    fake = FakeStream(chunks)
+    monkeypatch.setattr(flask_app, "call_ollama_stream", lambda *args, **kwargs: fake)
+    frames = list(flask_app.stream_partial_fields("prompt", JSONStreamExtractor(), PRIORITY_GENERATE))
+    assert fake.closed
+    return frames
+
+
+@pytest.mark.parametrize("size", [1, 3, 16])
+def test_summary_events_carry_only_the_new_text(monkeypatch, size):
+    text = json.dumps({"summary": SUMMARY, "steps": ["Go up", "Call 112"]})
+    events = parse_events(stream(monkeypatch, text, size))
+
+    summary = ""
+    for event, data in events:
+        if event == "summary":
+            summary = summary + data["delta"] if "delta" in data else data["summary"]
+    assert summary == SUMMARY
+    assert [data for event, data in events if event == "step"] == [
+        {"index": 0, "step": "Go up"}, {"index": 1, "step": "Call 112"}
+    ]
+    # Each character of the summary goes over the wire once
+    deltas = [data["delta"] for event, data in events if event == "summary"]
+    assert sum(len(delta) for delta in deltas) == len(SUMMARY)
+
+
+def test_a_summary_that_changed_other_than_by_growing_is_resent_whole():
+    assert flask_app.summary_update("Stay inside", "Stay") == {"delta": " inside"}
+    assert flask_app.summary_update("Stay é", "Stay \\u00") == {"summary": "Stay é"}
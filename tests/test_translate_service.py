@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import requests
+
+from backend.services.translate_service import TranslateService
+
+URL = "http://translate.invalid"
+
+
+def fake_translate(q):
+    return [f"es:{text}" for text in q] if isinstance(q, list) else f"es:{q}"
+
+
+class Server:
+    """Answers batches with ``batch_status`` and single strings with 200."""
+
+    def __init__(self, batch_status):
+        self.batch_status = batch_status
+        self.requests = []
+
+    def handle(self, body):
+        self.requests.append(body["q"])
+        if isinstance(body["q"], list) and self.batch_status != 200:
+            return self.batch_status, {"error": "nope"}
+        return 200, {"translatedText": fake_translate(body["q"])}
+
+    def post(self, url, json=None, timeout=None):
+        status, payload = self.handle(json)
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response._content = _json_bytes(payload)
+        return response
+
+
+class AsyncServer(Server):
+    async def post(self, url, json=None):
+        status, payload = self.handle(json)
+        return httpx.Response(status, json=payload, request=httpx.Request("POST", url))
+
+
+def _json_bytes(payload):
+    return json.dumps(payload).encode()
+
+
+def make_service(server, monkeypatch):
+    service = TranslateService(base_url=URL, memo_path="")
+    monkeypatch.setattr(service.session, "post", server.post)
+    monkeypatch.setattr(service, "_get_async_session", lambda: server)
+    return service
+
+
+def translate(service, texts, asynchronous):
+    if asynchronous:
+        return asyncio.run(service.translate_batch_async(texts, "es"))
+    return service.translate_batch(texts, "es")
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_a_batch_is_one_request(monkeypatch, asynchronous):
+    server = AsyncServer(200) if asynchronous else Server(200)
+    service = make_service(server, monkeypatch)
+    assert translate(service, ["a", "b", ""], asynchronous) == ["es:a", "es:b", ""]
+    assert server.requests == [["a", "b"]]
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_a_rejected_batch_falls_back_to_one_request_per_string(monkeypatch, asynchronous):
+    server = AsyncServer(400) if asynchronous else Server(400)
+    service = make_service(server, monkeypatch)
+    assert translate(service, ["a", "b"], asynchronous) == ["es:a", "es:b"]
+    assert server.requests[0] == ["a", "b"]
+    assert sorted(server.requests[1:]) == ["a", "b"]
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_an_overloaded_server_gets_no_per_string_requests(monkeypatch, asynchronous, status):
+    server = AsyncServer(200) if asynchronous else Server(200)
+    service = make_service(server, monkeypatch)
+    translate(service, ["memoized"], asynchronous)
+    server.batch_status = status
+    server.requests.clear()
+    assert translate(service, ["memoized", "a", "b"], asynchronous) == ["es:memoized", None, None]
+    assert server.requests == [["a", "b"]]